@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Defines the AsyncStep wrapper running the steps of an environment in a
+background thread.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import gym
+
+
+class AsyncStep(gym.Wrapper):
+    """
+    Adds step_async() and step_wait() to an environment, which run a step in
+    a background thread while the caller is free to do other work, such as
+    the learning update of the agent. The step is run through all wrappers
+    inside this one, so it must be the outermost wrapper, as the wrappers
+    outside of it would be skipped.
+
+    Parameters
+    ----------
+    env: gym.Env
+        The environment to step, including its wrappers
+    debug_observation: bool
+        Whether the observation of each step_wait() is checked against the
+        observation fetched again from the paused simulation, if the
+        environment supports it
+    """
+    def __init__(self, env, debug_observation=False):
+        super(AsyncStep, self).__init__(env)
+        self.debug_observation = debug_observation
+        self._executor = None
+        self._future = None
+
+    def step_async(self, action):
+        """
+        Starts a step with the given action in the background. The
+        environment must not be used otherwise until the result is collected
+        with step_wait().
+        """
+        self._check_idle('step_async')
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = self._executor.submit(self.env.step, action)
+
+    def step_wait(self):
+        """
+        Waits for the step started with step_async() to finish.
+
+        Returns
+        -------
+        The same as step().
+        """
+        if self._future is None:
+            raise RuntimeError('step_wait() called without a pending step.')
+        future, self._future = self._future, None
+        obs, reward, done, info = future.result()
+        check_observation = \
+            getattr(self.env.unwrapped, 'check_observation', None)
+        # the done of a truncated episode is not the one of the simulation
+        if self.debug_observation and check_observation is not None and \
+                not info.get('TimeLimit.truncated', False):
+            check_observation(obs, done)
+        return obs, reward, done, info
+
+    def step(self, action):
+        """ Steps the environment synchronously. """
+        self._check_idle('step')
+        return self.env.step(action)
+
+    def reset(self, **kwargs):
+        """ Resets the environment. """
+        self._check_idle('reset')
+        return self.env.reset(**kwargs)
+
+    def _check_idle(self, method):
+        """ Raises if a step started with step_async() is pending. """
+        if self._future is not None:
+            raise RuntimeError(
+                '{}() called while a step is still pending.'.format(method))
+
+    def close(self):
+        """ Waits for a pending step and closes the environment. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._future = None
+        return super(AsyncStep, self).close()
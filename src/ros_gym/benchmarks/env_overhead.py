@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the overhead of the task environments on the fake simulation,
+without a simulator or ROS master. Reports the steps per second, the reset
+latency and the memory allocated per step of each environment.
+
+Run from src/ros_gym with:
+    python3 -m benchmarks.env_overhead [--help]
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+import numpy as np
+import rospy
+import yaml
+from gym.spaces import Box
+from fake_simulation_handler import FakeSimulationHandler
+from replay_simulation_handler import ReplaySimulationHandler
+from task_config import TaskConfig, CONFIG_NAME_SPACE, set_config
+from plugin_registry import TASK_ENVS
+
+# environments benchmarked by default
+BENCHMARK_ENVS = (
+    'uav_follow_trajectory_task_env_v0',
+    'gym_cart_pole_task_env_v0',
+    'gym_mc_continuous_task_env_v0')
+
+# configuration of the uav environment, which is run on the fake airsim
+DEFAULT_CONFIG_FILE = \
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'cfg',
+        'uav_follow_trajectory_task_env.yaml')
+
+
+def load_config(path, overrides):
+    """
+    Returns the ros_gym configuration of the yaml file with the given
+    parameters replaced and sets it as the configuration of the process.
+
+    Parameters
+    ----------
+    path: str
+        Path of the yaml configuration file
+    overrides: dict
+        Values of the nested parameters to replace by their relative name,
+        e.g. {'fast_reset/enabled': True}
+    """
+    with open(path) as config_file:
+        params = yaml.safe_load(config_file)[CONFIG_NAME_SPACE.strip('/')]
+    for name, value in overrides.items():
+        keys = name.split('/')
+        nested = params
+        for key in keys[:-1]:
+            nested = nested.setdefault(key, {})
+        nested[keys[-1]] = value
+    config = TaskConfig(params)
+    set_config(config)
+    return config
+
+
+def parse_overrides(assignments):
+    """
+    Returns the parameters to replace of the NAME=VALUE assignments, with
+    the values parsed as yaml. The uav environment is run on the fake airsim
+    unless replaced.
+    """
+    overrides = {'sim_env': 'airsim', 'use_mavros': False}
+    for assignment in assignments:
+        name, value = assignment.split('=', 1)
+        overrides[name] = yaml.safe_load(value)
+    return overrides
+
+
+def make_env(name, config, args):
+    """
+    Returns the environment of the given name, the uav environment running
+    on a fake simulation handler or replaying a recording if args.replay is
+    given.
+    """
+    # the task environments read the configuration when first loaded
+    env_class = TASK_ENVS.load(name)
+    if name == 'uav_follow_trajectory_task_env_v0':
+        handler_args = dict(
+            step_mode=config.get('sim_step/mode', 'realtime'),
+            step_time=config.get('sim_step/time', 0.005),
+            rpc_latency=args.rpc_latency,
+            command_latency=args.command_latency,
+            image_shape=(
+                config['front_cam_res/height'],
+                config['front_cam_res/width']),
+            depth_image_shape=(
+                config['front_cam_d_res/height'],
+                config['front_cam_d_res/width']))
+        if args.replay:
+            sim_handler = \
+                ReplaySimulationHandler(
+                    args.replay,
+                    collision_reward=config['collision_penalty'],
+                    **handler_args)
+        else:
+            sim_handler = FakeSimulationHandler(**handler_args)
+        return env_class(sim_handler=sim_handler)
+    return env_class()
+
+
+def fixed_action(env):
+    """
+    Returns a constant action of the environment, zero velocities for the
+    uav, so that the action sampling is not part of the measurements.
+    """
+    if isinstance(env.action_space, Box):
+        return np.zeros(env.action_space.shape, dtype=env.action_space.dtype)
+    return env.action_space.sample()
+
+
+def run_steps(
+        env, action, steps, episode_steps, on_step=None, on_reset=None):
+    """
+    Runs the given number of steps, resetting the environment when an
+    episode is done or has run for episode_steps steps. on_step and on_reset
+    are called after each step and reset if given.
+
+    Returns
+    -------
+    tuple
+        Durations in seconds of the steps and of the resets.
+    """
+    step_times = []
+    reset_times = []
+    episode_step = 0
+    for _ in range(steps):
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        step_times.append(time.perf_counter() - start)
+        if on_step is not None:
+            on_step()
+        episode_step += 1
+        if done or episode_step >= episode_steps:
+            start = time.perf_counter()
+            env.reset()
+            reset_times.append(time.perf_counter() - start)
+            episode_step = 0
+            if on_reset is not None:
+                on_reset()
+    return step_times, reset_times
+
+
+def measure_allocations(env, action, steps, episode_steps):
+    """
+    Returns the mean peak memory allocated within a step and the mean memory
+    retained per step in bytes, both traced with tracemalloc.
+    """
+    peaks = []
+
+    def record_peak():
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+        tracemalloc.reset_peak()
+
+    tracemalloc.start()
+    try:
+        # the first steps allocate the lazily created buffers
+        run_steps(env, action, 2, episode_steps)
+        # the step durations recorded by this module and the snapshots are
+        # not retained by the environment
+        own_traces = [
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, tracemalloc.__file__)]
+        # warms up the caches used by the filters
+        tracemalloc.take_snapshot().filter_traces(own_traces)
+        before = tracemalloc.take_snapshot().filter_traces(own_traces)
+        tracemalloc.reset_peak()
+        run_steps(
+            env, action, steps, episode_steps, record_peak,
+            tracemalloc.reset_peak)
+        after = tracemalloc.take_snapshot().filter_traces(own_traces)
+    finally:
+        tracemalloc.stop()
+    retained = \
+        sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return float(np.mean(peaks)), retained / steps
+
+
+def benchmark(name, config, args):
+    """
+    Returns the measurements of the environment of the given name.
+    """
+    env = make_env(name, config, args)
+    action = fixed_action(env)
+    start = time.perf_counter()
+    env.reset()
+    first_reset = time.perf_counter() - start
+    run_steps(env, action, args.warmup_steps, args.episode_steps)
+    step_times, reset_times = \
+        run_steps(env, action, args.steps, args.episode_steps)
+    peak_bytes, retained_bytes = \
+        measure_allocations(
+            env, action, args.allocation_steps, args.episode_steps)
+    env.close()
+    step_times = np.array(step_times)
+    return {
+        'env': name,
+        'steps_per_second': len(step_times) / step_times.sum(),
+        'step_mean_ms': step_times.mean() * 1e3,
+        'step_p99_ms': np.percentile(step_times, 99) * 1e3,
+        'first_reset_ms': first_reset * 1e3,
+        'reset_mean_ms': (
+            np.mean(reset_times) * 1e3 if reset_times else float('nan')),
+        'resets': len(reset_times),
+        'allocated_kib_per_step': peak_bytes / 1024.0,
+        'retained_bytes_per_step': retained_bytes,
+    }
+
+
+def print_results(results):
+    """ Prints the measurements as a table. """
+    row = '{:<36}{:>10}{:>10}{:>10}{:>12}{:>12}{:>12}'
+    print(row.format(
+        'env', 'steps/s', 'step ms', 'p99 ms', 'reset ms', 'alloc KiB',
+        'retained B'))
+    for result in results:
+        print(row.format(
+            result['env'],
+            '{:.0f}'.format(result['steps_per_second']),
+            '{:.3f}'.format(result['step_mean_ms']),
+            '{:.3f}'.format(result['step_p99_ms']),
+            '{:.1f}'.format(result['reset_mean_ms']),
+            '{:.1f}'.format(result['allocated_kib_per_step']),
+            '{:.0f}'.format(result['retained_bytes_per_step'])))
+
+
+def parse_args(argv=None):
+    """ Returns the parsed command line arguments. """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--envs', nargs='+', default=list(BENCHMARK_ENVS),
+        help='environments to benchmark')
+    parser.add_argument(
+        '--config', default=DEFAULT_CONFIG_FILE,
+        help='yaml configuration of the uav environment')
+    parser.add_argument(
+        '--set', nargs='*', default=[], metavar='NAME=VALUE',
+        help='configuration parameters to replace, values parsed as yaml, '
+             'e.g. observation_layout/mode=flat')
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--warmup-steps', type=int, default=100)
+    parser.add_argument('--allocation-steps', type=int, default=200)
+    parser.add_argument(
+        '--episode-steps', type=int, default=500,
+        help='steps after which an episode is reset if not done before')
+    parser.add_argument(
+        '--rpc-latency', type=float, default=0.0,
+        help='artificial latency of each fake simulator rpc in seconds')
+    parser.add_argument(
+        '--command-latency', type=float, default=0.0,
+        help='artificial duration of each velocity command in seconds')
+    parser.add_argument(
+        '--replay', default='',
+        help='directory of recorded transitions to replay in the uav '
+             'environment instead of the fake simulation')
+    parser.add_argument(
+        '--json', default='', help='file to write the results to as json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """ Runs the benchmarks. """
+    args = parse_args(argv)
+    config = load_config(args.config, parse_overrides(args.set))
+    # rospy time is used by the environments without an initialized node
+    rospy.rostime.set_rostime_initialized(True)
+
+    results = [benchmark(name, config, args) for name in args.envs]
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the decoding of airsim camera images into observations.
+Compares the decoding time and the peak memory allocated per frame of the
+previous decoding path with the current one. Run from src/ros_gym with:
+
+    python3 -m benchmarks.image_decoding
+"""
+
+import argparse
+import timeit
+import tracemalloc
+import numpy as np
+from gym_airsim.robot_airsim_env import RobotAirSimEnv
+from image_ring_buffer import ImageRingBuffer
+
+
+class FakeImageResponse(object):
+    """
+    Stands in for an airsim image response as received over rpc.
+    """
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.image_data_uint8 = \
+            np.random.randint(
+                0, 256, size=height * width * 4, dtype=np.uint8).tobytes()
+        self.image_data_float = \
+            np.random.uniform(0.0, 100.0, size=height * width).tolist()
+
+
+def legacy_image_to_numpy(airsim_img):
+    """ The previous rgba decoding path. """
+    try:
+        img1d = np.fromstring(airsim_img.image_data_uint8, dtype=np.uint8)
+    except ValueError:
+        # binary fromstring is removed in recent numpy, it was a copy
+        img1d = \
+            np.frombuffer(airsim_img.image_data_uint8, dtype=np.uint8).copy()
+    img_rgba = img1d.reshape(airsim_img.height, airsim_img.width, 4)
+    return np.flipud(img_rgba)
+
+
+def legacy_depth_image_to_numpy(airsim_img):
+    """ The previous depth decoding path. """
+    img_depth = np.array(airsim_img.image_data_float, dtype=np.float32)
+    return img_depth.reshape(airsim_img.height, airsim_img.width)
+
+
+def measure(decode, repeats):
+    """
+    Returns the mean time in ms and the mean peak memory in bytes allocated
+    within a call of decode, which includes temporaries freed before the
+    call returns.
+    """
+    decode()
+    time_ms = \
+        min(timeit.repeat(decode, number=repeats, repeat=3)) / repeats * 1e3
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeats):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = decode()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            del result
+    finally:
+        tracemalloc.stop()
+    return time_ms, float(np.mean(peaks))
+
+
+def main():
+    """ Runs the benchmark and prints the results per frame. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--buffer-size', type=int, default=2)
+    args = parser.parse_args()
+
+    response = FakeImageResponse(args.height, args.width)
+    rgba_buffer = \
+        ImageRingBuffer(
+            (args.height, args.width, 4), np.uint8, args.buffer_size)
+    depth_buffer = \
+        ImageRingBuffer(
+            (args.height, args.width), np.float32, args.buffer_size)
+    cases = [
+        ('rgba before', lambda: legacy_image_to_numpy(response)),
+        ('rgba view', lambda: RobotAirSimEnv.airsim_image_to_numpy(response)),
+        ('rgba ring buffer', lambda: RobotAirSimEnv.airsim_image_to_numpy(
+            response, rgba_buffer.next())),
+        ('depth before', lambda: legacy_depth_image_to_numpy(response)),
+        ('depth', lambda: RobotAirSimEnv.airsim_depth_image_to_numpy(
+            response)),
+        ('depth ring buffer',
+         lambda: RobotAirSimEnv.airsim_depth_image_to_numpy(
+             response, depth_buffer.next())),
+    ]
+    print('{:<20}{:>16}{:>22}'.format('case', 'ms/frame', 'peak bytes/frame'))
+    for name, decode in cases:
+        time_ms, peak = measure(decode, args.repeats)
+        print('{:<20}{:>16.4f}{:>22.0f}'.format(name, time_ms, peak))
+
+
+if __name__ == '__main__':
+    main()
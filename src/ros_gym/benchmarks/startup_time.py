@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the startup time of the ros_gym node for each task environment:
+importing the node module, registering the environment in gym, making it and
+its first reset, with the uav environment running on the fake simulation.
+Each measurement runs in a new process that imports nothing of ros_gym
+before the node module, and reports which simulation and control backends
+were imported.
+
+Run from src/ros_gym with:
+    python3 -m benchmarks.startup_time [--help]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# environments benchmarked by default
+BENCHMARK_ENVS = (
+    'uav_follow_trajectory_task_env_v0',
+    'gym_cart_pole_task_env_v0',
+    'gym_mc_continuous_task_env_v0')
+
+# startup phases in the order they are run
+PHASES = ('import', 'register', 'make', 'reset')
+
+# directory the benchmark processes are run in
+ROS_GYM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def imported_backends():
+    """ Returns the simulation and control backends that were imported. """
+    # pylint: disable=import-outside-toplevel
+    from plugin_registry import SIM_BACKENDS, UAV_CONTROL_BACKENDS
+    backends = []
+    for registry in (SIM_BACKENDS, UAV_CONTROL_BACKENDS):
+        for name in registry.names():
+            module_name = registry.entry_point(name).split(':', 1)[0]
+            if module_name in sys.modules:
+                backends.append('{}:{}'.format(registry.kind, name))
+    return backends
+
+
+def measure_startup(name, args):
+    """
+    Returns the durations in seconds of the startup phases of the
+    environment of the given name, run in the current process.
+    """
+    times = {}
+    start = time.perf_counter()
+    ros_gym = importlib.import_module('ros_gym')
+    times['import'] = time.perf_counter() - start
+    # pylint: disable=import-outside-toplevel
+    import gym
+    import rospy
+    from benchmarks.env_overhead import \
+        DEFAULT_CONFIG_FILE, load_config, parse_overrides
+    from fake_simulation_handler import FakeSimulationHandler
+
+    config = \
+        load_config(
+            args.config or DEFAULT_CONFIG_FILE, parse_overrides(args.set))
+    # rospy time is used by the environments without an initialized node
+    rospy.rostime.set_rostime_initialized(True)
+    kwargs = {}
+    if name == 'uav_follow_trajectory_task_env_v0':
+        kwargs['sim_handler'] = \
+            FakeSimulationHandler(
+                step_mode=config.get('sim_step/mode', 'realtime'),
+                step_time=config.get('sim_step/time', 0.005))
+
+    start = time.perf_counter()
+    # pylint: disable=protected-access
+    gym_id = \
+        ros_gym.MavrosGym()._register(name, config['max_episode_steps'])
+    times['register'] = time.perf_counter() - start
+    registered_backends = imported_backends()
+
+    start = time.perf_counter()
+    env = gym.make(gym_id, **kwargs)
+    times['make'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    env.reset()
+    times['reset'] = time.perf_counter() - start
+    env.close()
+    return {
+        'env': name,
+        'times': times,
+        'registered_backends': registered_backends,
+        'backends': imported_backends()}
+
+
+def run_child(name, args):
+    """
+    Returns the measurements of a new process benchmarking the environment
+    of the given name.
+    """
+    command = [
+        sys.executable, '-m', 'benchmarks.startup_time', '--child', name,
+        '--set'] + args.set
+    if args.config:
+        command += ['--config', args.config]
+    output = subprocess.run(
+        command, cwd=ROS_GYM_DIR, check=True, stdout=subprocess.PIPE,
+        universal_newlines=True).stdout
+    # the environments may log to stdout before the results
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(name, args):
+    """
+    Returns the median durations of the startup phases of the environment
+    of the given name over args.repeats processes.
+    """
+    runs = [run_child(name, args) for _ in range(args.repeats)]
+    result = {
+        'env': name,
+        'repeats': args.repeats,
+        'registered_backends': runs[-1]['registered_backends'],
+        'backends': runs[-1]['backends']}
+    for phase in PHASES:
+        result[phase + '_ms'] = \
+            statistics.median(run['times'][phase] for run in runs) * 1e3
+    result['total_ms'] = sum(result[phase + '_ms'] for phase in PHASES)
+    return result
+
+
+def print_results(results):
+    """ Prints the measurements as a table. """
+    row = '{:<36}{:>10}{:>12}{:>10}{:>10}{:>10}  {}'
+    print(row.format(
+        'env', 'import ms', 'register ms', 'make ms', 'reset ms', 'total ms',
+        'backends'))
+    for result in results:
+        print(row.format(
+            result['env'],
+            '{:.1f}'.format(result['import_ms']),
+            '{:.1f}'.format(result['register_ms']),
+            '{:.1f}'.format(result['make_ms']),
+            '{:.1f}'.format(result['reset_ms']),
+            '{:.1f}'.format(result['total_ms']),
+            ', '.join(result['backends']) or '-'))
+
+
+def parse_args(argv=None):
+    """ Returns the parsed command line arguments. """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--envs', nargs='+', default=list(BENCHMARK_ENVS),
+        help='environments to benchmark')
+    parser.add_argument(
+        '--config', default='',
+        help='yaml configuration of the environments, the one of the uav '
+             'environment if not given')
+    parser.add_argument(
+        '--set', nargs='*', default=[], metavar='NAME=VALUE',
+        help='configuration parameters to replace, values parsed as yaml, '
+             'e.g. fast_reset/enabled=true')
+    parser.add_argument(
+        '--repeats', type=int, default=5,
+        help='processes started per environment, the median is reported')
+    parser.add_argument(
+        '--json', default='', help='file to write the results to as json')
+    parser.add_argument('--child', default='', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """ Runs the benchmarks. """
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(measure_startup(args.child, args)))
+        return
+
+    results = [benchmark(name, args) for name in args.envs]
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Defines the EnvWorkerPool class.
+"""
+
+import multiprocessing as mp
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import rospy
+from gym.vector import VectorEnv
+from observation_layout import ObservationLayout
+
+# byte alignment of each array in the shared memory
+SHARED_ARRAY_ALIGNMENT = 64
+
+
+def shared_layout(observation_layout, action_space, num_envs):
+    """
+    Returns the layout of the shared memory of a pool of num_envs
+    environments as a list of (name, shape, dtype, offset) entries and the
+    total size of the shared memory in bytes. The 'obs' array holds a byte
+    buffer of the observation layout per environment, followed by the
+    'action', 'reward' and 'done' arrays.
+
+    Parameters
+    ----------
+    observation_layout: ObservationLayout
+        Layout of the observations of a single environment
+    action_space: gym.Space
+        Action space of a single environment
+    num_envs: int
+        Number of environments in the pool
+    """
+    arrays = [
+        ('obs', (observation_layout.nbytes,), np.uint8),
+        ('action', action_space.shape, action_space.dtype),
+        ('reward', (), np.float64),
+        ('done', (), np.bool_)]
+
+    layout = []
+    offset = 0
+    for name, shape, dtype in arrays:
+        shape = (num_envs,) + tuple(shape)
+        dtype = np.dtype(dtype)
+        layout.append((name, shape, dtype.str, offset))
+        size = int(np.prod(shape)) * dtype.itemsize
+        offset += -(-size // SHARED_ARRAY_ALIGNMENT) * SHARED_ARRAY_ALIGNMENT
+    return layout, offset
+
+
+def shared_arrays(buffer, layout):
+    """
+    Returns the numpy arrays of the given layout on top of the buffer.
+
+    Parameters
+    ----------
+    buffer: memoryview
+        Buffer of the shared memory
+    layout: list
+        Layout as returned by shared_layout()
+    """
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer,
+                         offset=offset)
+        for name, shape, dtype, offset in layout}
+
+
+class WorkerError(object):
+    """
+    The traceback of an exception raised in a worker, sent to the pool
+    instead of the reply to the command.
+
+    Parameters
+    ----------
+    index: int
+        Index of the worker
+    formatted: str
+        The formatted traceback of the exception
+    """
+    def __init__(self, index, formatted):
+        self.index = index
+        self.formatted = formatted
+
+    def raise_error(self):
+        """ Raises the error of the worker in the pool. """
+        raise RuntimeError(
+            'Worker {} of the env pool failed:\n{}'.format(
+                self.index, self.formatted))
+
+
+def _worker(index, env_fn, robot_name_space, pipe):
+    """
+    Runs a single environment of the pool in its own ros node. The spaces
+    and the observation layout of the environment are sent to the pool on
+    startup, after which the worker attaches to the shared memory and serves
+    the 'reset', 'step' and 'close' commands of the pool. Observations,
+    rewards and dones are written to the shared memory, only the step info
+    is sent back over the pipe, or a WorkerError if the command raised.
+    """
+    rospy.init_node(
+        'ros_gym_worker_{}'.format(index),
+        anonymous=True,
+        log_level=rospy.INFO)
+    rospy.set_param('~robot_name_space', robot_name_space)
+    # pylint: disable=broad-except
+    try:
+        env = env_fn()
+        # environments writing their observations into buffers of a layout
+        # share that layout, otherwise the Dict space is laid out
+        buffers = getattr(env.unwrapped, 'observation_buffers', None)
+        layout = \
+            ObservationLayout(env.observation_space) if buffers is None \
+            else buffers.layout
+    except Exception:
+        pipe.send(WorkerError(index, traceback.format_exc()))
+        return
+    pipe.send((env.observation_space, env.action_space, layout))
+
+    shm_name, shm_layout = pipe.recv()
+    shm = SharedMemory(name=shm_name)
+    arrays = shared_arrays(shm.buf, shm_layout)
+    obs_buffer = arrays['obs'][index]
+    obs_views = layout.batch_views(obs_buffer)
+
+    def write_obs(obs):
+        last = None
+        if buffers is not None:
+            last = buffers.flat if layout.flat else buffers.views
+        if obs is last:
+            # the whole observation is moved with a single copy
+            obs_buffer[...] = buffers.buffer
+        elif layout.flat:
+            obs_views[...] = obs
+        else:
+            for key, value in obs.items():
+                obs_views[key][...] = value
+
+    def run(command):
+        if command == 'reset':
+            write_obs(env.reset())
+            return None
+        obs, reward, done, info = env.step(arrays['action'][index])
+        write_obs(obs)
+        arrays['reward'][index] = reward
+        arrays['done'][index] = done
+        return info
+
+    try:
+        while True:
+            command = pipe.recv()
+            if command == 'close':
+                break
+            # errors are sent to the pool, which raises them
+            try:
+                reply = run(command)
+            except Exception:
+                reply = WorkerError(index, traceback.format_exc())
+            pipe.send(reply)
+    finally:
+        # the views on the shared memory must be released before closing it,
+        # the names stay bound as the closures above refer to them
+        obs_views = obs_buffer = arrays = None
+        env.close()
+        shm.close()
+        pipe.send(None)
+
+
+class EnvWorkerPool(VectorEnv):
+    """
+    A vectorized environment that runs each environment in a subprocess with
+    its own ros node, since rospy only allows a single node per process. The
+    observations, actions, rewards and dones of all environments are
+    exchanged through a single shared memory, so that the pipes to the
+    workers only carry small control messages. The observation of each
+    environment is stored as a buffer of its ObservationLayout, so that
+    observations of the views and flat modes are moved with a single copy
+    and all observations of the pool are copied at once. The episode of an
+    environment is reset automatically once it is done, in which case the
+    last observation of the episode is returned in the 'terminal_observation'
+    entry of its info.
+
+    Parameters
+    ----------
+    env_fn: callable
+        Picklable function that creates the environment in a worker
+    robot_name_spaces: list
+        The robot namespace of each worker, one worker is started per
+        namespace
+    copy: bool
+        Whether to return the stacked observations as views on a copy of the
+        shared memory, otherwise views on the shared memory are returned,
+        which are overwritten on each step.
+    """
+    def __init__(self, env_fn, robot_name_spaces, copy=True):
+        self.copy = copy
+        # workers must not inherit the ros node of this process
+        context = mp.get_context('spawn')
+        self._pipes = []
+        self._processes = []
+        for index, robot_name_space in enumerate(robot_name_spaces):
+            parent_pipe, child_pipe = context.Pipe()
+            process = \
+                context.Process(
+                    target=_worker,
+                    name='ros_gym_worker_{}'.format(index),
+                    args=(index, env_fn, robot_name_space, child_pipe),
+                    daemon=True)
+            process.start()
+            child_pipe.close()
+            self._pipes.append(parent_pipe)
+            self._processes.append(process)
+
+        try:
+            spaces = self._receive(self._pipes)
+        except RuntimeError:
+            for process in self._processes:
+                process.terminate()
+            raise
+        observation_space, action_space, self.observation_layout = \
+            spaces[0]
+        super(EnvWorkerPool, self).__init__(
+            len(self._pipes), observation_space, action_space)
+
+        layout, size = \
+            shared_layout(
+                self.observation_layout, action_space, self.num_envs)
+        self._shm = SharedMemory(create=True, size=max(size, 1))
+        self._arrays = shared_arrays(self._shm.buf, layout)
+        self._observations = \
+            self.observation_layout.batch_views(self._arrays['obs'])
+        for pipe in self._pipes:
+            pipe.send((self._shm.name, layout))
+
+    def reset_async(self):
+        """ Requests a reset of all environments. """
+        for pipe in self._pipes:
+            pipe.send('reset')
+
+    def reset_wait(self, **kwargs):
+        """
+        Waits for the reset of all environments.
+
+        Returns
+        -------
+        obs: dict
+            Observations of all environments stacked along the first axis
+        """
+        self._receive(self._pipes)
+        return self._get_observations()
+
+    def step_async(self, actions):
+        """
+        Writes the actions to the shared memory and requests a step of all
+        environments.
+
+        Parameters
+        ----------
+        actions: np.array
+            Actions of all environments stacked along the first axis
+        """
+        self._arrays['action'][...] = actions
+        for pipe in self._pipes:
+            pipe.send('step')
+
+    def step_wait(self):
+        """
+        Waits for the step of all environments and resets the environments
+        whose episode is done.
+
+        Returns
+        -------
+        obs: dict
+            Observations of all environments stacked along the first axis
+        rewards: np.array
+            Reward of each environment
+        dones: np.array
+            Whether the episode of each environment has finished
+        infos: list
+            Info of each environment
+        """
+        infos = self._receive(self._pipes)
+        dones = np.copy(self._arrays['done'])
+        rewards = np.copy(self._arrays['reward'])
+        for index in np.flatnonzero(dones):
+            infos[index]['terminal_observation'] = \
+                self.observation_layout.batch_views(
+                    np.copy(self._arrays['obs'][index]))
+            self._pipes[index].send('reset')
+        self._receive([self._pipes[index] for index in np.flatnonzero(dones)])
+        return self._get_observations(), rewards, dones, infos
+
+    @staticmethod
+    def _receive(pipes):
+        """
+        Returns the replies of the given workers, raising the first error of
+        a worker once all replies are received, so that the pipes stay in
+        sync.
+        """
+        replies = [pipe.recv() for pipe in pipes]
+        for reply in replies:
+            if isinstance(reply, WorkerError):
+                reply.raise_error()
+        return replies
+
+    def close_extras(self, **kwargs):
+        """ Stops all workers and releases the shared memory. """
+        for pipe in self._pipes:
+            pipe.send('close')
+        for pipe, process in zip(self._pipes, self._processes):
+            pipe.recv()
+            process.join()
+        self._observations = None
+        self._arrays = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def _get_observations(self):
+        """
+        Returns the stacked observations of all environments, copied with a
+        single copy of their buffers if copy is set.
+        """
+        if self.copy:
+            return self.observation_layout.batch_views(
+                np.copy(self._arrays['obs']))
+        return self._observations
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Defines the EpisodeMonitor wrapper writing episode statistics and camera
+frames in a background thread.
+"""
+
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import numpy as np
+import rospy
+import gym
+
+# prefix of the statistics files, followed by the run and the rotation index
+STATS_PREFIX = 'episodes'
+# prefix of the frame files, followed by the run and the episode
+VIDEO_PREFIX = 'video'
+
+
+class EpisodeMonitor(gym.Wrapper):
+    """
+    Records the reward, length and duration of each episode and optionally
+    the camera frames of every video_interval-th episode.
+
+    The records are queued to a background thread, which appends the
+    statistics in batches to a json lines file and writes the frames of an
+    episode to a compressed npz file. A statistics file is compressed with
+    gzip once it exceeds max_file_bytes, and the oldest files of the
+    directory, including those of previous runs, are deleted while the files
+    exceed max_bytes. The step loop never waits on the disk; records are
+    dropped if more than queue_size are pending.
+
+    Parameters
+    ----------
+    env: gym.Env
+        The environment to monitor
+    directory: str
+        Directory of the monitor files, which is created if required
+    video_key: str
+        Key of the dict observation to record as frames, no frames are
+        recorded if empty
+    video_interval: int
+        Frames are recorded for every video_interval-th episode
+    frame_skip: int
+        A frame is recorded every frame_skip steps
+    max_frames: int
+        Maximum number of frames recorded per episode
+    flush_interval: Float
+        Maximum time in seconds the statistics are kept before being written
+    flush_episodes: int
+        Number of pending episodes after which the statistics are written
+    max_file_bytes: int
+        Size after which a statistics file is compressed and a new one begun
+    max_bytes: int
+        Maximum size of all files in the directory, not limited if 0
+    queue_size: int
+        Maximum number of records waiting to be written
+    """
+    def __init__(
+            self,
+            env,
+            directory,
+            video_key='',
+            video_interval=100,
+            frame_skip=1,
+            max_frames=1000,
+            flush_interval=10.0,
+            flush_episodes=100,
+            max_file_bytes=1 << 20,
+            max_bytes=1 << 30,
+            queue_size=64):
+        super(EpisodeMonitor, self).__init__(env)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.video_key = video_key
+        self.video_interval = video_interval
+        self.frame_skip = max(frame_skip, 1)
+        self.max_frames = max_frames
+        self.flush_interval = flush_interval
+        self.flush_episodes = flush_episodes
+        self.max_file_bytes = max_file_bytes
+        self.max_bytes = max_bytes
+        self.run = time.strftime('%Y%m%d-%H%M%S')
+        self.dropped = 0
+        self.episode = -1
+        self.total_steps = 0
+        self._episode_rewards = []
+        self._episode_lengths = []
+        self._reward = 0.0
+        self._length = 0
+        self._done = True
+        self._start_time = None
+        self._frames = None
+        self._rotation = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    @property
+    def stats_file(self):
+        """ Returns the statistics file currently appended to. """
+        return os.path.join(
+            self.directory,
+            '{}.{}.{:04d}.jsonl'.format(
+                STATS_PREFIX, self.run, self._rotation))
+
+    def reset(self, **kwargs):
+        """
+        Ends the current episode and starts the next one.
+        """
+        self._end_episode()
+        obs = self.env.reset(**kwargs)
+        self.episode += 1
+        self._reward = 0.0
+        self._length = 0
+        self._done = False
+        self._start_time = time.time()
+        self._frames = \
+            [] if (
+                self.video_key and isinstance(obs, dict) and
+                self.episode % self.video_interval == 0) else None
+        self._record_frame(obs)
+        return obs
+
+    def step(self, action):
+        """ Steps the environment and accumulates the episode statistics. """
+        obs, reward, done, info = self.env.step(action)
+        self._reward += reward
+        self._length += 1
+        self.total_steps += 1
+        self._done = done
+        if self._length % self.frame_skip == 0:
+            self._record_frame(obs)
+        if done:
+            self._end_episode()
+        return obs, reward, done, info
+
+    def get_total_steps(self):
+        """ Returns the number of steps taken, as gym's Monitor does. """
+        return self.total_steps
+
+    def get_episode_rewards(self):
+        """ Returns the rewards of the ended episodes. """
+        return self._episode_rewards
+
+    def get_episode_lengths(self):
+        """ Returns the lengths of the ended episodes. """
+        return self._episode_lengths
+
+    def _record_frame(self, obs):
+        """ Keeps a copy of the frame if the episode is recorded. """
+        if self._frames is not None and len(self._frames) < self.max_frames:
+            self._frames.append(np.array(obs[self.video_key]))
+
+    def _end_episode(self):
+        """ Queues the records of the episode unless already ended. """
+        if self._start_time is None:
+            return
+        self._episode_rewards.append(self._reward)
+        self._episode_lengths.append(self._length)
+        self._put({
+            'episode': self.episode,
+            'length': self._length,
+            'reward': float(self._reward),
+            'done': bool(self._done),
+            'duration': time.time() - self._start_time,
+            'timestamp': time.time()})
+        if self._frames:
+            self._put((self.episode, self._frames))
+        self._frames = None
+        self._start_time = None
+
+    def _put(self, record):
+        """ Queues a record, dropping it if the queue is full. """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self):
+        """ Writes the queued records until the monitor is closed. """
+        pending = []
+        first_pending = 0.0
+        closed = False
+        while not closed:
+            # waits for the first record, then until the flush is due
+            timeout = None
+            if pending:
+                timeout = \
+                    max(first_pending + self.flush_interval -
+                        time.monotonic(), 0.0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = ()
+            if record is None:
+                closed = True
+            elif isinstance(record, dict):
+                if not pending:
+                    first_pending = time.monotonic()
+                pending.append(record)
+            elif record:
+                self._try(self._write_video, *record)
+            if pending and (
+                    closed or len(pending) >= self.flush_episodes or
+                    time.monotonic() - first_pending >= self.flush_interval):
+                self._try(self._write_stats, pending)
+                pending = []
+
+    @staticmethod
+    def _try(write, *args):
+        """ Logs the errors of writing instead of stopping the writer. """
+        try:
+            write(*args)
+        except OSError as exc:
+            rospy.logerr('Failed to write monitor file: {}'.format(exc))
+
+    def _write_stats(self, records):
+        """
+        Appends the statistics to the current file and compresses it once it
+        exceeds max_file_bytes.
+        """
+        path = self.stats_file
+        with open(path, 'a') as output:
+            output.writelines(json.dumps(record) + '\n' for record in records)
+        if os.path.getsize(path) >= self.max_file_bytes:
+            with open(path, 'rb') as source, \
+                    gzip.open(path + '.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(path)
+            self._rotation += 1
+        self._enforce_budget()
+
+    def _write_video(self, episode, frames):
+        """ Writes the frames of an episode to a compressed npz file. """
+        path = \
+            os.path.join(
+                self.directory,
+                '{}.{}.episode_{:06d}.npz'.format(
+                    VIDEO_PREFIX, self.run, episode))
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, frames=np.stack(frames))
+        os.replace(tmp_path, path)
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        """
+        Deletes the oldest monitor files while all files exceed max_bytes,
+        except the statistics file currently appended to.
+        """
+        if self.max_bytes <= 0:
+            return
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and \
+                    entry.name.startswith((STATS_PREFIX, VIDEO_PREFIX)) and \
+                    entry.path != self.stats_file:
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        total = sum(size for _, _, size in files)
+        if os.path.exists(self.stats_file):
+            total += os.path.getsize(self.stats_file)
+        for _, path, size in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def close(self):
+        """
+        Ends the current episode and waits for the pending records to be
+        written.
+        """
+        if self._thread.is_alive():
+            self._end_episode()
+            self._queue.put(None)
+            self._thread.join()
+            if self.dropped:
+                rospy.logwarn(
+                    'Dropped {} monitor records as the writer was '
+                    'behind.'.format(self.dropped))
+        return super(EpisodeMonitor, self).close()
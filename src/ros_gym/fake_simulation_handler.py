@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Defines the FakeSimulationHandler class and its fake robot state, camera and
+collision sources.
+"""
+
+import math
+import time
+from simulation_handler import SimulationHandler
+
+# realtime and lock step modes as in the airsim handler, which behave the
+# same in the fake simulation
+STEP_MODE_REALTIME = 'realtime'
+STEP_MODE_LOCK_STEP = 'lock_step'
+
+
+class FakeRecord(object):
+    """
+    A plain record with the given fields as attributes, standing in for the
+    airsim message types such as Vector3r or MultirotorState.
+    """
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def _vector(x_val=0.0, y_val=0.0, z_val=0.0):
+    """ Returns a fake airsim Vector3r. """
+    return FakeRecord(x_val=x_val, y_val=y_val, z_val=z_val)
+
+
+class FakeKinematics(object):
+    """
+    The deterministic kinematics of a fake multirotor, which follows the
+    commanded velocities exactly. Positions are in the NED frame of airsim,
+    so heights are negative z values.
+
+    Parameters
+    ----------
+    position: tuple
+        Initial [x, y, z] position
+    yaw: Float
+        Initial yaw in radians
+    """
+    def __init__(self, position=(0.0, 0.0, 0.0), yaw=0.0):
+        self.initial_position = tuple(position)
+        self.initial_yaw = yaw
+        self.stamp = 0
+        kinematics = FakeRecord(
+            position=_vector(),
+            orientation=FakeRecord(w_val=1.0, x_val=0.0, y_val=0.0, z_val=0.0),
+            linear_velocity=_vector(),
+            angular_velocity=_vector())
+        # the state is updated in place, as the env reads it right away
+        self.state = FakeRecord(
+            kinematics_estimated=kinematics,
+            gps_location=FakeRecord(latitude=0.0, longitude=0.0, altitude=0.0),
+            timestamp=0)
+        self.yaw = yaw
+        self.set_pose(self.initial_position, self.initial_yaw)
+
+    def set_pose(self, position, yaw):
+        """ Moves the robot to the given pose at rest. """
+        kinematics = self.state.kinematics_estimated
+        (kinematics.position.x_val, kinematics.position.y_val,
+         kinematics.position.z_val) = position
+        self._set_yaw(yaw)
+        self.set_velocity(0.0, 0.0, 0.0, 0.0)
+        self._update_gps()
+
+    def pose(self):
+        """ Returns the [x, y, z] position and yaw of the robot. """
+        position = self.state.kinematics_estimated.position
+        return (position.x_val, position.y_val, position.z_val), self.yaw
+
+    def set_velocity(self, vel_x, vel_y, vel_z, yaw_rate):
+        """ Sets the linear velocities and the yaw rate. """
+        kinematics = self.state.kinematics_estimated
+        (kinematics.linear_velocity.x_val, kinematics.linear_velocity.y_val,
+         kinematics.linear_velocity.z_val) = vel_x, vel_y, vel_z
+        kinematics.angular_velocity.z_val = yaw_rate
+
+    def advance(self, duration):
+        """ Moves the robot with its velocities for duration seconds. """
+        kinematics = self.state.kinematics_estimated
+        position = kinematics.position
+        velocity = kinematics.linear_velocity
+        position.x_val += velocity.x_val * duration
+        position.y_val += velocity.y_val * duration
+        position.z_val += velocity.z_val * duration
+        self._set_yaw(
+            self.yaw + kinematics.angular_velocity.z_val * duration)
+        self._update_gps()
+        self.stamp += int(duration * 1e9)
+        self.state.timestamp = self.stamp
+
+    def _set_yaw(self, yaw):
+        """ Sets the yaw and the orientation quaternion of the yaw. """
+        self.yaw = yaw
+        orientation = self.state.kinematics_estimated.orientation
+        orientation.w_val = math.cos(yaw / 2.0)
+        orientation.z_val = math.sin(yaw / 2.0)
+
+    def _update_gps(self):
+        """ Derives the gps coordinates from the position. """
+        # about 111 km per degree close to the origin
+        position = self.state.kinematics_estimated.position
+        gps = self.state.gps_location
+        gps.latitude = position.x_val / 111000.0
+        gps.longitude = position.y_val / 111000.0
+        gps.altitude = -position.z_val
+
+
+class FakeCamera(object):
+    """
+    A fake camera returning constant scene and depth images in the format of
+    airsim image responses. The image data is created once, so that fetching
+    an image costs nothing but the configured latency.
+
+    Parameters
+    ----------
+    shape: tuple
+        (height, width) of the scene images
+    depth_shape: tuple
+        (height, width) of the depth images, shape if not given
+    """
+    def __init__(self, shape=(144, 256), depth_shape=None):
+        height, width = shape
+        depth_height, depth_width = depth_shape or shape
+        self.scene = FakeRecord(
+            height=height,
+            width=width,
+            image_data_uint8=bytes(
+                (index * 7) % 256 for index in range(height * width * 4)),
+            image_data_float=[])
+        self.depth = FakeRecord(
+            height=depth_height,
+            width=depth_width,
+            image_data_uint8=b'',
+            image_data_float=[
+                1.0 + (index % depth_width) * 0.01
+                for index in range(depth_height * depth_width)])
+
+    def response(self, pixels_as_float):
+        """ Returns the depth image if pixels_as_float else the scene. """
+        return self.depth if pixels_as_float else self.scene
+
+
+class FakeCollisions(object):
+    """
+    Reports a collision once the robot has gone below the ground, i.e. z is
+    larger than ground_z in the NED frame, until it is cleared.
+
+    Parameters
+    ----------
+    ground_z: Float
+        z value of the ground
+    """
+    def __init__(self, ground_z=0.0):
+        self.ground_z = ground_z
+        self.has_collided = False
+
+    def update(self, kinematics):
+        """ Checks the robot position for a collision. """
+        if kinematics.state.kinematics_estimated.position.z_val > \
+                self.ground_z:
+            self.has_collided = True
+
+    def clear(self):
+        """ Forgets past collisions. """
+        self.has_collided = False
+
+
+class FakeSimulationHandler(SimulationHandler):
+    """
+    A deterministic in-process simulation handler implementing the client
+    surface of the airsim handler, so that environments can be run and
+    benchmarked without a simulator or ROS master. Every call that is an rpc
+    of the airsim handler sleeps for rpc_latency seconds and every velocity
+    command for command_latency seconds.
+
+    Parameters
+    ----------
+    step_mode: str
+        Either 'realtime' or 'lock_step', which only differ in the rpcs made
+        per step as with airsim
+    step_time: Float
+        Simulation time in seconds each velocity command moves the robot for
+    rpc_latency: Float
+        Artificial latency of each rpc in seconds
+    command_latency: Float
+        Artificial duration of each velocity command in seconds
+    image_shape: tuple
+        (height, width) of the scene images
+    depth_image_shape: tuple
+        (height, width) of the depth images, image_shape if not given
+    vehicle_name: str
+        Name of the vehicle, only kept for compatibility
+    """
+    def __init__(
+            self,
+            step_mode=STEP_MODE_REALTIME,
+            step_time=0.005,
+            rpc_latency=0.0,
+            command_latency=0.0,
+            image_shape=(144, 256),
+            depth_image_shape=None,
+            vehicle_name=''):
+        self.step_mode = step_mode
+        self.step_time = step_time
+        self.rpc_latency = rpc_latency
+        self.command_latency = command_latency
+        self.vehicle_name = vehicle_name
+        self.join_commands = True
+        self.kinematics, self.camera, self.collisions = \
+            self._make_sources(image_shape, depth_image_shape)
+        self.paused = False
+        self.armed = False
+        self.rpc_count = 0
+        self._start_pose = None
+        self._new_state = True
+        self._new_images = True
+        self._new_collision = True
+        self._image_requests = []
+        self._image_request_index = {}
+        self._image_responses = []
+        super(FakeSimulationHandler, self).__init__()
+
+    # pylint: disable=no-self-use
+    def _make_sources(self, image_shape, depth_image_shape):
+        """
+        Returns the kinematics, camera and collision sources of the fake
+        simulation.
+        """
+        return (
+            FakeKinematics(),
+            FakeCamera(image_shape, depth_image_shape),
+            FakeCollisions())
+
+    def _rpc(self):
+        """ Counts an rpc and waits for its latency. """
+        self.rpc_count += 1
+        if self.rpc_latency > 0.0:
+            time.sleep(self.rpc_latency)
+
+    def _command(self, duration):
+        """ Moves the robot with its commanded velocities. """
+        self.kinematics.advance(duration)
+        self.collisions.update(self.kinematics)
+        if self.command_latency > 0.0:
+            time.sleep(self.command_latency)
+
+    def invalidate_cache(self):
+        """ Marks the cached state, images and collision as outdated. """
+        self._new_state = True
+        self._new_images = True
+        self._new_collision = True
+
+    def prefetch(self):
+        """ Fetches the state, collision and images in a single rpc. """
+        self.invalidate_cache()
+        self._rpc()
+        self._new_state = False
+        self._new_images = False
+        self._new_collision = False
+        self._image_responses = self._responses()
+
+    def check_connection(self):
+        """ Checks the connection to the fake simulation. """
+        self._rpc()
+
+    def reset(self):
+        """ Moves the robot back to its initial pose and disarms it. """
+        self._rpc()
+        self.kinematics.set_pose(
+            self.kinematics.initial_position, self.kinematics.initial_yaw)
+        self.collisions.clear()
+        self.armed = False
+        self.invalidate_cache()
+
+    def save_start_state(self):
+        """ Saves the current pose as the start pose of fast resets. """
+        self._rpc()
+        self._start_pose = self.kinematics.pose()
+
+    def fast_reset(self):
+        """ Moves the robot back to the saved start pose at rest. """
+        if self._start_pose is None:
+            return False
+        self._rpc()
+        self.kinematics.set_pose(*self._start_pose)
+        self.collisions.clear()
+        self.invalidate_cache()
+        return True
+
+    def pause(self):
+        """ Pauses the fake simulation. """
+        self._rpc()
+        self.paused = True
+
+    def unpause(self):
+        """ Unpauses the fake simulation. """
+        self._rpc()
+        self.paused = False
+        self.invalidate_cache()
+
+    def step(self, apply_action):
+        """ Runs a single environment step as the airsim handler does. """
+        if self.step_mode != STEP_MODE_LOCK_STEP:
+            super(FakeSimulationHandler, self).step(apply_action)
+            return
+        self.invalidate_cache()
+        apply_action()
+        self._rpc()
+        self._command(self.step_time)
+        # the pause state is queried once the window has elapsed
+        self._rpc()
+
+    def client_arm(self, arm_req):
+        """ Arms or disarms the robot. """
+        self._rpc()
+        self.armed = arm_req
+        if not arm_req:
+            # a disarmed robot falls to the ground
+            position, yaw = self.kinematics.pose()
+            self.kinematics.set_pose(
+                (position[0], position[1], self.collisions.ground_z), yaw)
+        return True
+
+    def client_takeoff(self, takeoff_z):
+        """ Moves the robot to the takeoff height. """
+        self._rpc()
+        position, yaw = self.kinematics.pose()
+        self.kinematics.set_pose((position[0], position[1], -takeoff_z), yaw)
+        return True
+
+    def client_land(self):
+        """ Moves the robot to the ground. """
+        self._rpc()
+        position, yaw = self.kinematics.pose()
+        self.kinematics.set_pose(
+            (position[0], position[1], self.collisions.ground_z), yaw)
+        return True
+
+    def client_cmd_vel(self, vel_x, vel_y, vel_z, yaw_rate):
+        """ Sends the commanded velocity to the robot. """
+        self._rpc()
+        self.kinematics.set_velocity(vel_x, vel_y, vel_z, yaw_rate)
+        if self.step_mode != STEP_MODE_LOCK_STEP:
+            self._command(self.step_time)
+
+    def join_command(self):
+        """ Commands complete immediately in the fake simulation. """
+
+    @property
+    def client_state(self):
+        """ Returns the fake multirotor state of the robot. """
+        if self._new_state:
+            self._rpc()
+            self._new_state = False
+        return self.kinematics.state
+
+    def set_image_requests(self, image_requests):
+        """ Sets the images that are fetched in a single rpc. """
+        self._image_request_index = {}
+        for request in image_requests:
+            self._image_request_index.setdefault(
+                tuple(request), len(self._image_request_index))
+        self._image_requests = list(self._image_request_index)
+        self._new_images = True
+
+    def _responses(self):
+        """ Returns the responses of the requested images. """
+        return [
+            self.camera.response(request[3])
+            for request in self._image_requests]
+
+    @property
+    def client_images(self):
+        """ Returns the responses of all the requested images. """
+        if self._new_images:
+            if self._image_requests:
+                self._rpc()
+                self._image_responses = self._responses()
+            self._new_images = False
+        return self._image_responses
+
+    def client_image(
+            self,
+            camera_index,
+            image_type,
+            compress=False,
+            pixels_as_float=False):
+        """ Returns the image of the given camera and type. """
+        request = (camera_index, image_type, compress, pixels_as_float)
+        index = self._image_request_index.get(request)
+        if index is not None:
+            return self.client_images[index]
+        self._rpc()
+        return self.camera.response(pixels_as_float)
+
+    def client_camera(self, camera_index):
+        """ Returns the scene image of the given camera. """
+        return self.client_image(camera_index, 'scene')
+
+    def client_camera_depth(self, camera_index):
+        """ Returns the depth image of the given camera. """
+        return self.client_image(
+            camera_index, 'depth_planner', pixels_as_float=True)
+
+    @property
+    def client_collision_check(self):
+        """ Checks if the robot has collided. """
+        if self._new_collision:
+            self._rpc()
+            self._new_collision = False
+        return self.collisions.has_collided
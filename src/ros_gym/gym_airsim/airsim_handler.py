@@ -4,6 +4,7 @@ Defines the AirsimHandler class.
 """
 
 import sys
+import time
 import rospy
 import airsim
 from simulation_handler import SimulationHandler
@@ -11,16 +12,103 @@ from .setup_path import SetupPath
 
 SetupPath.add_airsim_module_path()
 
+# simulation is run freely between pause and unpause calls
+STEP_MODE_REALTIME = 'realtime'
+# simulation is advanced by a fixed amount of sim time/frames per step
+STEP_MODE_LOCK_STEP = 'lock_step'
+# maximum wall time in seconds waited for the simulation to pause again at
+# the end of a lock step
+LOCK_STEP_TIMEOUT = 5.0
+# fraction of the wall time of the previous step window slept before the
+# pause state is first queried at the end of a lock step
+LOCK_STEP_WINDOW_MARGIN = 0.9
+# wall time in seconds between the first queries of the pause state, which
+# is doubled after each query up to LOCK_STEP_MAX_POLL_PERIOD
+LOCK_STEP_POLL_PERIOD = 0.0005
+LOCK_STEP_MAX_POLL_PERIOD = 0.016
+
+AIRSIM_IMAGE_TYPES_MAP = {
+    'scene': airsim.ImageType.Scene,
+    'depth_planner': airsim.ImageType.DepthPlanner,
+    'depth_perspective': airsim.ImageType.DepthPerspective,
+    'depth_vis': airsim.ImageType.DepthVis,
+    'segmentation': airsim.ImageType.Segmentation,
+    'surface_normals': airsim.ImageType.SurfaceNormals,
+    'infrared': airsim.ImageType.Infrared
+}
+
 
 class AirsimHandler(SimulationHandler):
     """
     The simulation handler for airsim.
+
+    Parameters
+    ----------
+    step_mode: str
+        Either 'realtime' or 'lock_step'. In lock step mode each environment
+        step advances the simulation by exactly step_time seconds or
+        step_frames physics frames of simulation time.
+    step_time: Float
+        Duration of the velocity command of each step in seconds. In lock
+        step mode this is also the simulation time advanced per step.
+    step_frames: int
+        If greater than zero, the lock step mode advances the simulation by
+        this number of physics frames instead of step_time. The duration of
+        a frame depends on the frame rate of the simulator, which is not
+        known to the client, so step_time must be at least the simulation
+        time of these frames for the velocity command to last the whole
+        step.
+    vehicle_name: str
+        Name of the airsim vehicle controlled by this handler. The default
+        vehicle is used if empty.
+    client: airsim.MultirotorClient
+        Client connected to airsim. A client shared between the handlers of
+        several vehicles in the same world may be given, otherwise a new
+        client is created.
+    reset_world: bool
+        Whether reset() resets the complete airsim world or only moves the
+        vehicle of this handler back to its initial pose. Handlers of vehicles
+        sharing a world should not reset the world.
     """
     # pylint: disable=broad-except
-    def __init__(self):
+    def __init__(
+            self,
+            step_mode=STEP_MODE_REALTIME,
+            step_time=0.005,
+            step_frames=0,
+            vehicle_name='',
+            client=None,
+            reset_world=True):
+        if step_mode not in (STEP_MODE_REALTIME, STEP_MODE_LOCK_STEP):
+            raise NotImplementedError(
+                'Simulation step mode ' + step_mode + ' not supported.')
+        self.step_mode = step_mode
+        self.step_time = step_time
+        self.step_frames = step_frames
+        self.vehicle_name = vehicle_name
+        self.reset_world = reset_world
+        # velocity commands are only waited upon directly in realtime mode if
+        # set, otherwise join_command() must be called
+        self.join_commands = True
         self._new_state = True
-        self._client = None
+        self._new_images = True
+        self._new_collision = True
+        self._client = client
         self._multirotor_state = None
+        self._collision_info = None
+        self._init_pose = None
+        self._start_pose = None
+        self._collision_stamp = 0
+        self._cmd_future = None
+        # the connection is checked on the next step after a failed one
+        self._step_failed = False
+        # wall time the last lock step window took until the simulation had
+        # paused again
+        self._window_wall_time = 0.0
+        self._prefetched = {}
+        self._image_requests = []
+        self._image_request_index = {}
+        self._image_responses = []
 
         super(AirsimHandler, self).__init__()
 
@@ -28,18 +116,58 @@ class AirsimHandler(SimulationHandler):
         """
         Performs initial simulation setup
         """
-        self._client = airsim.MultirotorClient()
+        if self._client is None:
+            self._client = self.connect()
+
+        self._client.enableApiControl(True, vehicle_name=self.vehicle_name)
+        self._client.armDisarm(False, vehicle_name=self.vehicle_name)
+        self._init_pose = \
+            self._client.simGetVehiclePose(vehicle_name=self.vehicle_name)
+        super(AirsimHandler, self).setup()
+
+    @staticmethod
+    def connect():
+        """
+        Returns a new client connected to airsim.
+        """
+        client = airsim.MultirotorClient()
         try:
-            self._client.confirmConnection()
+            client.confirmConnection()
         except Exception as _:
             rospy.logfatal(
                 """Failed to connect to an airsim client.
                 Please start AirSim to continue...""")
             sys.exit()
+        return client
 
-        self._client.enableApiControl(True)
-        self._client.armDisarm(False)
-        super(AirsimHandler, self).setup()
+    def invalidate_cache(self):
+        """
+        Marks the cached robot state, images and collision info as outdated.
+        """
+        self._new_state = True
+        self._new_images = True
+        self._new_collision = True
+        self._prefetched = {}
+
+    def prefetch(self):
+        """
+        Requests the robot state, collision info and images from the client
+        without waiting for the responses. These are then read from the
+        responses by client_state, client_collision_check and client_images.
+        Prefetching on several handlers sharing a client pipelines all of
+        their requests in a single round trip.
+        """
+        self.invalidate_cache()
+        # uses the underlying rpc client of airsim for asynchronous calls
+        rpc_client = self._client.client
+        self._prefetched['state'] = \
+            rpc_client.call_async('getMultirotorState', self.vehicle_name)
+        self._prefetched['collision'] = \
+            rpc_client.call_async('simGetCollisionInfo', self.vehicle_name)
+        if self._image_requests:
+            self._prefetched['images'] = \
+                rpc_client.call_async(
+                    'simGetImages', self._image_requests, self.vehicle_name)
 
     def check_connection(self):
         """
@@ -47,21 +175,90 @@ class AirsimHandler(SimulationHandler):
         is working fine
         """
         # if api control got disabled by some error then enable it
-        if not self._client.isApiControlEnabled():
+        if not self._client.isApiControlEnabled(
+                vehicle_name=self.vehicle_name):
             rospy.loginfo('Re-enabling api control.')
-            self._client.enableApiControl(True)
+            self._client.enableApiControl(True, vehicle_name=self.vehicle_name)
 
     def reset(self):
         """
-        Resets the simulation world
+        Resets the simulation world or if reset_world is not set, moves the
+        vehicle back to its initial pose with zero velocities.
         """
         try:
-            self._client.reset()
-            self._client.enableApiControl(True)
-            self._client.armDisarm(False)
+            if self.reset_world:
+                self._client.reset()
+                self._collision_stamp = 0
+            else:
+                self._set_kinematics(self._init_pose)
+                self._ignore_past_collisions()
+            self._client.enableApiControl(True, vehicle_name=self.vehicle_name)
+            self._client.armDisarm(False, vehicle_name=self.vehicle_name)
+            self.invalidate_cache()
         except Exception as _:
             rospy.logerr("Failed to reset simulation.")
 
+    def save_start_state(self):
+        """
+        Saves the current pose of the vehicle, e.g. hovering after takeoff,
+        as the start pose of fast resets.
+        """
+        try:
+            self._start_pose = \
+                self._client.simGetVehiclePose(vehicle_name=self.vehicle_name)
+        except Exception as _:
+            self._start_pose = None
+            rospy.logerr('Failed to save start state.')
+
+    def fast_reset(self):
+        """
+        Teleports the vehicle to the saved start pose with zero velocities
+        while it stays armed and under api control.
+
+        Returns
+        -------
+        bool
+            Whether the fast reset was performed.
+        """
+        if self._start_pose is None:
+            return False
+        try:
+            self._set_kinematics(self._start_pose)
+            self._ignore_past_collisions()
+            self.invalidate_cache()
+            return True
+        except Exception as _:
+            rospy.logerr('Failed to fast reset simulation.')
+            return False
+
+    def _set_kinematics(self, pose):
+        """
+        Teleports the vehicle to the given pose with zero velocities.
+        """
+        if hasattr(self._client, 'simSetKinematics'):
+            kinematics = airsim.KinematicsState()
+            kinematics.position = pose.position
+            kinematics.orientation = pose.orientation
+            self._client.simSetKinematics(
+                kinematics, True, vehicle_name=self.vehicle_name)
+        else:
+            # older clients can only set the pose, so the remaining velocity
+            # is stopped by a zero velocity command
+            self._client.simSetVehiclePose(
+                pose, True, vehicle_name=self.vehicle_name)
+            self._client.moveByVelocityAsync(
+                0.0, 0.0, 0.0, self.step_time,
+                vehicle_name=self.vehicle_name)
+
+    def _ignore_past_collisions(self):
+        """
+        Airsim keeps reporting the last collision until the world is reset,
+        so collisions up to now are ignored after moving the vehicle.
+        """
+        self._collision_stamp = \
+            self._client.simGetCollisionInfo(
+                vehicle_name=self.vehicle_name).time_stamp
+
     def pause(self):
         """
         Pauses the simulation world
@@ -77,10 +274,80 @@ class AirsimHandler(SimulationHandler):
         """
         try:
             self._client.simPause(False)
-            self._new_state = True
+            self.invalidate_cache()
         except Exception as _:
             rospy.logerr('Failed to unpause simulation.')
 
+    def step(self, apply_action):
+        """
+        Runs the simulation for a single environment step. In lock step mode
+        the action is queued while the simulation is paused and the simulation
+        is then advanced by exactly one step window. As advancing returns
+        immediately, the step waits until the simulation has paused itself
+        again at the end of the window, so that the observations are taken
+        after the full window, see _wait_for_pause().
+
+        Parameters
+        ----------
+        apply_action: callable
+            Function that sends the action of this step to the robot
+        """
+        if self._step_failed:
+            self._step_failed = False
+            self.check_connection()
+        if self.step_mode != STEP_MODE_LOCK_STEP:
+            super(AirsimHandler, self).step(apply_action)
+            return
+        self.invalidate_cache()
+        apply_action()
+        try:
+            start = time.monotonic()
+            if self.step_frames > 0:
+                self._client.simContinueForFrames(self.step_frames)
+            else:
+                self._client.simContinueForTime(self.step_time)
+            if not self._wait_for_pause(start):
+                self._step_failed = True
+                rospy.logerr(
+                    'Simulation did not pause within {} s after advancing '
+                    'it.'.format(LOCK_STEP_TIMEOUT))
+        except Exception as _:
+            self._step_failed = True
+            rospy.logerr('Failed to advance simulation.')
+
+    def _wait_for_pause(self, start):
+        """
+        Waits until the simulation has paused itself at the end of the step
+        window. Most of the wall time the previous window took is slept
+        before the pause state is queried, with periods doubling between the
+        following queries, so that a step usually makes a single query.
+
+        Parameters
+        ----------
+        start: Float
+            Monotonic time at which the simulation was advanced
+
+        Returns
+        -------
+        bool
+            Whether the simulation paused within LOCK_STEP_TIMEOUT.
+        """
+        deadline = start + LOCK_STEP_TIMEOUT
+        sleep_time = \
+            start + LOCK_STEP_WINDOW_MARGIN * self._window_wall_time - \
+            time.monotonic()
+        if sleep_time > 0.0:
+            time.sleep(sleep_time)
+        period = LOCK_STEP_POLL_PERIOD
+        while not self._client.simIsPause():
+            now = time.monotonic()
+            if now >= deadline:
+                return False
+            time.sleep(min(period, deadline - now))
+            period = min(2.0 * period, LOCK_STEP_MAX_POLL_PERIOD)
+        self._window_wall_time = time.monotonic() - start
+        return True
+
     def client_arm(self, arm_req):
         """
         Arms or disarms the robot as requested.
@@ -90,7 +357,7 @@ class AirsimHandler(SimulationHandler):
         arm_req: bool
             Arm or disarm?
         """
-        return self._client.armDisarm(arm_req)
+        return self._client.armDisarm(arm_req, vehicle_name=self.vehicle_name)
 
     def client_takeoff(self, takeoff_z):
         """
@@ -103,13 +370,17 @@ class AirsimHandler(SimulationHandler):
         """
         # airsim uses NED frame but we use xyz frame so invert z
         return self._client.moveToZAsync(
-            z=-takeoff_z, velocity=1.0, timeout_sec=2.0).join()
+            z=-takeoff_z,
+            velocity=1.0,
+            timeout_sec=2.0,
+            vehicle_name=self.vehicle_name).join()
 
     def client_land(self):
         """
         Calls the land command on the robot.
         """
-        return self._client.landAsync(timeout_sec=5).join()
+        return self._client.landAsync(
+            timeout_sec=5, vehicle_name=self.vehicle_name).join()
 
     def client_cmd_vel(self, vel_x, vel_y, vel_z, yaw_rate):
         """
@@ -136,8 +407,28 @@ class AirsimHandler(SimulationHandler):
         yaw_cmd = airsim.YawMode()
         yaw_cmd.is_rate = True
         yaw_cmd.yaw_or_rate = yaw_rate
-        self._client.moveByVelocityAsync(
-            vel_x, vel_y, vel_z, yaw_mode=yaw_cmd, duration=0.005).join()
+        self._cmd_future = self._client.moveByVelocityAsync(
+            vel_x,
+            vel_y,
+            vel_z,
+            yaw_mode=yaw_cmd,
+            duration=self.step_time,
+            vehicle_name=self.vehicle_name)
+        if self.step_mode == STEP_MODE_LOCK_STEP:
+            # the command only completes after the simulation is advanced
+            # in step() so it cannot be waited upon here
+            self._cmd_future = None
+            return
+        if self.join_commands:
+            self.join_command()
+
+    def join_command(self):
+        """
+        Waits for the last velocity command sent to the robot to complete.
+        """
+        if self._cmd_future is not None:
+            self._cmd_future.join()
+            self._cmd_future = None
 
     @property
     def client_state(self):
@@ -145,10 +436,102 @@ class AirsimHandler(SimulationHandler):
         Returns the state of the robot from client.
         """
         if self._new_state:
-            self._multirotor_state = self._client.getMultirotorState()
+            if 'state' in self._prefetched:
+                self._multirotor_state = \
+                    airsim.MultirotorState.from_msgpack(
+                        self._prefetched.pop('state').get())
+            else:
+                self._multirotor_state = \
+                    self._client.getMultirotorState(
+                        vehicle_name=self.vehicle_name)
             self._new_state = False
         return self._multirotor_state
 
+    @staticmethod
+    def _to_airsim_image_request(image_request):
+        """
+        Converts an image request tuple to airsim image request.
+
+        Parameters
+        ----------
+        image_request: tuple
+            (camera_index, image_type, compress, pixels_as_float) where
+            image_type is a key of AIRSIM_IMAGE_TYPES_MAP
+        """
+        camera_index, image_type, compress, pixels_as_float = image_request
+        return airsim.ImageRequest(
+            camera_index,
+            AIRSIM_IMAGE_TYPES_MAP[image_type],
+            pixels_as_float=pixels_as_float,
+            compress=compress)
+
+    def set_image_requests(self, image_requests):
+        """
+        Sets the images that are fetched together in a single rpc call after
+        every unpause of the simulation.
+
+        Parameters
+        ----------
+        image_requests: list
+            List of (camera_index, image_type, compress, pixels_as_float)
+            tuples
+        """
+        self._image_request_index = {}
+        for request in image_requests:
+            self._image_request_index.setdefault(
+                tuple(request), len(self._image_request_index))
+        self._image_requests = [
+            self._to_airsim_image_request(request)
+            for request in self._image_request_index]
+        self._new_images = True
+
+    @property
+    def client_images(self):
+        """
+        Returns the responses of all the requested images from client.
+        """
+        if self._new_images:
+            if 'images' in self._prefetched:
+                self._image_responses = [
+                    airsim.ImageResponse.from_msgpack(response)
+                    for response in self._prefetched.pop('images').get()]
+            elif self._image_requests:
+                self._image_responses = \
+                    self._client.simGetImages(
+                        self._image_requests, vehicle_name=self.vehicle_name)
+            self._new_images = False
+        return self._image_responses
+
+    def client_image(
+            self,
+            camera_index,
+            image_type,
+            compress=False,
+            pixels_as_float=False):
+        """
+        Returns the image of the given camera and type from the client. Images
+        that are part of the requested images are taken from the batched
+        response, any other image is fetched on its own.
+
+        Parameters
+        ----------
+        camera_index: str
+            Camera index
+        image_type: str
+            Image type as defined in AIRSIM_IMAGE_TYPES_MAP
+        compress: bool
+            Whether the image should be compressed
+        pixels_as_float: bool
+            Whether the image pixels should be floats
+        """
+        request = (camera_index, image_type, compress, pixels_as_float)
+        index = self._image_request_index.get(request)
+        if index is not None:
+            return self.client_images[index]
+        return self._client.simGetImages(
+            [self._to_airsim_image_request(request)],
+            vehicle_name=self.vehicle_name)[0]
+
     def client_camera(self, camera_index):
         """
         Returns the image of the given camera from the client.
@@ -158,15 +541,7 @@ class AirsimHandler(SimulationHandler):
         camera_index: int
             Camera index
         """
-        responses = \
-            self._client.simGetImages([
-                airsim.ImageRequest(
-                    camera_index,
-                    airsim.ImageType.Scene,
-                    False,
-                    False)
-                ])
-        return responses[0]
+        return self.client_image(camera_index, 'scene')
 
     def client_camera_depth(self, camera_index):
         """
@@ -177,19 +552,23 @@ class AirsimHandler(SimulationHandler):
         camera_index: int
             Camera index
         """
-        responses = \
-            self._client.simGetImages([
-                airsim.ImageRequest(
-                    camera_index,
-                    airsim.ImageType.DepthPlanner,
-                    True,
-                    False)
-                ])
-        return responses[0]
+        return self.client_image(
+            camera_index, 'depth_planner', pixels_as_float=True)
 
     @property
     def client_collision_check(self):
         """
         Checks if the robot has collided.
         """
-        return self._client.simGetCollisionInfo().has_collided
+        if self._new_collision:
+            if 'collision' in self._prefetched:
+                self._collision_info = \
+                    airsim.CollisionInfo.from_msgpack(
+                        self._prefetched.pop('collision').get())
+            else:
+                self._collision_info = \
+                    self._client.simGetCollisionInfo(
+                        vehicle_name=self.vehicle_name)
+            self._new_collision = False
+        return self._collision_info.has_collided and \
+            self._collision_info.time_stamp > self._collision_stamp
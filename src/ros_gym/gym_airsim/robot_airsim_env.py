@@ -6,6 +6,8 @@ Defines the RobotAirSimEnv class.
 import numpy as np
 from geometry_msgs.msg import PoseStamped, TwistStamped
 from robot_sim_env import RobotSimEnv, WorldState
+from image_ring_buffer import ImageRingBuffer
+from task_config import get_config
 from .airsim_handler import AirsimHandler
 
 
@@ -15,8 +17,42 @@ class RobotAirSimEnv(RobotSimEnv, WorldState):
     All functionality that is provided by airsim and is common between any
     type of robot is defined here.
     """
-    def __init__(self):
-        super(RobotAirSimEnv, self).__init__(AirsimHandler())
+    def __init__(self, sim_handler=None):
+        if sim_handler is None:
+            sim_handler = self.make_sim_handler()
+        super(RobotAirSimEnv, self).__init__(sim_handler)
+        # number of preallocated arrays each camera image is decoded into
+        self.image_buffer_size = \
+            get_config().get('image_buffer_size', 0)
+        self._image_buffers = {}
+        self._setup_image_requests()
+
+    @staticmethod
+    def make_sim_handler(**kwargs):
+        """
+        Returns an airsim handler configured from the ros parameters.
+
+        Parameters
+        ----------
+        kwargs: dict
+            Additional arguments passed to AirsimHandler
+        """
+        config = get_config()
+        return AirsimHandler(
+            step_mode=config.get('sim_step/mode', 'realtime'),
+            step_time=config.get('sim_step/time', 0.005),
+            step_frames=config.get('sim_step/frames', 0),
+            **kwargs)
+
+    def _setup_image_requests(self):
+        """
+        Registers the images required by the observation space with the
+        airsim handler so that they are fetched in a single rpc call per step.
+        """
+        self.sim_handler.set_image_requests([
+            request for key, request in self.image_requests.items()
+            if self.observation_dict_space is None or
+            key in self.observation_dict_space.spaces])
 
     @staticmethod
     def airsim_to_ros_pose(airsim_position, airsim_orientation):
@@ -66,60 +102,112 @@ class RobotAirSimEnv(RobotSimEnv, WorldState):
         return ros_twist
 
     @staticmethod
-    def airsim_image_to_numpy(airsim_img):
+    def airsim_image_to_numpy(airsim_img, out=None):
         """
-        Converts airsim image to numpy image.
+        Converts airsim image to numpy image. The image is a flipped view on
+        the rpc byte buffer unless an output array is given.
 
         Parameters
         ----------
         airsim_img:  Airsim Image Type
+        out: np.array
+            Optional preallocated array of shape (height, width, 4) to copy
+            the image into
 
         Returns
         -------
         img_rgba: np.array
             An RGBA image as numpy array
         """
-        img1d = \
-            np.fromstring(
-                airsim_img.image_data_uint8, dtype=np.uint8)
         img_rgba = \
-            img1d.reshape(
-                airsim_img.height, airsim_img.width, 4)
+            np.frombuffer(
+                airsim_img.image_data_uint8, dtype=np.uint8).reshape(
+                    airsim_img.height, airsim_img.width, 4)
         img_rgba = np.flipud(img_rgba)
-        return img_rgba
+        if out is None:
+            return img_rgba
+        np.copyto(out, img_rgba)
+        return out
 
     @staticmethod
-    def airsim_depth_image_to_numpy(airsim_img):
+    def airsim_depth_image_to_numpy(airsim_img, out=None):
         """
         Converts airsim image to numpy image.
 
         Parameters
         ----------
         airsim_img:  Airsim Image Type
+        out: np.array
+            Optional preallocated array of shape (height, width) to write the
+            image into
 
         Returns
         -------
         img_depth: np.array
             Image depth as numpy array
         """
-        img_depth = \
-            np.array(airsim_img.image_data_float, dtype=np.float32)
-        img_depth = img_depth.reshape(airsim_img.height, airsim_img.width)
-        return img_depth
-
-    def camera(self, camera_index):
+        # airsim sends the depth as a list of floats, which is converted as a
+        # whole, straight into out if given so that no temporary is created
+        if out is None:
+            return np.array(
+                airsim_img.image_data_float, dtype=np.float32).reshape(
+                    airsim_img.height, airsim_img.width)
+        out.reshape(-1)[:] = airsim_img.image_data_float
+        return out
+
+    def _next_image_buffer(self, key, shape, dtype):
         """
-        Returns the front camera image.
+        Returns the next preallocated array for the image with the given key
+        or None if images are not decoded into preallocated arrays.
+        """
+        if self.image_buffer_size <= 0:
+            return None
+        image_buffer = self._image_buffers.get(key)
+        if image_buffer is None or image_buffer.shape != shape:
+            image_buffer = \
+                ImageRingBuffer(shape, dtype, self.image_buffer_size)
+            self._image_buffers[key] = image_buffer
+        return image_buffer.next()
+
+    def camera(self, camera_index, out=None):
         """
-        return self.airsim_image_to_numpy(
-            self.sim_handler.client_camera(camera_index))
+        Returns the front camera image.
 
-    def camera_depth(self, camera_index):
+        Parameters
+        ----------
+        camera_index: str
+            Index of the camera
+        out: np.array
+            Optional array to write the image into
+        """
+        airsim_img = self.sim_handler.client_camera(camera_index)
+        if out is None:
+            out = \
+                self._next_image_buffer(
+                    (camera_index, 'scene'),
+                    (airsim_img.height, airsim_img.width, 4),
+                    np.uint8)
+        return self.airsim_image_to_numpy(airsim_img, out)
+
+    def camera_depth(self, camera_index, out=None):
         """
         Returns the front camera image depth.
+
+        Parameters
+        ----------
+        camera_index: str
+            Index of the camera
+        out: np.array
+            Optional array to write the image into
         """
-        return self.airsim_depth_image_to_numpy(
-            self.sim_handler.client_camera_depth(camera_index))
+        airsim_img = self.sim_handler.client_camera_depth(camera_index)
+        if out is None:
+            out = \
+                self._next_image_buffer(
+                    (camera_index, 'depth_planner'),
+                    (airsim_img.height, airsim_img.width),
+                    np.float32)
+        return self.airsim_depth_image_to_numpy(airsim_img, out)
 
     @property
     def collision_check(self):
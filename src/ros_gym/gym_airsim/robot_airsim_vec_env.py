@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Defines the RobotAirSimVecEnv class.
+"""
+
+from copy import deepcopy
+import numpy as np
+from gym.vector import VectorEnv
+from .airsim_handler import AirsimHandler
+from .robot_airsim_env import RobotAirSimEnv
+
+
+class RobotAirSimVecEnv(VectorEnv):
+    """
+    A vectorized environment that drives several vehicles of a single airsim
+    world through one client. Each vehicle is controlled by its own robot
+    environment but the simulation is stepped once for all of them and the
+    velocity commands, state reads, collision checks and image requests of
+    all vehicles are pipelined over the shared client. The episode of a
+    vehicle is reset automatically once it is done by moving it back to its
+    start state while the world stays paused, in which case the last
+    observation of the episode is returned in the 'terminal_observation'
+    entry of its info.
+
+    Parameters
+    ----------
+    env_fn: callable
+        Function returning the RobotAirSimEnv of a single vehicle given the
+        sim_handler of the vehicle.
+    vehicle_names: list
+        Names of the airsim vehicles as defined in airsim settings.json
+    max_episode_steps: int
+        Number of steps after which the episode of a vehicle is truncated. No
+        limit is applied if None.
+    copy: bool
+        Whether to return a copy of the stacked observations, otherwise the
+        same arrays are updated in place at each step.
+    """
+    # pylint: disable=protected-access
+    def __init__(
+            self, env_fn, vehicle_names, max_episode_steps=None, copy=True):
+        client = AirsimHandler.connect()
+        self.envs = [
+            env_fn(
+                RobotAirSimEnv.make_sim_handler(
+                    vehicle_name=vehicle_name,
+                    client=client,
+                    reset_world=False))
+            for vehicle_name in vehicle_names]
+        if self.envs[0].observation_dict_space is not \
+                self.envs[0].observation_space:
+            raise NotImplementedError(
+                'Only Dict observation spaces can be vectorized.')
+        for env in self.envs:
+            # commands of all vehicles are sent before waiting on them
+            env.sim_handler.join_commands = False
+        self.max_episode_steps = max_episode_steps
+        self.copy = copy
+
+        super(RobotAirSimVecEnv, self).__init__(
+            len(self.envs),
+            self.envs[0].observation_space,
+            self.envs[0].action_space)
+
+        # stacked observations are allocated on the first observation
+        self._observations = {}
+        self._rewards = np.zeros(self.num_envs, dtype=np.float64)
+        self._dones = np.zeros(self.num_envs, dtype=np.bool_)
+        self._episode_steps = np.zeros(self.num_envs, dtype=np.int64)
+        self._actions = None
+
+    @property
+    def world_handler(self):
+        """
+        Returns the handler used for operations on the shared airsim world.
+        """
+        return self.envs[0].sim_handler
+
+    def reset_async(self):
+        """ The environments are reset in reset_wait(). """
+
+    def reset_wait(self, **kwargs):
+        """
+        Resets the episodes of all vehicles.
+
+        Returns
+        -------
+        obs: dict
+            Observations of all vehicles stacked along the first axis
+        """
+        for index, env in enumerate(self.envs):
+            self._set_observation(index, env.reset())
+        self._episode_steps[:] = 0
+        self.world_handler.pause()
+        return self._get_observations()
+
+    def step_async(self, actions):
+        """
+        Sets the actions of all vehicles to be applied on step_wait().
+
+        Parameters
+        ----------
+        actions: np.array
+            Actions of all vehicles stacked along the first axis
+        """
+        self._actions = actions
+
+    def step_wait(self):
+        """
+        Applies the actions of all vehicles, steps the simulation and returns
+        the stacked results of all vehicles.
+
+        Returns
+        -------
+        obs: dict
+            Observations of all vehicles stacked along the first axis
+        rewards: np.array
+            Reward of each vehicle
+        dones: np.array
+            Whether the episode of each vehicle has finished
+        infos: list
+            Info of each vehicle
+        """
+        for env in self.envs:
+            env._ensure_connection()
+        try:
+            self.world_handler.step(self._apply_actions)
+        except Exception:
+            for env in self.envs:
+                env._check_connection = True
+            raise
+        for env in self.envs:
+            env.sim_handler.prefetch()
+
+        infos = []
+        observations = []
+        for index, env in enumerate(self.envs):
+            obs = env._get_obs()
+            done = env._is_done(obs)
+            reward = env._compute_reward(obs, done)
+            env.cumulated_episode_reward += reward
+            self._episode_steps[index] += 1
+
+            info = {}
+            if self.max_episode_steps is not None and not done and \
+                    self._episode_steps[index] >= self.max_episode_steps:
+                info['TimeLimit.truncated'] = True
+                done = True
+            observations.append(obs)
+            infos.append(info)
+            self._rewards[index] = reward
+            self._dones[index] = done
+
+        for index, env in enumerate(self.envs):
+            obs = observations[index]
+            if self._dones[index]:
+                infos[index]['terminal_observation'] = deepcopy(obs)
+                # only the vehicle is moved back to its start state, so the
+                # other vehicles do not move while the world stays paused
+                obs = env.kinematic_reset()
+                self._episode_steps[index] = 0
+            self._set_observation(index, obs)
+        if np.any(self._dones):
+            # full resets of vehicles without a start state leave the shared
+            # world running
+            self.world_handler.pause()
+
+        return (
+            self._get_observations(),
+            np.copy(self._rewards),
+            np.copy(self._dones),
+            infos)
+
+    def close_extras(self, **kwargs):
+        """ Closes the environments of all vehicles. """
+        for env in self.envs:
+            env.close()
+
+    def _apply_actions(self):
+        """
+        Sends the actions of all vehicles and waits for the commands to be
+        completed.
+        """
+        for env, action in zip(self.envs, self._actions):
+            env._set_action(action)
+        for env in self.envs:
+            env.sim_handler.join_command()
+
+    def _set_observation(self, index, obs):
+        """
+        Writes the observation of the vehicle at index into the stacked
+        observations.
+        """
+        spaces = self.single_observation_space.spaces
+        for key, value in obs.items():
+            if key not in self._observations:
+                value = np.asarray(value)
+                self._observations[key] = \
+                    np.zeros(
+                        (self.num_envs,) + value.shape,
+                        dtype=spaces[key].dtype)
+            self._observations[key][index] = value
+
+    def _get_observations(self):
+        """
+        Returns the stacked observations of all vehicles.
+        """
+        if self.copy:
+            return deepcopy(self._observations)
+        return self._observations
@@ -3,22 +3,39 @@
 Defines the GazeboHandler class.
 """
 
+import os
+import threading
+from urllib.parse import urlsplit
 import rospy
 from std_srvs.srv import Empty
+from rosgraph_msgs.msg import Clock
 from gazebo_msgs.msg import ODEPhysics
-from gazebo_msgs.srv import SetPhysicsProperties, SetPhysicsPropertiesRequest
+from gazebo_msgs.srv import GetPhysicsProperties, SetPhysicsProperties, \
+    SetPhysicsPropertiesRequest
 from std_msgs.msg import Float64
 from geometry_msgs.msg import Vector3
 from simulation_handler import SimulationHandler
+from service_pool import SERVICE_POOL
 
 
+# services of gazebo_ros, resolved within the namespace of the gazebo
+# instance
 GAZEBO_SERVICES_MAP = {
     'reset': ['/gazebo/reset_world', Empty],
     'pause': ['/gazebo/pause_physics', Empty],
     'unpause': ['/gazebo/unpause_physics', Empty],
+    'get_physics': ['/gazebo/get_physics_properties', GetPhysicsProperties],
     'set_physics': ['/gazebo/set_physics_properties', SetPhysicsProperties]
 }
 
+# simulation is run freely between pause and unpause calls
+STEP_MODE_REALTIME = 'realtime'
+# simulation is advanced by a fixed number of physics iterations per step
+STEP_MODE_LOCK_STEP = 'lock_step'
+
+# address of the gazebo master if GAZEBO_MASTER_URI is not set
+GAZEBO_MASTER_DEFAULT = ('localhost', 11345)
+
 ODE_PHYSICS_DEFAULT = ODEPhysics()
 ODE_PHYSICS_DEFAULT.auto_disable_bodies = False
 ODE_PHYSICS_DEFAULT.sor_pgs_precon_iters = 0
@@ -36,11 +53,51 @@ class GazeboHandler(SimulationHandler):
     """
     The simulation handler for performing pause, unpause, spawn, etc operations
     in gazebo.
+
+    Parameters
+    ----------
+    update_physics_params_at_start: bool
+        Whether to update the physics parameters at startup
+    step_mode: str
+        Either 'realtime' or 'lock_step'. In lock step mode each environment
+        step runs exactly step_iterations physics iterations through the
+        world control topic of gazebo.
+    step_iterations: int
+        Number of physics iterations of a step in lock step mode
+    step_timeout: Float
+        Wall time in seconds to wait for a lock step to complete
+    name_space: str
+        Namespace of the gazebo_ros services and of the clock of the gazebo
+        instance, so that each robot of an env worker pool runs in its own
+        gazebo world
+    master_uri: str
+        Uri of the gazebo master whose world is stepped in lock step mode,
+        GAZEBO_MASTER_URI if empty
     """
-    def __init__(self, update_physics_params_at_start=False):
-        super(GazeboHandler, self).__init__()
+    def __init__(
+            self,
+            update_physics_params_at_start=False,
+            step_mode=STEP_MODE_REALTIME,
+            step_iterations=1,
+            step_timeout=5.0,
+            name_space='',
+            master_uri=''):
+        if step_mode not in (STEP_MODE_REALTIME, STEP_MODE_LOCK_STEP):
+            raise NotImplementedError(
+                'Simulation step mode ' + step_mode + ' not supported.')
         self.update_physics_params_at_start = update_physics_params_at_start
+        self.step_mode = step_mode
+        self.step_iterations = step_iterations
+        self.step_timeout = step_timeout
+        self.name_space = name_space
+        self.master_uri = master_uri
         self.services = {}
+        self._world_control = None
+        self._clock_sub = None
+        self._time_step = None
+        self._sim_time = None
+        self._clock_condition = threading.Condition()
+        super(GazeboHandler, self).__init__()
 
     def setup(self):
         """
@@ -48,13 +105,84 @@ class GazeboHandler(SimulationHandler):
         """
         # Get simulation handler services
         for name, _ in GAZEBO_SERVICES_MAP.items():
-            sname = GAZEBO_SERVICES_MAP[name][0]
+            sname = self.name_space + GAZEBO_SERVICES_MAP[name][0]
             stype = GAZEBO_SERVICES_MAP[name][1]
             self._check_service_ready(sname)
-            self.services[name] = rospy.ServiceProxy(sname, stype)
+            self.services[name] = SERVICE_POOL.client(sname, stype)
+
+        if self.step_mode == STEP_MODE_LOCK_STEP:
+            # imported here as it is only required for stepping
+            from .gazebo_world_control import GazeboWorldControl
+            self._world_control = \
+                GazeboWorldControl(
+                    address=gazebo_master_address(self.master_uri))
+            self._clock_sub = \
+                rospy.Subscriber(
+                    self.name_space + '/clock', Clock,
+                    callback=self._clock_cb)
+            rospy.on_shutdown(self.close)
 
         super(GazeboHandler, self).setup()
 
+        if self.step_mode == STEP_MODE_LOCK_STEP:
+            self._time_step = self.services['get_physics']().time_step
+
+    def _clock_cb(self, msg):
+        with self._clock_condition:
+            self._sim_time = msg.clock.to_sec()
+            self._clock_condition.notify_all()
+
+    def step(self, apply_action):
+        """
+        Runs the simulation for a single environment step. In lock step mode
+        the action is applied while the simulation is paused and the world is
+        then advanced by exactly step_iterations physics iterations. The step
+        blocks until the simulation clock has reached the end of the step.
+
+        Parameters
+        ----------
+        apply_action: callable
+            Function that sends the action of this step to the robot
+        """
+        if self.step_mode != STEP_MODE_LOCK_STEP:
+            super(GazeboHandler, self).step(apply_action)
+            return
+        apply_action()
+        with self._clock_condition:
+            # the end of the step is only known once the clock is received
+            if not self._clock_condition.wait_for(
+                    lambda: self._sim_time is not None,
+                    timeout=self.step_timeout):
+                rospy.logerr(
+                    'No simulation clock received within {} seconds.'.format(
+                        self.step_timeout))
+            start_time = self._sim_time
+        self._world_control.step(self.step_iterations)
+        if start_time is None:
+            return
+        # allows for rounding errors of the published clock
+        end_time = \
+            start_time + (self.step_iterations - 0.5) * self._time_step
+        with self._clock_condition:
+            if not self._clock_condition.wait_for(
+                    lambda: self._sim_time >= end_time,
+                    timeout=self.step_timeout):
+                rospy.logerr(
+                    'Simulation did not complete the step within '
+                    '{} seconds.'.format(self.step_timeout))
+
+    def close(self):
+        """
+        Closes the connection to the world control topic and stops
+        receiving the clock.
+        """
+        if self._clock_sub is not None:
+            self._clock_sub.unregister()
+            self._clock_sub = None
+        if self._world_control is not None:
+            self._world_control.close()
+            self._world_control = None
+
     def reset(self):
         """
         Resets the simulation world
@@ -120,3 +248,20 @@ class GazeboHandler(SimulationHandler):
             rospy.logerr(
                 'Service {} unavailable due to following '.format(name) +
                 'error: {}'.format(exc))
+
+
+def gazebo_master_address(master_uri=''):
+    """
+    Returns the (host, port) address of a gazebo master uri such as
+    'http://localhost:11345', taken from the GAZEBO_MASTER_URI environment
+    variable if empty.
+    """
+    master_uri = master_uri or os.environ.get('GAZEBO_MASTER_URI', '')
+    if not master_uri:
+        return GAZEBO_MASTER_DEFAULT
+    if '//' not in master_uri:
+        master_uri = '//' + master_uri
+    parts = urlsplit(master_uri)
+    return (
+        parts.hostname or GAZEBO_MASTER_DEFAULT[0],
+        parts.port or GAZEBO_MASTER_DEFAULT[1])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Defines the GazeboWorldControl class.
+"""
+
+import asyncio
+import threading
+import pygazebo
+from pygazebo.msg import world_control_pb2
+
+
+class GazeboWorldControl(object):
+    """
+    Keeps a persistent connection to the world control topic of the gazebo
+    transport, which gazebo_ros does not expose as a service. The connection
+    is served by an asyncio event loop running in a background thread.
+
+    Parameters
+    ----------
+    world_name: str
+        Name of the gazebo world
+    address: tuple
+        (host, port) of the gazebo master
+    """
+    def __init__(self, world_name='default', address=('localhost', 11345)):
+        self._loop = asyncio.new_event_loop()
+        self._thread = \
+            threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._publisher = self._run(self._connect(world_name, address))
+
+    def _run(self, coroutine):
+        """
+        Runs the coroutine on the event loop and waits for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @staticmethod
+    async def _connect(world_name, address):
+        """
+        Connects to gazebo and advertises the world control topic.
+        """
+        manager = await pygazebo.connect(address=address)
+        publisher = \
+            await manager.advertise(
+                '/gazebo/{}/world_control'.format(world_name),
+                'gazebo.msgs.WorldControl')
+        await publisher.wait_for_listener()
+        return publisher
+
+    def step(self, iterations):
+        """
+        Requests gazebo to run the given number of physics iterations after
+        which the world is paused again.
+
+        Parameters
+        ----------
+        iterations: int
+            Number of physics iterations to run
+        """
+        message = world_control_pb2.WorldControl()
+        message.multi_step = iterations
+        self._run(self._publisher.publish(message))
+
+    def close(self):
+        """
+        Stops the event loop serving the connection.
+        """
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
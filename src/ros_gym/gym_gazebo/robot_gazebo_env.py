@@ -4,13 +4,98 @@ Defines the RobotGazeboEnv class.
 """
 
 from robot_sim_env import RobotSimEnv, WorldState
+from task_config import get_config
 from .gazebo_handler import GazeboHandler
 
 
 class RobotGazeboEnv(RobotSimEnv, WorldState):
     """
     The base class for all robots that use gazebo simulator for training.
+
+    Parameters
+    ----------
+    robot_name_space: str
+        Namespace of the topics and services of the robot
+    update_physics_params_at_start: bool
+        Whether to update the physics parameters at startup
+    sim_handler: SimulationHandler
+        The simulation handler, a gazebo handler configured from the ros
+        parameters if not given
     """
-    def __init__(self, robot_name_space, update_physics_params_at_start=True):
-        super(RobotGazeboEnv, self).__init__(
-            robot_name_space, GazeboHandler(update_physics_params_at_start))
+    def __init__(
+            self,
+            robot_name_space='',
+            update_physics_params_at_start=True,
+            sim_handler=None):
+        self.robot_name_space = robot_name_space
+        if sim_handler is None:
+            name_space, master_uri = self.gazebo_instance(robot_name_space)
+            sim_handler = self.make_sim_handler(
+                update_physics_params_at_start=update_physics_params_at_start,
+                name_space=name_space,
+                master_uri=master_uri)
+        super(RobotGazeboEnv, self).__init__(sim_handler)
+
+    @staticmethod
+    def gazebo_instance(robot_name_space):
+        """
+        Returns the namespace and the master uri of the gazebo instance
+        simulating the robot. The robots of the env worker pool each run in
+        their own gazebo instance under the robot namespace, at the master
+        uri of the same index in worker_gazebo_master_uris if given. Other
+        robots share the global gazebo instance.
+        """
+        config = get_config()
+        name_spaces = config.get('worker_name_spaces', ())
+        if robot_name_space not in name_spaces:
+            return '', ''
+        master_uris = config.get('worker_gazebo_master_uris', ())
+        index = name_spaces.index(robot_name_space)
+        return \
+            robot_name_space, \
+            master_uris[index] if index < len(master_uris) else ''
+
+    @staticmethod
+    def check_worker_pool(robot_name_spaces):
+        """
+        Raises a ValueError unless each robot namespace of an env worker pool
+        has its own gazebo instance, as the workers would otherwise pause,
+        step and reset the same world.
+
+        Parameters
+        ----------
+        robot_name_spaces: list
+            The robot namespace of each worker
+        """
+        if '' in robot_name_spaces or \
+                len(set(robot_name_spaces)) != len(robot_name_spaces):
+            raise ValueError(
+                'Each gazebo worker runs in its own gazebo instance under its '
+                'robot namespace, so worker_name_spaces must be distinct and '
+                'not empty.')
+        config = get_config()
+        if config.get('sim_step/mode', 'realtime') != 'lock_step':
+            return
+        master_uris = config.get('worker_gazebo_master_uris', ())
+        if len(master_uris) != len(robot_name_spaces) or \
+                len(set(master_uris)) != len(master_uris):
+            raise ValueError(
+                'Lock step gazebo workers step the world of their own gazebo '
+                'master, set a distinct worker_gazebo_master_uris entry per '
+                'worker namespace.')
+
+    @staticmethod
+    def make_sim_handler(**kwargs):
+        """
+        Returns a gazebo handler configured from the ros parameters.
+
+        Parameters
+        ----------
+        kwargs: dict
+            Additional arguments passed to GazeboHandler
+        """
+        config = get_config()
+        return GazeboHandler(
+            step_mode=config.get('sim_step/mode', 'realtime'),
+            step_iterations=config.get('sim_step/iterations', 1),
+            **kwargs)
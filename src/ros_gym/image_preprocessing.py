@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Defines the FrameStack and ImagePreprocessor classes.
+"""
+
+import numpy as np
+from gym.spaces import Box
+from image_ring_buffer import ImageRingBuffer
+
+# luminance weights of the red, green and blue channels
+GRAYSCALE_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class FrameStack(object):
+    """
+    Stacks the last k frames along the first axis without shifting any data.
+    Frames are appended to a strip of preallocated frames and the stack is a
+    view on the last k of them. When the strip is full, the last k - 1 frames
+    are copied back to its start, so frames are only copied once per strip
+    length steps. A returned stack stays unchanged for valid_steps further
+    pushes, also across resets.
+
+    Parameters
+    ----------
+    frame_shape: tuple
+        Shape of a single frame
+    dtype: np.dtype
+        Data type of the frames
+    k: int
+        Number of frames in the stack
+    valid_steps: int
+        Number of pushes a returned stack stays unchanged
+    """
+    def __init__(self, frame_shape, dtype, k, valid_steps=1):
+        self.k = k
+        # long enough that rewinding to the start of the strip never
+        # overwrites the stacks of the last valid_steps pushes
+        self._data = \
+            np.zeros((3 * k + max(valid_steps, 1),) + tuple(frame_shape),
+                     dtype=dtype)
+        self._frames = list(self._data)
+        self._end = 0
+        self._fill_start = None
+        self.reset()
+
+    @property
+    def shape(self):
+        """ Returns the shape of the stack. """
+        return (self.k,) + self._data.shape[1:]
+
+    def reset(self):
+        """
+        Starts a new sequence, whose first frame fills the whole stack.
+        """
+        self._fill_start = \
+            self._end if self._end + self.k <= len(self._frames) else 0
+
+    def next_frame(self):
+        """
+        Returns the array the next frame is to be written into.
+        """
+        if self._fill_start is not None:
+            return self._frames[self._fill_start + self.k - 1]
+        if self._end == len(self._frames):
+            self._data[:self.k - 1] = self._data[self._end - self.k + 1:]
+            self._end = self.k - 1
+        return self._frames[self._end]
+
+    def push(self):
+        """
+        Appends the frame written into next_frame() and returns the stack of
+        the last k frames.
+        """
+        if self._fill_start is not None:
+            start, self._fill_start = self._fill_start, None
+            self._data[start:start + self.k - 1] = \
+                self._data[start + self.k - 1]
+            self._end = start + self.k
+        else:
+            self._end += 1
+        return self._data[self._end - self.k:self._end]
+
+
+class ImagePreprocessor(object):
+    """
+    Preprocesses the images of an observation key. Images are area-resized
+    by integer factors, reduced to their first channels or to grayscale,
+    clipped, scaled and stacked over the last frames, in this order. All
+    intermediate results are written into preallocated arrays.
+
+    Parameters
+    ----------
+    space: gym.spaces.Box
+        Space of the raw images of shape (height, width) or
+        (height, width, channels)
+    resize: list
+        Target [height, width] of the image, which must divide the raw size
+    channels: int
+        Number of leading channels to keep, e.g. 3 to drop alpha
+    grayscale: bool
+        Whether to convert the rgb channels to a single grayscale channel
+    clip: list
+        [min, max] range the values are clipped to, e.g. for depth images
+    scale: Float
+        Factor the values are multiplied with after clipping
+    stack: int
+        Number of last frames stacked along a new first axis
+    valid_steps: int
+        Number of steps a returned image stays unchanged if no output array
+        is given, a new array is returned per step if 0
+    """
+    def __init__(
+            self, space, resize=None, channels=None, grayscale=False,
+            clip=None, scale=None, stack=1, valid_steps=1):
+        shape = tuple(space.shape)
+        self.valid_steps = valid_steps
+        self.factors = None
+        if resize is not None:
+            height, width = resize
+            if shape[0] % height or shape[1] % width:
+                raise ValueError(
+                    'Image size {}x{} is not a multiple of {}x{}.'.format(
+                        shape[0], shape[1], height, width))
+            self.factors = (shape[0] // height, shape[1] // width)
+            shape = (height, width) + shape[2:]
+        self.channels = channels
+        self.grayscale = grayscale
+        if grayscale:
+            shape = shape[:2]
+        elif channels is not None:
+            shape = shape[:2] + (channels,)
+        self.clip = None if clip is None else tuple(clip)
+        self.scale = scale
+
+        # values are only converted to float32 if an operation requires it
+        transformed = \
+            resize is not None or grayscale or clip is not None or \
+            scale is not None
+        dtype = np.dtype(np.float32 if transformed else space.dtype)
+        low = float(np.min(space.low))
+        high = float(np.max(space.high))
+        if self.clip is not None:
+            low, high = max(low, self.clip[0]), min(high, self.clip[1])
+        if scale is not None:
+            low, high = sorted((low * scale, high * scale))
+        self.frame_space = Box(low=low, high=high, shape=shape, dtype=dtype)
+
+        raw_shape = tuple(space.shape)
+        self._resized = None
+        if self.factors is not None:
+            self._resized = \
+                np.empty((shape[0], shape[1]) + raw_shape[2:],
+                         dtype=np.float32)
+        self._gray = \
+            np.empty(shape, dtype=np.float32) if grayscale else None
+
+        self._stack = None
+        self._frames = None
+        if stack > 1:
+            self._stack = FrameStack(shape, dtype, stack, valid_steps)
+            self.observation_space = \
+                Box(low=low, high=high, shape=self._stack.shape, dtype=dtype)
+        else:
+            if valid_steps > 0:
+                self._frames = ImageRingBuffer(shape, dtype, valid_steps)
+            self.observation_space = self.frame_space
+
+    def reset(self):
+        """ Starts a new episode, whose first frame fills the stack. """
+        if self._stack is not None:
+            self._stack.reset()
+
+    def __call__(self, image, out=None):
+        """
+        Returns the preprocessed image.
+
+        Parameters
+        ----------
+        image: np.array
+            Raw image of the shape of space
+        out: np.array
+            Optional array of the shape of observation_space to write the
+            result into
+        """
+        frame = image
+        if self.factors is not None:
+            height, width = self._resized.shape[:2]
+            np.mean(
+                frame.reshape(
+                    (height, self.factors[0], width, self.factors[1]) +
+                    frame.shape[2:]),
+                axis=(1, 3), dtype=np.float32, out=self._resized)
+            frame = self._resized
+        if self.grayscale:
+            np.einsum(
+                'ijc,c->ij', frame[..., :3], GRAYSCALE_WEIGHTS,
+                out=self._gray)
+            frame = self._gray
+        elif self.channels is not None:
+            frame = frame[..., :self.channels]
+
+        if self._stack is not None:
+            target = self._stack.next_frame()
+        elif out is not None:
+            target = out
+        elif self._frames is not None:
+            target = self._frames.next()
+        else:
+            target = \
+                np.empty(self.frame_space.shape, self.frame_space.dtype)
+        if self.clip is not None:
+            np.clip(frame, self.clip[0], self.clip[1], out=target)
+            frame = target
+        if self.scale is not None:
+            np.multiply(frame, self.scale, out=target)
+        elif frame is not target:
+            np.copyto(target, frame)
+
+        if self._stack is None:
+            return target
+        stacked = self._stack.push()
+        if out is None:
+            return stacked if self.valid_steps > 0 else stacked.copy()
+        np.copyto(out, stacked)
+        return out
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Defines the ImageRingBuffer class.
+"""
+
+import numpy as np
+
+
+class ImageRingBuffer(object):
+    """
+    A fixed number of preallocated image arrays that are handed out in turn,
+    so that images can be decoded every step without allocating new arrays.
+    An array handed out is only overwritten after size further calls to
+    next().
+
+    Parameters
+    ----------
+    shape: tuple
+        Shape of a single image
+    dtype: np.dtype
+        Data type of the image
+    size: int
+        Number of images kept in the ring
+    """
+    def __init__(self, shape, dtype, size):
+        self._data = np.zeros((size,) + tuple(shape), dtype=dtype)
+        # views are created once so next() does not allocate
+        self._slots = list(self._data)
+        self._index = 0
+
+    @property
+    def shape(self):
+        """ Returns the shape of a single image of the ring. """
+        return self._data.shape[1:]
+
+    def next(self):
+        """
+        Returns the next image array of the ring to be written into.
+        """
+        slot = self._slots[self._index]
+        self._index = (self._index + 1) % len(self._slots)
+        return slot
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Defines the ObservationLayout and ObservationRingBuffer classes.
+"""
+
+import numpy as np
+from gym.spaces import Box, Dict
+
+# byte alignment of each observation entry in the buffer
+OBSERVATION_ALIGNMENT = 64
+
+
+class ObservationLayout(object):
+    """
+    A contiguous memory layout of the observations of a Dict observation
+    space. Each key of the space is stored at a fixed offset of a single byte
+    buffer and read through a named view, so that a whole observation is
+    moved with a single copy of the buffer.
+
+    In flat mode all entries are stored as float32 without padding, so that
+    the buffer can also be read as a single flat vector of the flat_space().
+
+    Parameters
+    ----------
+    observation_space: gym.spaces.Dict
+        The observation space to lay out
+    flat: bool
+        Whether to store all entries as a flat float32 vector
+    alignment: int
+        Byte alignment of each entry, ignored in flat mode
+    """
+    def __init__(
+            self, observation_space, flat=False,
+            alignment=OBSERVATION_ALIGNMENT):
+        if not isinstance(observation_space, Dict):
+            raise NotImplementedError(
+                'Only Dict observation spaces can be laid out.')
+        self.space = observation_space
+        self.flat = flat
+        self.alignment = 1 if flat else alignment
+        self.entries = []
+        offset = 0
+        for key, space in observation_space.spaces.items():
+            shape = tuple(space.shape)
+            dtype = np.dtype(np.float32 if flat else space.dtype)
+            offset = -(-offset // self.alignment) * self.alignment
+            self.entries.append((key, shape, dtype, offset))
+            offset += int(np.prod(shape)) * dtype.itemsize
+        self.nbytes = -(-offset // self.alignment) * self.alignment
+
+    def allocate(self):
+        """
+        Returns a new zeroed byte buffer of the layout, aligned to the
+        alignment of the layout.
+        """
+        alignment = max(self.alignment, OBSERVATION_ALIGNMENT)
+        memory = np.zeros(self.nbytes + alignment, dtype=np.uint8)
+        start = -memory.ctypes.data % alignment
+        return memory[start:start + self.nbytes]
+
+    def views(self, buffer):
+        """
+        Returns the named views of each observation key on top of the buffer.
+
+        Parameters
+        ----------
+        buffer: buffer
+            A byte buffer of the layout, such as one returned by allocate() or
+            a shared memory buffer
+        """
+        return {
+            key: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for key, shape, dtype, offset in self.entries}
+
+    def batch_views(self, buffers):
+        """
+        Returns the observations stored in an array of buffers of the layout,
+        as named views with the leading axes of the array or in flat mode as
+        flat vectors.
+
+        Parameters
+        ----------
+        buffers: np.array
+            uint8 array of shape (..., nbytes), e.g. one buffer per
+            environment of a pool
+        """
+        if self.flat:
+            return buffers.view(np.float32)
+        views = {}
+        for key, shape, dtype, offset in self.entries:
+            size = int(np.prod(shape)) * dtype.itemsize
+            views[key] = \
+                buffers[..., offset:offset + size].view(dtype).reshape(
+                    buffers.shape[:-1] + shape)
+        return views
+
+    def flat_view(self, buffer):
+        """
+        Returns the whole buffer as a flat float32 vector in flat mode.
+        """
+        if not self.flat:
+            raise ValueError('The flat view requires a flat layout.')
+        return np.ndarray(
+            (self.nbytes // 4,), dtype=np.float32, buffer=buffer)
+
+    def flat_space(self):
+        """
+        Returns the Box space of the flat vector of the layout.
+        """
+        low = [
+            np.broadcast_to(space.low, space.shape).ravel()
+            for space in self.space.spaces.values()]
+        high = [
+            np.broadcast_to(space.high, space.shape).ravel()
+            for space in self.space.spaces.values()]
+        return Box(
+            low=np.concatenate(low).astype(np.float32),
+            high=np.concatenate(high).astype(np.float32),
+            dtype=np.float32)
+
+
+class ObservationRingBuffer(object):
+    """
+    A fixed number of preallocated observation buffers of a layout that are
+    handed out in turn. An observation handed out is only overwritten after
+    size further calls to next().
+
+    Parameters
+    ----------
+    layout: ObservationLayout
+        Layout of the buffers
+    size: int
+        Number of buffers kept in the ring
+    """
+    def __init__(self, layout, size):
+        self.layout = layout
+        self._buffers = [layout.allocate() for _ in range(max(size, 1))]
+        # views are created once so next() does not allocate
+        self._views = [layout.views(buffer) for buffer in self._buffers]
+        self._flat_views = [
+            layout.flat_view(buffer) if layout.flat else None
+            for buffer in self._buffers]
+        self._index = -1
+
+    def next(self):
+        """
+        Returns the named views of the next buffer of the ring to be written
+        into.
+        """
+        self._index = (self._index + 1) % len(self._buffers)
+        return self._views[self._index]
+
+    @property
+    def buffer(self):
+        """ Returns the byte buffer last handed out by next(). """
+        return self._buffers[self._index]
+
+    @property
+    def views(self):
+        """ Returns the named views of the buffer last handed out. """
+        return self._views[self._index]
+
+    @property
+    def flat(self):
+        """ Returns the flat view of the buffer last handed out by next(). """
+        return self._flat_views[self._index]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Defines the PluginRegistry class and the registries of the task environments
+and of the simulation and control backends. Any new environment or backend
+must be registered here as <name>: '<module>:<class name>'. The modules are
+only imported when their entry is first loaded, so that only the chosen
+simulator is imported.
+"""
+
+import importlib
+import threading
+
+
+class PluginRegistry(object):
+    """
+    Maps names to entry points of the form '<module>:<attribute>', which are
+    imported on first use and cached.
+
+    Parameters
+    ----------
+    kind: str
+        What the registered entries are, used in error messages
+    entry_points: dict
+        The initial entry points by name
+    """
+    def __init__(self, kind, entry_points=None):
+        self.kind = kind
+        self._entry_points = dict(entry_points or {})
+        self._loaded = {}
+        # reentrant as an imported module may load further entries
+        self._lock = threading.RLock()
+
+    def __contains__(self, name):
+        return name in self._entry_points
+
+    def names(self):
+        """ Returns the registered names. """
+        return list(self._entry_points)
+
+    def register(self, name, entry_point):
+        """
+        Registers or replaces the entry point of the given name.
+
+        Parameters
+        ----------
+        name: str
+            Name of the entry
+        entry_point: str
+            '<module>:<attribute>' of the entry
+        """
+        if ':' not in entry_point:
+            raise ValueError(
+                'Entry point {} is not of the form '
+                '<module>:<attribute>.'.format(entry_point))
+        with self._lock:
+            self._entry_points[name] = entry_point
+            self._loaded.pop(name, None)
+
+    def entry_point(self, name):
+        """ Returns the entry point of the given name. """
+        try:
+            return self._entry_points[name]
+        except KeyError:
+            raise NotImplementedError(
+                '{} {} not supported, expected one of {}.'.format(
+                    self.kind.capitalize(), name,
+                    ', '.join(self._entry_points))) from None
+
+    def is_loaded(self, name):
+        """ Returns whether the entry of the given name has been imported. """
+        return name in self._loaded
+
+    def load(self, name):
+        """
+        Returns the entry of the given name, importing its module on first
+        use.
+        """
+        loaded = self._loaded.get(name)
+        if loaded is not None:
+            return loaded
+        module_name, attribute = self.entry_point(name).split(':', 1)
+        with self._lock:
+            if name not in self._loaded:
+                module = importlib.import_module(module_name)
+                self._loaded[name] = getattr(module, attribute)
+            return self._loaded[name]
+
+
+# task environments by the name of their module in task_envs
+TASK_ENVS = PluginRegistry('task environment', {
+    'uav_follow_trajectory_task_env_v0':
+        'task_envs.uav_follow_trajectory_task_env_v0:'
+        'UAVFollowTrajectoryTaskEnv',
+    'gym_cart_pole_task_env_v0':
+        'task_envs.gym_cart_pole_task_env_v0:GymCartPoleTaskEnv',
+    'gym_mc_continuous_task_env_v0':
+        'task_envs.gym_mc_continuous_task_env_v0:GymMCContinuousTaskEnv',
+})
+
+# base robot environments of the simulators by the sim_env parameter
+SIM_BACKENDS = PluginRegistry('simulation environment', {
+    'gazebo': 'gym_gazebo.robot_gazebo_env:RobotGazeboEnv',
+    'airsim': 'gym_airsim.robot_airsim_env:RobotAirSimEnv',
+})
+
+# uav robot environments by their control method, mavros if the use_mavros
+# parameter is set
+UAV_CONTROL_BACKENDS = PluginRegistry('uav control method', {
+    'mavros': 'robot_envs.mavros_uav_robot_env:MavrosUAVRobotEnv',
+    'airsim': 'robot_envs.airsim_uav_robot_env:AirSimUAVRobotEnv',
+})
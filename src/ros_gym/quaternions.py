@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Vectorized quaternion routines. Quaternions are given in [w, x, y, z] order
+as in the pose observations, either as a single (4,) array or as an (N, 4)
+array of N quaternions, in which case the results are computed for each row.
+Given out and scratch arrays, the results are computed without allocating
+arrays.
+"""
+
+import numpy as np
+
+
+def _components(quaternions):
+    """ Returns the w, x, y and z components of the quaternions. """
+    quaternions = np.asarray(quaternions)
+    return \
+        quaternions[..., 0], quaternions[..., 1], \
+        quaternions[..., 2], quaternions[..., 3]
+
+
+def _shape(q_a, q_b):
+    """ Returns the shape of the results for the quaternions. """
+    return np.broadcast(np.asarray(q_a), np.asarray(q_b)).shape[:-1]
+
+
+def _dot(q_a, q_b, out=None):
+    """
+    Returns the dot product of the quaternions, which are broadcast to the
+    shape of out if given.
+    """
+    if out is None:
+        return np.einsum('...i,...i->...', q_a, q_b)
+    shape = np.shape(out) + (4,)
+    return np.einsum(
+        '...i,...i->...', np.broadcast_to(q_a, shape),
+        np.broadcast_to(q_b, shape), out=out)
+
+
+def _output(out, shape):
+    """ Returns out or a new array of the given shape if out is None. """
+    return np.empty(shape) if out is None else out
+
+
+def _scratch(scratch, shape):
+    """
+    Returns the two intermediate arrays of the given shape in scratch or in
+    a new array if scratch is None.
+    """
+    scratch = _output(scratch, (2,) + tuple(shape))
+    return scratch[0, ...], scratch[1, ...]
+
+
+def _add_products(a_1, b_1, a_2, b_2, out, tmp, sign=1.0):
+    """ Writes a_1 * b_1 + sign * a_2 * b_2 into out using tmp. """
+    np.multiply(a_1, b_1, out=out)
+    np.multiply(a_2, b_2, out=tmp)
+    if sign < 0.0:
+        out -= tmp
+    else:
+        out += tmp
+    return out
+
+
+def norm(quaternions, out=None):
+    """
+    Returns the norm of the quaternions.
+
+    Parameters
+    ----------
+    quaternions: np.array
+        (4,) or (N, 4) quaternions
+    out: np.array
+        Optional array receiving the result
+    """
+    return np.sqrt(_dot(quaternions, quaternions, out=out), out=out)
+
+
+def conjugate(quaternions, out=None):
+    """
+    Returns the conjugates of the quaternions.
+
+    Parameters
+    ----------
+    quaternions: np.array
+        (4,) or (N, 4) quaternions
+    out: np.array
+        Optional array receiving the result
+    """
+    quaternions = np.asarray(quaternions)
+    out = _output(out, quaternions.shape)
+    out[..., 0] = quaternions[..., 0]
+    np.negative(quaternions[..., 1:4], out=out[..., 1:4])
+    return out
+
+
+def product(q_a, q_b, out=None):
+    """
+    Returns the Hamilton products q_a * q_b of the quaternions.
+
+    Parameters
+    ----------
+    q_a: np.array
+        (4,) or (N, 4) quaternions
+    q_b: np.array
+        (4,) or (N, 4) quaternions
+    out: np.array
+        Optional array receiving the result, which must not be q_a or q_b
+    """
+    a_w, a_x, a_y, a_z = _components(q_a)
+    b_w, b_x, b_y, b_z = _components(q_b)
+    out = \
+        _output(out, np.broadcast(np.asarray(q_a), np.asarray(q_b)).shape)
+    out[..., 0] = a_w * b_w - a_x * b_x - a_y * b_y - a_z * b_z
+    out[..., 1] = a_w * b_x + a_x * b_w + a_y * b_z - a_z * b_y
+    out[..., 2] = a_w * b_y - a_x * b_z + a_y * b_w + a_z * b_x
+    out[..., 3] = a_w * b_z + a_x * b_y - a_y * b_x + a_z * b_w
+    return out
+
+
+def absolute_distance(q_a, q_b, out=None, scratch=None):
+    """
+    Returns the euclidean distance between the quaternions, taking into
+    account that q and -q represent the same orientation.
+
+    Parameters
+    ----------
+    q_a: np.array
+        (4,) or (N, 4) quaternions
+    q_b: np.array
+        (4,) or (N, 4) quaternions
+    out: np.array
+        Optional array receiving the result
+    scratch: np.array
+        Optional (2,) or (2, N) array for intermediate results
+    """
+    shape = _shape(q_a, q_b)
+    out = _output(out, shape)
+    tmp, _ = _scratch(scratch, shape)
+    # |a -/+ b|^2 = |a|^2 + |b|^2 -/+ 2 a.b
+    _dot(q_a, q_b, out=tmp)
+    np.abs(tmp, out=tmp)
+    tmp *= 2.0
+    _dot(q_a, q_a, out=out)
+    out -= tmp
+    _dot(q_b, q_b, out=tmp)
+    out += tmp
+    np.maximum(out, 0.0, out=out)
+    return np.sqrt(out, out=out)
+
+
+def geodesic_distance(q_a, q_b, out=None, scratch=None):
+    """
+    Returns the norm of the logarithm of the quaternions q_a^-1 * q_b that
+    rotate q_a onto q_b, i.e. half the rotation angle between unit
+    quaternions of the same hemisphere.
+
+    Parameters
+    ----------
+    q_a: np.array
+        (4,) or (N, 4) quaternions
+    q_b: np.array
+        (4,) or (N, 4) quaternions
+    out: np.array
+        Optional array receiving the result
+    scratch: np.array
+        Optional (2,) or (2, N) array for intermediate results
+    """
+    shape = _shape(q_a, q_b)
+    out = _output(out, shape)
+    norm_a, norm_b = _scratch(scratch, shape)
+    norm(q_a, out=norm_a)
+    norm(q_b, out=norm_b)
+    # angle of the scalar part of q_a^-1 * q_b, whose norm is norm_b / norm_a
+    _dot(q_a, q_b, out=out)
+    out /= norm_a
+    out /= norm_b
+    np.clip(out, -1.0, 1.0, out=out)
+    np.arccos(out, out=out)
+    np.multiply(out, out, out=out)
+    np.divide(norm_b, norm_a, out=norm_a)
+    np.log(norm_a, out=norm_a)
+    np.multiply(norm_a, norm_a, out=norm_a)
+    out += norm_a
+    return np.sqrt(out, out=out)
+
+
+def geodesic_angle(q_a, q_b, out=None, scratch=None):
+    """
+    Returns the angle in radians of the rotation between the orientations
+    represented by the quaternions.
+
+    Parameters
+    ----------
+    q_a: np.array
+        (4,) or (N, 4) quaternions
+    q_b: np.array
+        (4,) or (N, 4) quaternions
+    out: np.array
+        Optional array receiving the result
+    scratch: np.array
+        Optional (2,) or (2, N) array for intermediate results
+    """
+    shape = _shape(q_a, q_b)
+    out = _output(out, shape)
+    norm_a, norm_b = _scratch(scratch, shape)
+    _dot(q_a, q_b, out=out)
+    np.abs(out, out=out)
+    out /= norm(q_a, out=norm_a)
+    out /= norm(q_b, out=norm_b)
+    np.minimum(out, 1.0, out=out)
+    np.arccos(out, out=out)
+    out *= 2.0
+    return out
+
+
+def roll_pitch_yaw(quaternions, out=None, scratch=None):
+    """
+    Returns the roll, pitch and yaw angles in radians of the rotations
+    represented by the unit quaternions, in the static x-y-z axes convention
+    of tf euler_from_quaternion.
+
+    Parameters
+    ----------
+    quaternions: np.array
+        (4,) or (N, 4) unit quaternions
+    out: np.array
+        Optional (3,) or (N, 3) array receiving the result
+    scratch: np.array
+        Optional (2,) or (2, N) array for intermediate results
+    """
+    q_w, q_x, q_y, q_z = _components(quaternions)
+    shape = np.shape(quaternions)[:-1]
+    out = _output(out, shape + (3,))
+    numerator, denominator = _scratch(scratch, shape)
+    # the yaw column serves as temporary until the yaw is computed
+    tmp = out[..., 2]
+
+    _add_products(q_w, q_x, q_y, q_z, numerator, tmp)
+    numerator *= 2.0
+    _add_products(q_x, q_x, q_y, q_y, denominator, tmp)
+    denominator *= -2.0
+    denominator += 1.0
+    np.arctan2(numerator, denominator, out=out[..., 0])
+
+    _add_products(q_w, q_y, q_z, q_x, numerator, tmp, sign=-1.0)
+    numerator *= 2.0
+    np.clip(numerator, -1.0, 1.0, out=numerator)
+    np.arcsin(numerator, out=out[..., 1])
+
+    _add_products(q_w, q_z, q_x, q_y, numerator, tmp)
+    numerator *= 2.0
+    _add_products(q_y, q_y, q_z, q_z, denominator, tmp)
+    denominator *= -2.0
+    denominator += 1.0
+    np.arctan2(numerator, denominator, out=out[..., 2])
+    return out
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Defines the SumTree and ReplayBuffer classes.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from gym.spaces import Dict
+
+# observation entries with at least this many dimensions are images, which
+# are stored in memory-mapped files by default
+IMAGE_NDIM = 2
+
+
+class SumTree(object):
+    """
+    A binary tree of priorities whose inner nodes hold the sum of their
+    children, so that priorities are updated and sampled in O(log n). Batches
+    of indices are processed level by level with NumPy instead of one index
+    at a time.
+
+    Parameters
+    ----------
+    capacity: int
+        Number of priorities in the tree
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._leaves = 1
+        while self._leaves < capacity:
+            self._leaves *= 2
+        self._depth = self._leaves.bit_length() - 1
+        # the root is node 1 and the children of node n are 2n and 2n + 1
+        self._tree = np.zeros(2 * self._leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        """ Returns the sum of all priorities. """
+        return self._tree[1]
+
+    def get(self, indices):
+        """ Returns the priorities of the given indices. """
+        return self._tree[self._leaves + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        """
+        Sets the priorities of the given indices and updates their sums.
+
+        Parameters
+        ----------
+        indices: np.array
+            Indices of the priorities to set
+        priorities: np.array
+            New non-negative priorities of the indices
+        """
+        nodes = self._leaves + np.asarray(indices, dtype=np.int64)
+        self._tree[nodes] = priorities
+        for _ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._tree[nodes] = \
+                self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values):
+        """
+        Returns the index of each value, the first index whose cumulative
+        priority exceeds the value. Indices with a zero priority are never
+        returned while the total is positive.
+
+        Parameters
+        ----------
+        values: np.array
+            Values in [0, total)
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = self._tree[2 * nodes]
+            # rounding errors must not lead into an empty subtree
+            right = \
+                ((values >= left) & (self._tree[2 * nodes + 1] > 0.0)) | \
+                (left <= 0.0)
+            values -= np.where(right, left, 0.0)
+            nodes = 2 * nodes + right
+        return nodes - self._leaves
+
+
+class ReplayBuffer(object):
+    """
+    A fixed size replay buffer with proportional prioritized sampling, sized
+    from the observation and action spaces of an environment. Image entries
+    of the observations are stored in memory-mapped files, so that the
+    buffer can exceed the RAM, while the other entries, actions, rewards and
+    dones are kept in RAM.
+
+    Each row holds an observation and the action, reward and done that led
+    to it, as recorded by the TransitionRecorder, so that every observation
+    is stored once. A transition is sampled as a row and the observation of
+    the row before it. The first row of an episode does not end a transition
+    and is never sampled.
+
+    Minibatches are gathered with one NumPy take per entry into contiguous
+    arrays. The sampled rows are sorted, so that memory-mapped entries are
+    read in file order.
+
+    Parameters
+    ----------
+    observation_space: gym.Space
+        The observation space, a Dict space or a single Box
+    action_space: gym.Space
+        The action space
+    capacity: int
+        Maximum number of rows kept, the oldest rows are overwritten first
+    directory: str
+        Directory of the memory-mapped entries, a temporary directory removed
+        by close() if not given
+    memmap_keys: list
+        Keys of the observation entries to memory-map, all entries with at
+        least IMAGE_NDIM dimensions if not given
+    alpha: Float
+        Exponent of the priorities, 0 for uniform sampling
+    epsilon: Float
+        Added to the priorities, so that every transition can be sampled
+    seed: int
+        Seed of the sampling
+    """
+    def __init__(
+            self,
+            observation_space,
+            action_space,
+            capacity,
+            directory=None,
+            memmap_keys=None,
+            alpha=0.6,
+            epsilon=1e-6,
+            seed=None):
+        if capacity < 2:
+            raise ValueError('The capacity must be at least 2.')
+        self.capacity = capacity
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self._dict_obs = isinstance(observation_space, Dict)
+        spaces = \
+            observation_space.spaces if self._dict_obs else \
+            {None: observation_space}
+        if memmap_keys is None:
+            memmap_keys = [
+                key for key, space in spaces.items()
+                if len(space.shape) >= IMAGE_NDIM]
+        self._tmp_dir = None
+        if memmap_keys and directory is None:
+            directory = self._tmp_dir = \
+                tempfile.mkdtemp(prefix='ros_gym_replay_')
+        self.directory = directory
+        self._obs = {}
+        for key, space in spaces.items():
+            shape = (capacity,) + tuple(space.shape)
+            if key in memmap_keys:
+                os.makedirs(directory, exist_ok=True)
+                name = 'obs.npy' if key is None else 'obs.{}.npy'.format(key)
+                self._obs[key] = \
+                    np.lib.format.open_memmap(
+                        os.path.join(directory, name), mode='w+',
+                        dtype=space.dtype, shape=shape)
+            else:
+                self._obs[key] = np.zeros(shape, dtype=space.dtype)
+        self._action = \
+            np.zeros(
+                (capacity,) + tuple(action_space.shape or ()),
+                dtype=action_space.dtype)
+        self._reward = np.zeros(capacity, dtype=np.float32)
+        self._done = np.zeros(capacity, dtype=np.bool_)
+        self._valid = np.zeros(capacity, dtype=np.bool_)
+        self._tree = SumTree(capacity)
+        self._max_priority = 1.0
+        self._next = 0
+        self._size = 0
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_env(cls, env, capacity, **kwargs):
+        """
+        Returns a replay buffer sized from the spaces of the environment.
+        The keyword arguments are passed to the constructor.
+        """
+        return cls(env.observation_space, env.action_space, capacity, **kwargs)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def memmap_keys(self):
+        """ Returns the keys of the memory-mapped observation entries. """
+        return [
+            key for key, array in self._obs.items()
+            if isinstance(array, np.memmap)]
+
+    def add(self, obs, action=None, reward=0.0, done=False, first=False):
+        """
+        Appends a row, overwriting the oldest row once the buffer is full.
+        New transitions get the largest priority seen so far.
+
+        Parameters
+        ----------
+        obs: dict or np.array
+            The observation
+        action: np.array
+            The action that led to the observation, ignored if first
+        reward: Float
+            The reward of the action
+        done: bool
+            Whether the episode ended with the observation
+        first: bool
+            Whether the observation was returned by reset()
+        """
+        row = self._next
+        if self._dict_obs:
+            for key, array in self._obs.items():
+                array[row] = obs[key]
+        else:
+            self._obs[None][row] = obs
+        valid = not first and self._size > 0
+        if valid:
+            self._action[row] = action
+        self._reward[row] = reward
+        self._done[row] = done
+        self._valid[row] = valid
+        self._tree.update([row], [self._max_priority if valid else 0.0])
+        self._next = (row + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        if self._size == self.capacity and self._valid[self._next]:
+            # the observation before the oldest row has been overwritten
+            self._valid[self._next] = False
+            self._tree.update([self._next], [0.0])
+
+    def allocate_batch(self, batch_size):
+        """
+        Returns new arrays of a minibatch to be filled by sample().
+        """
+        def allocate_obs():
+            obs = {
+                key: np.empty((batch_size,) + array.shape[1:], array.dtype)
+                for key, array in self._obs.items()}
+            return obs if self._dict_obs else obs[None]
+
+        return {
+            'obs': allocate_obs(),
+            'action': np.empty(
+                (batch_size,) + self._action.shape[1:], self._action.dtype),
+            'reward': np.empty(batch_size, dtype=self._reward.dtype),
+            'done': np.empty(batch_size, dtype=np.bool_),
+            'next_obs': allocate_obs(),
+            'weights': np.empty(batch_size, dtype=np.float32),
+            'indices': np.empty(batch_size, dtype=np.int64)}
+
+    def sample(self, batch_size, beta=0.4, out=None):
+        """
+        Samples a minibatch of transitions with probabilities proportional
+        to their priorities, stratified over batch_size equal segments of
+        the total priority.
+
+        Parameters
+        ----------
+        batch_size: int
+            Number of transitions
+        beta: Float
+            Exponent of the importance sampling weights, 0 for no correction
+        out: dict
+            Optional minibatch as returned by allocate_batch() to fill
+
+        Returns
+        -------
+        dict
+            obs, action, reward, done and next_obs of the transitions, their
+            importance sampling weights normalized to a maximum of 1 and
+            their indices to update the priorities with
+        """
+        total = self._tree.total
+        if total <= 0.0:
+            raise ValueError('The replay buffer has no transitions.')
+        if out is None:
+            out = self.allocate_batch(batch_size)
+        values = \
+            (np.arange(batch_size) + self._rng.random(batch_size)) * \
+            (total / batch_size)
+        indices = out['indices']
+        # the last segment must not reach the total through rounding
+        np.minimum(values, np.nextafter(total, 0.0), out=values)
+        indices[:] = self._tree.find(values)
+        indices.sort()
+        previous = (indices - 1) % self.capacity
+        for key, array in self._obs.items():
+            obs = out['obs'][key] if self._dict_obs else out['obs']
+            next_obs = \
+                out['next_obs'][key] if self._dict_obs else out['next_obs']
+            np.take(array, previous, axis=0, out=obs)
+            np.take(array, indices, axis=0, out=next_obs)
+        np.take(self._action, indices, axis=0, out=out['action'])
+        np.take(self._reward, indices, out=out['reward'])
+        np.take(self._done, indices, out=out['done'])
+        weights = self._tree.get(indices) * (self._size / total)
+        np.power(weights, -beta, out=weights)
+        out['weights'][:] = weights / weights.max()
+        return out
+
+    def update_priorities(self, indices, priorities):
+        """
+        Sets the priorities of sampled transitions, e.g. to their absolute
+        TD errors. Transitions overwritten since they were sampled keep a
+        zero priority.
+
+        Parameters
+        ----------
+        indices: np.array
+            Indices of the transitions as returned by sample()
+        priorities: np.array
+            Their new priorities before the alpha exponent
+        """
+        indices = np.asarray(indices)
+        priorities = \
+            (np.abs(priorities) + self.epsilon) ** self.alpha * \
+            self._valid[indices]
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._tree.update(indices, priorities)
+
+    def close(self):
+        """
+        Closes the memory-mapped entries and removes the temporary directory.
+        """
+        for key in self.memmap_keys:
+            self._obs[key].flush()
+            self._obs[key] = None
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Defines the ReplaySimulationHandler class and its replay sources of the robot
+state, camera and collisions.
+"""
+
+import time
+import numpy as np
+from fake_simulation_handler import \
+    FakeSimulationHandler, FakeRecord, STEP_MODE_REALTIME
+from transition_recorder import TransitionDataset
+
+# observation columns of a recorded uav episode served by the replay
+POSITION_COLUMN = 'obs.position'
+VELOCITY_COLUMN = 'obs.velocity'
+CAMERA_COLUMN = 'obs.front_cam'
+DEPTH_COLUMN = 'obs.front_cam_depth'
+
+
+class EpisodeCursor(object):
+    """
+    The current row of the recorded episodes, which are served in turn and
+    from the start again after the last one.
+
+    Parameters
+    ----------
+    dataset: TransitionDataset
+        The recorded episodes
+    episodes: list
+        Indices of the episodes to serve, all if not given
+    """
+    def __init__(self, dataset, episodes=None):
+        self.dataset = dataset
+        self.episodes = \
+            dataset.episodes if episodes is None else \
+            dataset.episodes[list(episodes)]
+        if not len(self.episodes):
+            raise ValueError(
+                'No recorded episodes in {}.'.format(dataset.directory))
+        self.episode = 0
+        self.step = 0
+        self.row = int(self.episodes[0][0])
+        self._next_episode = 0
+
+    def next_episode(self):
+        """ Moves to the first row of the next episode. """
+        self.episode = self._next_episode
+        self._next_episode = (self._next_episode + 1) % len(self.episodes)
+        self.step = 0
+        self.row = int(self.episodes[self.episode][0])
+
+    def advance(self):
+        """
+        Moves to the next row of the episode, staying on its last row once
+        the recording has ended.
+        """
+        if self.step < self.episodes[self.episode][1] - 1:
+            self.step += 1
+            self.row += 1
+
+
+class ReplayKinematics(object):
+    """
+    Serves the pose and velocity of the current row in the format of the
+    airsim multirotor state. The state record is updated in place when the
+    row has changed.
+
+    Parameters
+    ----------
+    cursor: EpisodeCursor
+        The current row
+    step_time: Float
+        Simulation time in seconds between two rows
+    """
+    def __init__(self, cursor, step_time):
+        self.cursor = cursor
+        self.step_time = step_time
+        columns = cursor.dataset.columns
+        if POSITION_COLUMN not in columns:
+            raise ValueError(
+                'The recording has no {} column.'.format(POSITION_COLUMN))
+        self._has_velocity = VELOCITY_COLUMN in columns
+        self._row = None
+        self._state = FakeRecord(
+            kinematics_estimated=FakeRecord(
+                position=FakeRecord(x_val=0.0, y_val=0.0, z_val=0.0),
+                orientation=FakeRecord(
+                    w_val=1.0, x_val=0.0, y_val=0.0, z_val=0.0),
+                linear_velocity=FakeRecord(
+                    x_val=0.0, y_val=0.0, z_val=0.0),
+                angular_velocity=FakeRecord(
+                    x_val=0.0, y_val=0.0, z_val=0.0)),
+            gps_location=FakeRecord(
+                latitude=0.0, longitude=0.0, altitude=0.0),
+            timestamp=0)
+
+    @property
+    def state(self):
+        """ Returns the multirotor state of the current row. """
+        row = self.cursor.row
+        if row != self._row:
+            self._row = row
+            self._update(row)
+        return self._state
+
+    def set_velocity(self, vel_x, vel_y, vel_z, yaw_rate):
+        """ Commanded velocities do not change the replay. """
+
+    def _update(self, row):
+        """ Writes the recorded pose and velocity into the state. """
+        dataset = self.cursor.dataset
+        kinematics = self._state.kinematics_estimated
+        pose = dataset.column(POSITION_COLUMN, row).tolist()
+        position = kinematics.position
+        orientation = kinematics.orientation
+        (position.x_val, position.y_val, position.z_val,
+         orientation.w_val, orientation.x_val, orientation.y_val,
+         orientation.z_val) = pose[:7]
+        if self._has_velocity:
+            linear = kinematics.linear_velocity
+            angular = kinematics.angular_velocity
+            (linear.x_val, linear.y_val, linear.z_val,
+             angular.x_val, angular.y_val, angular.z_val) = \
+                dataset.column(VELOCITY_COLUMN, row).tolist()[:6]
+        self._state.timestamp = int(self.cursor.step * self.step_time * 1e9)
+
+
+class ReplayCamera(object):
+    """
+    Serves the recorded scene and depth images of the current row in the
+    format of airsim image responses. Scene images are recorded as returned
+    by the environment, upside down compared to airsim, so they are flipped
+    back into a preallocated array. Images that were not recorded are
+    served as zeros of the given shapes.
+
+    Parameters
+    ----------
+    cursor: EpisodeCursor
+        The current row
+    shape: tuple
+        (height, width) of the scene images if not recorded
+    depth_shape: tuple
+        (height, width) of the depth images if not recorded
+    """
+    def __init__(self, cursor, shape=(144, 256), depth_shape=None):
+        self.cursor = cursor
+        columns = cursor.dataset.columns
+        self._has_scene = CAMERA_COLUMN in columns
+        self._has_depth = DEPTH_COLUMN in columns
+        if self._has_scene:
+            shape = columns[CAMERA_COLUMN]['shape'][:2]
+        if self._has_depth:
+            depth_shape = columns[DEPTH_COLUMN]['shape'][:2]
+        height, width = shape
+        depth_height, depth_width = depth_shape or shape
+        self._scene_row = None
+        self._scene_data = np.zeros((height, width, 4), dtype=np.uint8)
+        self.scene = FakeRecord(
+            height=height, width=width,
+            image_data_uint8=self._scene_data, image_data_float=[])
+        self._zero_depth = \
+            np.zeros(depth_height * depth_width, dtype=np.float32)
+        self.depth = FakeRecord(
+            height=depth_height, width=depth_width,
+            image_data_uint8=b'', image_data_float=self._zero_depth)
+
+    def response(self, pixels_as_float):
+        """ Returns the depth image if pixels_as_float else the scene. """
+        row = self.cursor.row
+        dataset = self.cursor.dataset
+        if pixels_as_float:
+            if self._has_depth:
+                self.depth.image_data_float = \
+                    dataset.column(DEPTH_COLUMN, row).reshape(-1)
+            return self.depth
+        if self._has_scene and row != self._scene_row:
+            self._scene_row = row
+            np.copyto(
+                self._scene_data, dataset.column(CAMERA_COLUMN, row)[::-1])
+        return self.scene
+
+
+class ReplayCollisions(object):
+    """
+    Reports the recorded collisions, which are the final rows of episodes
+    rewarded with the collision penalty, as the follow trajectory task gives
+    this reward on a collision only.
+
+    Parameters
+    ----------
+    cursor: EpisodeCursor
+        The current row
+    collision_reward: Float
+        Reward of a collision, no collisions are reported if None
+    """
+    def __init__(self, cursor, collision_reward=None):
+        self.cursor = cursor
+        self.collision_reward = collision_reward
+        self.ground_z = 0.0
+
+    @property
+    def has_collided(self):
+        """ Returns whether the robot has collided in the current row. """
+        if self.collision_reward is None:
+            return False
+        row = self.cursor.row
+        dataset = self.cursor.dataset
+        return bool(dataset.column('done', row)) and \
+            float(dataset.column('reward', row)) == self.collision_reward
+
+    def update(self, kinematics):
+        """ Collisions are only read from the recording. """
+
+    def clear(self):
+        """ Collisions are only read from the recording. """
+
+
+class ReplaySimulationHandler(FakeSimulationHandler):
+    """
+    A simulation handler serving the robot state, camera images and
+    collisions of episodes recorded by the TransitionRecorder, so that an
+    airsim based environment runs deterministically without a simulator.
+    Every reset moves to the next recorded episode and every velocity
+    command to the next row of the episode; the commanded actions do not
+    change the replay. The recorded rows are read through memory maps.
+
+    Images must be recorded without image preprocessing to be replayed.
+
+    Parameters
+    ----------
+    dataset: TransitionDataset or str
+        The recorded episodes or the directory of the recording
+    collision_reward: Float
+        Reward of a collision in the recording, e.g. the collision_penalty of
+        the task, no collisions are reported if None
+    episodes: list
+        Indices of the episodes to replay, all if not given
+    step_mode: str
+        Either 'realtime' or 'lock_step', which only differ in the rpcs made
+        per step as with airsim
+    step_time: Float
+        Simulation time in seconds between two recorded rows
+    rpc_latency: Float
+        Artificial latency of each rpc in seconds
+    command_latency: Float
+        Artificial duration of each velocity command in seconds
+    image_shape: tuple
+        (height, width) of the scene images if not recorded
+    depth_image_shape: tuple
+        (height, width) of the depth images if not recorded
+    """
+    def __init__(
+            self,
+            dataset,
+            collision_reward=None,
+            episodes=None,
+            step_mode=STEP_MODE_REALTIME,
+            step_time=0.005,
+            rpc_latency=0.0,
+            command_latency=0.0,
+            image_shape=(144, 256),
+            depth_image_shape=None):
+        if not isinstance(dataset, TransitionDataset):
+            dataset = TransitionDataset(dataset)
+        self.dataset = dataset
+        self.collision_reward = collision_reward
+        self.cursor = EpisodeCursor(dataset, episodes)
+        super(ReplaySimulationHandler, self).__init__(
+            step_mode=step_mode,
+            step_time=step_time,
+            rpc_latency=rpc_latency,
+            command_latency=command_latency,
+            image_shape=image_shape,
+            depth_image_shape=depth_image_shape)
+
+    def _make_sources(self, image_shape, depth_image_shape):
+        """
+        Returns the replay kinematics, camera and collision sources.
+        """
+        return (
+            ReplayKinematics(self.cursor, self.step_time),
+            ReplayCamera(self.cursor, image_shape, depth_image_shape),
+            ReplayCollisions(self.cursor, self.collision_reward))
+
+    def _command(self, duration):
+        """ Moves to the next recorded row. """
+        self.cursor.advance()
+        if self.command_latency > 0.0:
+            time.sleep(self.command_latency)
+
+    def reset(self):
+        """ Moves to the first row of the next recorded episode. """
+        self._rpc()
+        self.cursor.next_episode()
+        self.armed = False
+        self.invalidate_cache()
+
+    def save_start_state(self):
+        """ Marks that fast resets may move to the next episode. """
+        self._rpc()
+        self._start_pose = self.cursor.episode
+
+    def fast_reset(self):
+        """ Moves to the first row of the next recorded episode. """
+        if self._start_pose is None:
+            return False
+        self.reset()
+        return True
+
+    def client_arm(self, arm_req):
+        """ Arms or disarms the robot without changing the replay. """
+        self._rpc()
+        self.armed = arm_req
+        return True
+
+    def client_takeoff(self, takeoff_z):
+        """ Takeoffs are part of the recording. """
+        self._rpc()
+        return True
+
+    def client_land(self):
+        """ Landings are part of the recording. """
+        self._rpc()
+        return True
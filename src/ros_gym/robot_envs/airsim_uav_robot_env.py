@@ -4,6 +4,7 @@ Defines the AirSimUAVRobotEnv class.
 """
 import rospy
 from gym_airsim import robot_airsim_env
+from .state_buffer import allocate_snapshot
 
 
 class AirSimUAVRobotEnv(robot_airsim_env.RobotAirSimEnv):
@@ -11,9 +12,9 @@ class AirSimUAVRobotEnv(robot_airsim_env.RobotAirSimEnv):
     Base class for all AirSim based uav robots. All common functionality
     between UAVs that also use airsim is defined here.
     """
-    def __init__(self):
+    def __init__(self, sim_handler=None):
         rospy.loginfo('Setting up simulator environment: AirSimUAVRobotEnv.')
-        super(AirSimUAVRobotEnv, self).__init__()
+        super(AirSimUAVRobotEnv, self).__init__(sim_handler)
 
     @property
     def pose(self):
@@ -31,6 +32,42 @@ class AirSimUAVRobotEnv(robot_airsim_env.RobotAirSimEnv):
         airsim_ang_vel = multirotor_state.kinematics_estimated.angular_velocity
         return self.airsim_to_ros_twist(airsim_lin_vel, airsim_ang_vel)
 
+    def state_snapshot(self, out=None):
+        """
+        Returns a snapshot of the numeric pose, velocity and gps of the
+        robot, which are all taken from the same multirotor state.
+
+        Parameters
+        ----------
+        out: dict
+            Optional snapshot as returned by allocate_snapshot() to copy into
+        """
+        if out is None:
+            out = allocate_snapshot()
+        multirotor_state = self.sim_handler.client_state
+        kinematics = multirotor_state.kinematics_estimated
+        position = kinematics.position
+        orientation = kinematics.orientation
+        out['pose'][:] = (
+            position.x_val, position.y_val, position.z_val,
+            orientation.w_val, orientation.x_val, orientation.y_val,
+            orientation.z_val)
+        lin_vel = kinematics.linear_velocity
+        ang_vel = kinematics.angular_velocity
+        out['velocity'][:] = (
+            lin_vel.x_val, lin_vel.y_val, lin_vel.z_val,
+            ang_vel.x_val, ang_vel.y_val, ang_vel.z_val)
+        gps = multirotor_state.gps_location
+        out['gps'][:] = (gps.latitude, gps.longitude, gps.altitude)
+        # airsim stamps are in nanoseconds
+        out['stamps'][:] = multirotor_state.timestamp * 1e-9
+        return out
+
+    @staticmethod
+    def allocate_state_snapshot():
+        """ Returns a new snapshot to be filled by state_snapshot(). """
+        return allocate_snapshot()
+
     def pub_cmd_vel(self, vel_msg):
         """
         Publishes the desired velocity to the robot using airsim handler.
@@ -5,12 +5,16 @@ Defines the MavrosUAVRobotEnv class.
 
 import os
 import subprocess
+import time
 import rospy
 from mavros_msgs.msg import State, EstimatorStatus
 from sensor_msgs.msg import NavSatFix
 from mavros_msgs.srv import SetMode, CommandBool, CommandTOL
 from geometry_msgs.msg import PoseStamped, TwistStamped
+from service_pool import SERVICE_POOL
+from task_config import get_config
 from .ros_robot_env import ROSRobotEnv
+from .state_buffer import StateBuffer, allocate_snapshot
 
 
 class MavrosUAVRobotEnv(ROSRobotEnv):
@@ -20,15 +24,35 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
 
     def __init__(self):
         rospy.loginfo('Setting up simulator environment: MavrosUAVRobotEnv.')
+        config = get_config()
 
-        # robot namespace
-        self.robot_name_space = ''
+        # the latest messages and the service clients, which are set by the
+        # subscribers and services set up in super().__init__()
+        self._state = None
+        self._pose = None
+        self._velocity = None
+        self._gps = None
+        self._est_status = None
+        self.last_estimator_ts = None
+        self._set_mode_client = None
+        self._arming_client = None
+        self._takeoff_client = None
+        self._land_client = None
+
+        # numeric robot state written by the subscriber callbacks, created
+        # before the subscribers are set up
+        self.state_buffer = StateBuffer()
+        # fields of a snapshot whose stamps must lie within the maximum skew
+        self.synchronized_fields = \
+            config.get('mavros_state/synchronized', ('pose', 'velocity'))
+        self.max_stamp_skew = config.get('mavros_state/max_stamp_skew', 0.0)
+        self.sync_timeout = config.get('mavros_state/sync_timeout', 0.1)
 
         # launch connection to simulator
         super(MavrosUAVRobotEnv, self).__init__()
 
         # set px4 pose estimator name
-        est = rospy.get_param('ros_gym/px4-est')
+        est = config['px4-est']
         if est == 'ekf2':
             self.pose_est_ = "px4-ekf2"
         elif est == 'lpe':
@@ -37,57 +61,53 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
             os.path.join(
                 os.environ['ROS_DEVEL'] + '/lib/px4/' + self.pose_est_)
 
-        # subscribers
-        self._state = None
-        self._pose = None
-        self._velocity = None
-        self._gps = None
-        self._est_status = None
-        self.last_estimator_ts = None
-
-        # services
-        self._set_mode_client = None
-        self._arming_client = None
-        self._takeoff_client = None
-        self._land_client = None
-
     def _setup_subscribers(self):
         """
         Sets up all the subscribers relating to robot state
         """
         rospy.Subscriber(
-            '/mavros/state', State, callback=self._state_cb)
+            self._resolve_name('/mavros/state'),
+            State,
+            callback=self._state_cb)
         rospy.Subscriber(
-            '/mavros/local_position/pose',
+            self._resolve_name('/mavros/local_position/pose'),
             PoseStamped,
             callback=self._pose_cb)
         rospy.Subscriber(
-            '/mavros/local_position/velocity',
+            self._resolve_name('/mavros/local_position/velocity'),
             TwistStamped,
             callback=self._velocity_cb)
         rospy.Subscriber(
-            '/mavros/global_position/raw/fix',
+            self._resolve_name('/mavros/global_position/raw/fix'),
             NavSatFix,
             callback=self._gps_cb)
         rospy.Subscriber(
-            '/mavros/estimator_status',
+            self._resolve_name('/mavros/estimator_status'),
             EstimatorStatus,
             callback=self._est_status_cb)
 
     def _state_cb(self, msg):
         self._state = msg
+        self._notify_msg()
 
     def _pose_cb(self, msg):
         self._pose = msg
+        self.state_buffer.write_pose(msg)
+        self._notify_msg()
 
     def _velocity_cb(self, msg):
         self._velocity = msg
+        self.state_buffer.write_velocity(msg)
+        self._notify_msg()
 
     def _gps_cb(self, msg):
         self._gps = msg
+        self.state_buffer.write_gps(msg)
+        self._notify_msg()
 
     def _est_status_cb(self, msg):
         self._est_status = msg
+        self._notify_msg()
 
     @property
     def state(self):
@@ -109,23 +129,55 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
         """ Returns the mavros gps coordinates of the robot. """
         return self._gps
 
+    def state_snapshot(self, out=None):
+        """
+        Returns a snapshot of the numeric pose, velocity and gps of the
+        robot. If a maximum stamp skew is configured, waits up to the sync
+        timeout for the stamps of the synchronized fields to lie within it
+        and otherwise returns the latest state with a warning.
+
+        Parameters
+        ----------
+        out: dict
+            Optional snapshot as returned by allocate_snapshot() to copy into
+        """
+        if self.max_stamp_skew > 0.0 and not self._wait_for(
+                lambda: self.state_buffer.stamp_skew(
+                    self.synchronized_fields) <= self.max_stamp_skew,
+                self.sync_timeout):
+            rospy.logwarn(
+                'Robot state stamps differ by more than {} seconds.'.format(
+                    self.max_stamp_skew))
+        return self.state_buffer.snapshot(out)
+
+    @staticmethod
+    def allocate_state_snapshot():
+        """ Returns a new snapshot to be filled by state_snapshot(). """
+        return allocate_snapshot()
+
     def _check_all_subscribers_ready(self):
         """
         Checks that all the subscribers are ready for connection
         """
-        self._state = self._check_subscriber_ready('/mavros/state', State)
-        self._pose = \
+        self._state = \
             self._check_subscriber_ready(
-                '/mavros/local_position/pose', PoseStamped)
-        self._velocity = \
+                self._resolve_name('/mavros/state'), State)
+        self._pose_cb(
             self._check_subscriber_ready(
-                '/mavros/local_position/velocity', TwistStamped)
-        self._gps = \
+                self._resolve_name('/mavros/local_position/pose'),
+                PoseStamped))
+        self._velocity_cb(
             self._check_subscriber_ready(
-                '/mavros/global_position/raw/fix', NavSatFix)
+                self._resolve_name('/mavros/local_position/velocity'),
+                TwistStamped))
+        self._gps_cb(
+            self._check_subscriber_ready(
+                self._resolve_name('/mavros/global_position/raw/fix'),
+                NavSatFix))
         self._est_status = \
             self._check_subscriber_ready(
-                '/mavros/estimator_status', EstimatorStatus)
+                self._resolve_name('/mavros/estimator_status'),
+                EstimatorStatus)
         self.last_estimator_ts = \
             self._est_status.header.stamp
 
@@ -140,10 +192,10 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
         """
         Checks that all the services are ready for connection
         """
-        self._check_service_ready('/mavros/set_mode')
-        self._check_service_ready('/mavros/cmd/arming')
-        self._check_service_ready('/mavros/cmd/takeoff')
-        self._check_service_ready('/mavros/cmd/land')
+        self._check_service_ready(self._resolve_name('/mavros/set_mode'))
+        self._check_service_ready(self._resolve_name('/mavros/cmd/arming'))
+        self._check_service_ready(self._resolve_name('/mavros/cmd/takeoff'))
+        self._check_service_ready(self._resolve_name('/mavros/cmd/land'))
 
     def _setup_publishers(self):
         """
@@ -152,7 +204,10 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
         # mavros publishers
         self._local_vel_pub = \
             rospy.Publisher(
-                'mavros/setpoint_velocity/cmd_vel', TwistStamped, queue_size=1)
+                self._resolve_name('/mavros/setpoint_velocity/cmd_vel'),
+                TwistStamped,
+                queue_size=1,
+                subscriber_listener=self._connection_listener)
 
     def _pub_cmd_vel(self, vel_msg):
         self._local_vel_pub.publish(vel_msg)
@@ -160,32 +215,36 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
     def _setup_services(self):
         # mavros services
         self._set_mode_client = \
-            rospy.ServiceProxy('/mavros/set_mode', SetMode)
+            SERVICE_POOL.client(
+                self._resolve_name('/mavros/set_mode'), SetMode)
         self._arming_client = \
-            rospy.ServiceProxy('/mavros/cmd/arming', CommandBool)
+            SERVICE_POOL.client(
+                self._resolve_name('/mavros/cmd/arming'), CommandBool)
         self._takeoff_client = \
-            rospy.ServiceProxy('/mavros/cmd/takeoff', CommandTOL)
+            SERVICE_POOL.client(
+                self._resolve_name('/mavros/cmd/takeoff'), CommandTOL)
         self._land_client = \
-            rospy.ServiceProxy('/mavros/cmd/land', CommandTOL)
+            SERVICE_POOL.client(
+                self._resolve_name('/mavros/cmd/land'), CommandTOL)
 
     def _set_service_request(
             self, name, cond, srv, req, timeout=5.0):
         """
         Tries to set mavros px4 service requests until timeout is reached.
         """
-        start_time = rospy.Time.now()
+        start_time = time.monotonic()
         if not cond():
             try:
                 if srv(*req):
                     rospy.loginfo(
                         'Service {} request successful!'.format(name))
                     # wait for updated state
-                    while not cond() and not rospy.is_shutdown():
-                        if (rospy.Time.now() - start_time).to_sec() >= timeout:
-                            rospy.logerr(
-                                'Call to service {} '.format(name) +
-                                'successful but no response...')
-                            return False
+                    remaining = timeout - (time.monotonic() - start_time)
+                    if not self._wait_for(cond, remaining):
+                        rospy.logerr(
+                            'Call to service {} '.format(name) +
+                            'successful but no response...')
+                        return False
                     return True
                 else:
                     rospy.logwarn('Call to service %s failed.', name)
@@ -256,9 +315,17 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
         ekf2_start = subprocess.Popen([self.px4_ekf2_path, "start"])
         ekf2_start.wait()
 
-    def _check_estimator_status(self):
-        while self._est_status.header.stamp == self.last_estimator_ts:
-            pass
+    def _check_estimator_status(self, timeout=5.0):
+        """
+        Waits for the next estimator status and returns whether the position
+        estimate is valid.
+        """
+        if not self._wait_for(
+                lambda: self._est_status.header.stamp !=
+                self.last_estimator_ts,
+                timeout):
+            rospy.logwarn('No estimator status received.')
+            return False
         status = \
             self._est_status.pos_horiz_rel_status_flag and \
             self._est_status.pos_horiz_abs_status_flag and \
@@ -270,7 +337,7 @@ class MavrosUAVRobotEnv(ROSRobotEnv):
         self._stop_pose_estimator()
         self._start_pose_estimator()
         rospy.loginfo("Waiting for ekf pose estimate to be corrected!")
-        while True:
+        while not rospy.is_shutdown():
             if self._check_estimator_status():
                 # wait for the estimator to reset
                 break
@@ -3,19 +3,29 @@
 Defines the ROSRobotEnv class.
 """
 
+import threading
+import time
 import rospy
 from rospy import ROSException
-from gym_gazebo import robot_gazebo_env
-from gym_airsim import robot_airsim_env
+from task_config import get_config
+from plugin_registry import SIM_BACKENDS
 
-SIM_ENV = rospy.get_param("/ros_gym/sim_env")
-if SIM_ENV == 'gazebo':
-    SIMULATION_ENV = robot_gazebo_env.RobotGazeboEnv
-elif SIM_ENV == 'airsim':
-    SIMULATION_ENV = robot_airsim_env.RobotAirSimEnv
-else:
-    raise NotImplementedError(
-        'Simulation environment ' + SIM_ENV + ' not supported.')
+# only the configured simulator is imported
+SIM_ENV = get_config()['sim_env']
+SIMULATION_ENV = SIM_BACKENDS.load(SIM_ENV)
+
+
+class _ConnectionListener(rospy.SubscribeListener):
+    """
+    Notifies the waiters of a robot environment when a publisher gets a new
+    subscriber.
+    """
+    def __init__(self, notify):
+        super(_ConnectionListener, self).__init__()
+        self._notify = notify
+
+    def peer_subscribe(self, topic_name, topic_publish, peer_publish):
+        self._notify()
 
 
 class ROSRobotEnv(SIMULATION_ENV):
@@ -23,8 +33,14 @@ class ROSRobotEnv(SIMULATION_ENV):
     Defines the base environmnet for simulation of robot of any type.
     """
     def __init__(self):
-        # robot namespace
-        self.robot_name_space = ''
+        # robot namespace, prefixed to the topics and services of the robot
+        self.robot_name_space = rospy.get_param('~robot_name_space', '')
+
+        # notified by subscriber callbacks and publisher connections, so that
+        # waits on the robot state block instead of spinning
+        self._msg_condition = threading.Condition()
+        self._connection_listener = _ConnectionListener(self._notify_msg)
+        rospy.on_shutdown(self._notify_msg)
 
         # launch connection to gazebo
         if SIM_ENV == 'gazebo':
@@ -32,15 +48,16 @@ class ROSRobotEnv(SIMULATION_ENV):
                 robot_name_space=self.robot_name_space,
                 update_physics_params_at_start=True)
         elif SIM_ENV == 'airsim':
+            # the robot namespace names the airsim vehicle of the robot
             super(ROSRobotEnv, self).__init__(
-                robot_name_space=self.robot_name_space)
+                sim_handler=self.make_sim_handler(
+                    vehicle_name=self.robot_name_space.strip('/')))
 
         self.sim_handler.unpause()
         self._setup_subscribers()
         self._setup_publishers()
         self._setup_services()
         self._check_all_systems_ready()
-        self._setup_services()
         self.sim_handler.pause()
 
     def _check_all_systems_ready(self):
@@ -77,6 +94,47 @@ class ROSRobotEnv(SIMULATION_ENV):
         """
         raise NotImplementedError()
 
+    def _resolve_name(self, name):
+        """
+        Returns the given global topic or service name within the robot
+        namespace.
+        """
+        return self.robot_name_space + name
+
+    def _notify_msg(self):
+        """
+        Wakes up the waits on the robot state after a message is received.
+        """
+        with self._msg_condition:
+            self._msg_condition.notify_all()
+
+    def _wait_for(self, cond, timeout=5.0):
+        """
+        Blocks until cond() is true, which is checked each time a message is
+        received, or until timeout wall-clock seconds have passed. Wall-clock
+        time is used since the simulation time stops while paused.
+
+        Parameters
+        ----------
+        cond: callable
+            Condition on the robot state to wait for
+        timeout: Float
+            Time in seconds after which the wait is given up
+
+        Returns
+        -------
+        bool
+            Whether the condition became true before the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._msg_condition:
+            while not cond():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0.0 or rospy.is_shutdown():
+                    return False
+                self._msg_condition.wait(remaining)
+        return True
+
     def _check_subscriber_ready(self, name, srv_type, timeout=5.0):
         """
         Waits for a sensor topic to get ready for connection
@@ -93,14 +151,14 @@ class ROSRobotEnv(SIMULATION_ENV):
 
     def _check_publisher_ready(self, name, obj, timeout=5.0):
         """
-        Waits for a publisher to get response
+        Waits for a publisher to get response. The publisher must be created
+        with subscriber_listener=self._connection_listener to be notified of
+        new subscribers.
         """
-        start_time = rospy.Time.now()
-        while obj.get_num_connections() == 0 and not rospy.is_shutdown():
-            if (rospy.Time.now() - start_time).to_sec() >= timeout:
-                rospy.logerr(
-                    'No subscriber found for the publisher {}. '.format(name) +
-                    'Exiting...')
+        if not self._wait_for(lambda: obj.get_num_connections() > 0, timeout):
+            rospy.logerr(
+                'No subscriber found for the publisher {}. '.format(name) +
+                'Exiting...')
 
     def _check_service_ready(self, name, timeout=5.0):
         """
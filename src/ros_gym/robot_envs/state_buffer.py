@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Defines the StateBuffer class.
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# fields of the robot state and their sizes. The pose is
+# [x, y, z, qw, qx, qy, qz] as in the 'position' observation, the velocity
+# [vx, vy, vz, wx, wy, wz] and the gps [latitude, longitude, altitude].
+STATE_FIELDS = OrderedDict((('pose', 7), ('velocity', 6), ('gps', 3)))
+
+
+def allocate_snapshot(fields=STATE_FIELDS):
+    """
+    Returns a new state snapshot of the fields, whose 'stamps' entry holds
+    the stamp of each field in the order of the fields.
+    """
+    snapshot = {name: np.zeros(size) for name, size in fields.items()}
+    snapshot['stamps'] = np.full(len(fields), np.nan)
+    return snapshot
+
+
+class StateBuffer(object):
+    """
+    A double-buffered record of the latest robot state written by the
+    subscriber callbacks. Each field has a front and a back array. A writer
+    converts its message into the back array without blocking the readers
+    and then swaps both arrays together with the stamp of the message, so
+    that snapshot() copies a consistent state of all fields with a single
+    short lock.
+
+    Parameters
+    ----------
+    fields: OrderedDict
+        Size of each field of the state
+    """
+    def __init__(self, fields=STATE_FIELDS):
+        self.fields = OrderedDict(fields)
+        self._slots = {
+            name: np.zeros((2, size)) for name, size in self.fields.items()}
+        self._stamps = {name: np.full(2, np.nan) for name in self.fields}
+        self._front = {name: 0 for name in self.fields}
+        # writers of a field may race with the readiness checks, which feed
+        # the first messages from another thread
+        self._write_locks = {name: threading.Lock() for name in self.fields}
+        self._lock = threading.Lock()
+
+    def write(self, name, stamp, values):
+        """
+        Writes the values of a field received at the given stamp.
+
+        Parameters
+        ----------
+        name: str
+            Name of the field
+        stamp: Float
+            Time stamp of the values in seconds
+        values: sequence
+            Values of the field
+        """
+        with self._write_locks[name]:
+            back = 1 - self._front[name]
+            self._slots[name][back] = values
+            with self._lock:
+                self._stamps[name][back] = stamp
+                self._front[name] = back
+
+    def write_pose(self, msg):
+        """ Writes the pose of a PoseStamped message. """
+        pose = msg.pose
+        self.write('pose', msg.header.stamp.to_sec(), (
+            pose.position.x,
+            pose.position.y,
+            pose.position.z,
+            pose.orientation.w,
+            pose.orientation.x,
+            pose.orientation.y,
+            pose.orientation.z))
+
+    def write_velocity(self, msg):
+        """ Writes the velocity of a TwistStamped message. """
+        twist = msg.twist
+        self.write('velocity', msg.header.stamp.to_sec(), (
+            twist.linear.x,
+            twist.linear.y,
+            twist.linear.z,
+            twist.angular.x,
+            twist.angular.y,
+            twist.angular.z))
+
+    def write_gps(self, msg):
+        """ Writes the coordinates of a NavSatFix message. """
+        self.write('gps', msg.header.stamp.to_sec(), (
+            msg.latitude,
+            msg.longitude,
+            msg.altitude))
+
+    def stamp_skew(self, names):
+        """
+        Returns the difference in seconds between the latest and the oldest
+        stamp of the given fields, nan if a field has not been written yet.
+        """
+        with self._lock:
+            stamps = np.array([
+                self._stamps[name][self._front[name]] for name in names])
+        return float(stamps.max() - stamps.min())
+
+    def snapshot(self, out=None):
+        """
+        Copies the latest values and stamps of all fields into out.
+
+        Parameters
+        ----------
+        out: dict
+            Optional snapshot as returned by allocate_snapshot() to copy into
+        """
+        if out is None:
+            out = allocate_snapshot(self.fields)
+        stamps = out['stamps']
+        with self._lock:
+            for index, name in enumerate(self.fields):
+                front = self._front[name]
+                out[name][...] = self._slots[name][front]
+                stamps[index] = self._stamps[name][front]
+        return out
@@ -3,9 +3,33 @@
 Defines the RobotSimEnv class.
 """
 
+import os
+import numpy as np
 import rospy
+import rospkg
 import gym
+from gym.spaces import Dict
 from ros_gym_msgs.msg import RLExperimentInfo
+from task_config import get_config
+from observation_layout import ObservationLayout, ObservationRingBuffer
+from image_preprocessing import ImagePreprocessor
+from step_telemetry import StepTelemetry
+from step_profiler import StepProfiler
+
+# methods of the simulation handlers whose latencies are profiled
+PROFILED_HANDLER_METHODS = (
+    'check_connection', 'reset', 'pause', 'unpause', 'fast_reset',
+    'save_start_state', 'prefetch', 'client_cmd_vel', 'client_arm',
+    'client_takeoff', 'client_land', 'client_image', 'client_camera',
+    'client_camera_depth')
+
+# observations are returned as a dict of arrays created per step, except the
+# images written into reused arrays if image_buffer_size > 0
+OBSERVATION_MODE_DICT = 'dict'
+# observations are returned as named views of preallocated contiguous buffers
+OBSERVATION_MODE_VIEWS = 'views'
+# observations are returned as a flat float32 vector of the buffers
+OBSERVATION_MODE_FLAT = 'flat'
 
 
 class RobotSimEnv(gym.Env):
@@ -21,12 +45,224 @@ class RobotSimEnv(gym.Env):
         airsim or gazebo.
     """
 
+    # observation keys read by _is_done() and _compute_reward() that cannot
+    # be filtered out of the observation space
+    required_observation_keys = ()
+
     def __init__(self, sim_handler):
         self.sim_handler = sim_handler
+        config = get_config()
         self.episode_num = 0
         self.cumulated_episode_reward = 0
         self.reward_pub = \
             rospy.Publisher('/openai/reward', RLExperimentInfo, queue_size=1)
+        # episodes are started by moving the robot back to its start state
+        # if the simulation handler supports it, with a full reset every
+        # full_reset_every episodes (never if 0)
+        self.fast_reset = config.get('fast_reset/enabled', False)
+        self.full_reset_every = config.get('fast_reset/full_reset_every', 0)
+        # the connection to the simulation is only checked on the first step
+        # of an episode or after a failed step instead of on every step
+        self._check_connection = True
+        # logging of the step loop, which is summarized per episode in
+        # counters mode
+        self.telemetry = StepTelemetry.from_config(config)
+        self.profiler = self._make_profiler(config)
+        self._filter_observation_space(config.get('observation_keys', ()))
+        self._setup_image_preprocessing(
+            config.get('image_preprocessing', {}),
+            config.get('image_buffer_size', 0))
+        self._setup_observation_layout(
+            config.get('observation_layout/mode', OBSERVATION_MODE_DICT),
+            config.get('observation_layout/buffer_size', 2))
+
+    def _make_profiler(self, config):
+        """
+        Returns the profiler of the step latencies configured by the
+        profiling parameters, whose histograms are dumped to the
+        training_results directory by default.
+        """
+        enabled = config.get('profiling/enabled', False)
+        output_file = ''
+        if enabled:
+            output_dir = config.get('profiling/output_dir', '')
+            if not output_dir:
+                output_dir = os.path.join(
+                    rospkg.RosPack().get_path('ros_gym'), 'training_results')
+            output_file = \
+                StepProfiler.output_path(
+                    output_dir, getattr(self, 'robot_name_space', ''))
+        profiler = \
+            StepProfiler(
+                enabled=enabled,
+                publish_period=config.get('profiling/publish_period', 0.0),
+                output_file=output_file)
+        if self.sim_handler is not None:
+            profiler.instrument(self.sim_handler, PROFILED_HANDLER_METHODS)
+        return profiler
+
+    def _filter_observation_space(self, keys):
+        """
+        Restricts a Dict observation space to the given keys, so that the
+        sensors of the other keys are never queried. All keys are kept if
+        none are given.
+
+        Parameters
+        ----------
+        keys: list
+            Keys of the observation space to keep
+        """
+        if not keys:
+            return
+        if not isinstance(getattr(self, 'observation_space', None), Dict):
+            raise ValueError(
+                'Observation keys can only be selected from a Dict '
+                'observation space.')
+        spaces = self.observation_space.spaces
+        unknown = [key for key in keys if key not in spaces]
+        if unknown:
+            raise ValueError(
+                'Unknown observation keys: {}'.format(', '.join(unknown)))
+        missing = [
+            key for key in self.required_observation_keys if key not in keys]
+        if missing:
+            raise ValueError(
+                'Observation keys required by the task are missing: '
+                '{}'.format(', '.join(missing)))
+        self.observation_space = \
+            Dict({key: space for key, space in spaces.items() if key in keys})
+
+    def _setup_image_preprocessing(self, settings, valid_steps):
+        """
+        Sets up the preprocessing of the image observation keys and replaces
+        their observation spaces by the preprocessed ones.
+
+        Parameters
+        ----------
+        settings: dict
+            Arguments of the ImagePreprocessor of each observation key
+        valid_steps: int
+            Number of steps a preprocessed image stays unchanged, a new array
+            is returned per step if 0
+        """
+        self._image_preprocessors = {}
+        if not settings:
+            return
+        if not isinstance(getattr(self, 'observation_space', None), Dict):
+            raise ValueError(
+                'Images can only be preprocessed in a Dict observation '
+                'space.')
+        spaces = dict(self.observation_space.spaces)
+        for key, params in settings.items():
+            # keys filtered out of the observation space are ignored
+            if key not in spaces:
+                continue
+            preprocessor = \
+                ImagePreprocessor(
+                    spaces[key], valid_steps=valid_steps, **dict(params))
+            self._image_preprocessors[key] = preprocessor
+            spaces[key] = preprocessor.observation_space
+        self.observation_space = Dict(spaces)
+
+    def _write_image(self, obs, key, read_image):
+        """
+        Writes the image of the observation key into the observation,
+        preprocessing it if configured.
+
+        Parameters
+        ----------
+        obs: dict
+            Observation as returned by _next_observation()
+        key: str
+            Key of the observation space
+        read_image: callable
+            Function returning the raw image, written into the array given
+            as its argument unless that is None
+        """
+        preprocessor = self._image_preprocessors.get(key)
+        if preprocessor is None:
+            obs[key] = read_image(obs.get(key))
+        else:
+            obs[key] = preprocessor(read_image(None), out=obs.get(key))
+
+    def _setup_observation_layout(self, mode, buffer_size):
+        """
+        Sets up the buffers the observations are written into. In views and
+        flat modes an observation returned by step() or reset() is only valid
+        until buffer_size - 1 further observations have been made. In flat
+        mode, the observation space is replaced by the flat vector space while
+        the Dict space stays available as observation_dict_space.
+        """
+        if mode not in (
+                OBSERVATION_MODE_DICT,
+                OBSERVATION_MODE_VIEWS,
+                OBSERVATION_MODE_FLAT):
+            raise NotImplementedError(
+                'Observation mode ' + mode + ' not supported.')
+        self.observation_mode = mode
+        self.observation_dict_space = \
+            self.observation_space \
+            if isinstance(getattr(self, 'observation_space', None), Dict) \
+            else None
+        self._observation_buffers = None
+        if mode == OBSERVATION_MODE_DICT or \
+                self.observation_dict_space is None:
+            return
+        layout = \
+            ObservationLayout(
+                self.observation_dict_space,
+                flat=mode == OBSERVATION_MODE_FLAT)
+        self._observation_buffers = \
+            ObservationRingBuffer(layout, buffer_size)
+        if layout.flat:
+            self.observation_space = layout.flat_space()
+
+    @property
+    def observation_buffers(self):
+        """
+        Returns the ring buffer the observations are written into in views
+        and flat modes, None in dict mode.
+        """
+        return self._observation_buffers
+
+    def _next_observation(self):
+        """
+        Returns the dict the next observation is written into by _get_obs().
+        This holds the named views of the next preallocated buffer if a
+        layout is used, otherwise it is empty and the arrays of the keys are
+        created by _observation_array().
+        """
+        if self._observation_buffers is not None:
+            return self._observation_buffers.next()
+        return {}
+
+    def _observation_array(self, obs, key):
+        """
+        Returns the array of the observation key to be written into, which
+        is created if the observation has none yet.
+
+        Parameters
+        ----------
+        obs: dict
+            Observation as returned by _next_observation()
+        key: str
+            Key of the observation space
+        """
+        array = obs.get(key)
+        if array is None:
+            space = self.observation_dict_space.spaces[key]
+            array = np.empty(space.shape, dtype=space.dtype)
+            obs[key] = array
+        return array
+
+    def _agent_observation(self, obs):
+        """
+        Returns the observation in the form handed to the agent.
+        """
+        if self.observation_mode == OBSERVATION_MODE_FLAT and \
+                self._observation_buffers is not None:
+            return self._observation_buffers.flat
+        return obs
 
     def step(self, action):
         """
@@ -50,16 +286,74 @@ class RobotSimEnv(gym.Env):
         info: Any additional info about the training step.
         """
 
-        self.sim_handler.check_connection()
-        self.sim_handler.unpause()
-        self._set_action(action)
-        self.sim_handler.pause()
+        profiler = self.profiler
+        start = profiler.start()
+        self._ensure_connection()
+        lap = profiler.lap('step/check_connection', start)
+
+        def apply_action():
+            action_start = profiler.start()
+            self._set_action(action)
+            profiler.lap('step/action', action_start)
+
+        try:
+            self.sim_handler.step(apply_action)
+        except Exception:
+            self._check_connection = True
+            raise
+        lap = profiler.lap('step/simulation', lap)
         obs = self._get_obs()
+        lap = profiler.lap('step/observation', lap)
         done = self._is_done(obs)
+        lap = profiler.lap('step/done', lap)
         info = {}
         reward = self._compute_reward(obs, done)
+        profiler.lap('step/reward', lap)
         self.cumulated_episode_reward += reward
-        return obs, reward, done, info
+        profiler.lap('step', start)
+        profiler.end_step()
+        return self._agent_observation(obs), reward, done, info
+
+    def _ensure_connection(self):
+        """
+        Checks the connection to the simulation if no step has succeeded
+        since the last reset or the last failed step.
+        """
+        if self._check_connection:
+            self.sim_handler.check_connection()
+            self._check_connection = False
+
+    def check_observation(self, obs, done):
+        """
+        Fetches the observation again from the paused simulation and logs an
+        error if it differs from the given result of the last step, e.g. to
+        check a step run in the background by the AsyncStep wrapper.
+
+        Parameters
+        ----------
+        obs: Observation of any type
+            The observation returned by the last step
+        done: bool
+            The done returned by the last step
+        """
+        self.sim_handler.invalidate_cache()
+        sync_obs = self._get_obs()
+        sync_done = self._is_done(sync_obs)
+        sync_obs = self._agent_observation(sync_obs)
+        if isinstance(obs, dict):
+            mismatches = [
+                key for key in obs
+                if not np.array_equal(obs[key], sync_obs[key])]
+        elif not np.array_equal(obs, sync_obs):
+            mismatches = ['obs']
+        else:
+            mismatches = []
+        if done != sync_done:
+            mismatches.append('done')
+        if mismatches:
+            rospy.logerr(
+                'Step result differs from the observation fetched again '
+                'in: {}'.format(', '.join(mismatches)))
 
     def reset(self):
         """
@@ -74,17 +368,88 @@ class RobotSimEnv(gym.Env):
             also defined at a lower level of hierarchy.
         """
         rospy.loginfo('Resetting environment...')
-        self._pre_reset()
-        self.sim_handler.pause()
-        self.sim_handler.reset()
-        self._set_init_pose()
-        self._init_env_variables()
-        self._update_episode()
-        obs = self._get_obs()
+        profiler = self.profiler
+        # the latencies of the finished episode are dumped before the reset
+        # latencies of the new one are recorded
+        profiler.end_episode(self.episode_num)
+        start = profiler.start()
+        if self._fast_reset():
+            lap = profiler.lap('reset/fast_reset', start)
+        else:
+            lap = profiler.lap('reset/fast_reset_check', start)
+            self._pre_reset()
+            lap = profiler.lap('reset/pre_reset', lap)
+            self.sim_handler.pause()
+            self.sim_handler.reset()
+            self._set_init_pose()
+            lap = profiler.lap('reset/simulation', lap)
+            self._init_env_variables()
+            lap = profiler.lap('reset/init_env_variables', lap)
+            # the episode starts from a paused simulation as after each step
+            self.sim_handler.pause()
+            self.sim_handler.save_start_state()
+            lap = profiler.lap('reset/save_start_state', lap)
+        obs = self._start_episode()
+        profiler.lap('reset/observation', lap)
+        profiler.lap('reset', start)
         return obs
 
+    def kinematic_reset(self):
+        """
+        Starts a new episode by only moving the robot back to the start state
+        saved on the last full reset, with zero velocities, while the
+        simulation stays paused. Used to reset a single robot of a shared
+        world without running the world. A full reset is done if no start
+        state has been saved.
+
+        Returns
+        -------
+        obs: Observation of any type
+            The initial observation of the episode
+        """
+        if not self.sim_handler.fast_reset():
+            rospy.logwarn('No start state saved, resetting fully.')
+            return self.reset()
+        self.profiler.end_episode(self.episode_num)
+        self._init_episode_variables()
+        return self._start_episode()
+
+    def _start_episode(self):
+        """
+        Starts the episode after the simulation has been reset and returns
+        its initial observation.
+        """
+        self._update_episode()
+        self._check_connection = True
+        for preprocessor in self._image_preprocessors.values():
+            preprocessor.reset()
+        return self._agent_observation(self._get_obs())
+
+    def _fast_reset(self):
+        """
+        Moves the robot back to the start state saved on the last full reset
+        if fast resets are enabled, which skips the preparation of the robot
+        done in _pre_reset() and _init_env_variables().
+
+        Returns
+        -------
+        bool
+            Whether the fast reset was performed.
+        """
+        if not self.fast_reset:
+            return False
+        if self.full_reset_every > 0 and \
+                self.episode_num % self.full_reset_every == 0:
+            return False
+        if not self.sim_handler.fast_reset():
+            return False
+        self._init_episode_variables()
+        return True
+
     def close(self):
         """ Performs cleanup operations to close the environment. """
+        if self.sim_handler is not None:
+            self.sim_handler.close()
 
     def _update_episode(self):
         """
@@ -93,6 +458,7 @@ class RobotSimEnv(gym.Env):
         """
         self._publish_reward_topic(
             self.cumulated_episode_reward, self.episode_num)
+        self.telemetry.end_episode(self.episode_num)
         self.episode_num += 1
         self.cumulated_episode_reward = 0
 
@@ -145,6 +511,13 @@ class RobotSimEnv(gym.Env):
         """
         raise NotImplementedError()
 
+    def _init_episode_variables(self):
+        """
+        Inits the variables of an episode that do not require preparing the
+        robot, as these are the only ones initialized on a fast reset.
+        """
+        raise NotImplementedError()
+
     def _set_action(self, action):
         """
         Applies the given action to the simulation.
@@ -177,15 +550,25 @@ class WorldState():
     The base class composed of all the possible world data that can be
     obtained from the world and is used in training in concrete terms.
     """
+    # images required by the observation space, mapping each observation key
+    # to a (camera_index, image_type, compress, pixels_as_float) request
+    image_requests = {}
+
     def __init__(self):
         pass
 
-    def camera(self, camera_index):
-        """ Should return the camera image at camera_index. """
+    def camera(self, camera_index, out=None):
+        """
+        Should return the camera image at camera_index, written into out if
+        given.
+        """
         raise NotImplementedError()
 
-    def camera_depth(self, camera_index):
-        """ Should return the camera image with depth at camera_index. """
+    def camera_depth(self, camera_index, out=None):
+        """
+        Should return the camera image with depth at camera_index, written
+        into out if given.
+        """
         raise NotImplementedError()
 
     @property
@@ -3,14 +3,21 @@
 Defines the ros node class MavrosGym.
 """
 
+import os
+import time
+from functools import partial
 import rospy
 import rospkg
 import gym
-from gym import wrappers
 from gym import register
 from gym import envs
 from rl_agents.common.agent_base import AgentBase
-from task_envs.task_env_map import TASK_ENV_MAP
+from plugin_registry import TASK_ENVS, SIM_BACKENDS
+from env_worker_pool import EnvWorkerPool
+from task_config import get_config
+from transition_recorder import TransitionRecorder
+from episode_monitor import EpisodeMonitor
+from async_step import AsyncStep
 
 
 class MavrosGym:
@@ -30,47 +37,169 @@ class MavrosGym:
         registered and accesible. return: False if the Task_Env wasnt
         registered, True if it was.
         """
+        name = self._register(task_env, max_episode_steps_per_episode)
+        task_env = gym.make(name)
+        return task_env
+
+    def register_vec_env(
+            self,
+            task_env,
+            vehicle_names,
+            max_episode_steps_per_episode=10000):
+        """
+        Registers the gym environment and returns a vectorized environment
+        that runs an instance of it for each of the given airsim vehicles in
+        the same airsim world. The vehicles are driven through the airsim
+        handler of each vehicle, so mavros control is not supported.
+        """
+        config = get_config()
+        if config['sim_env'] != 'airsim' or config.get('use_mavros', False):
+            raise NotImplementedError(
+                'Several vehicle_names are only supported for airsim '
+                'vehicles controlled through airsim, unset use_mavros to run '
+                'them.')
+        # imported here as it is only available with airsim
+        from gym_airsim.robot_airsim_vec_env import RobotAirSimVecEnv
+
+        name = self._register(task_env, max_episode_steps_per_episode)
+        return RobotAirSimVecEnv(
+            lambda sim_handler:
+            gym.make(name, sim_handler=sim_handler).unwrapped,
+            vehicle_names,
+            max_episode_steps_per_episode)
+
+    def register_worker_pool(
+            self,
+            task_env,
+            robot_name_spaces,
+            max_episode_steps_per_episode=10000):
+        """
+        Returns a vectorized environment that runs an instance of the gym
+        environment in a separate process for each of the given robot
+        namespaces.
 
+        The workers pause, step and reset their simulation, so each worker
+        requires a world of its own. With gazebo, each worker runs in a
+        gazebo instance launched under its robot namespace, see
+        RobotGazeboEnv.check_worker_pool(). The vehicles of an airsim world
+        must be run in a vectorized environment with vehicle_names instead.
+        """
+        sim_env = get_config()['sim_env']
+        if sim_env == 'airsim':
+            raise NotImplementedError(
+                'The env worker pool does not support airsim, set '
+                'vehicle_names instead of worker_name_spaces to run several '
+                'airsim vehicles.')
+        if sim_env == 'gazebo':
+            SIM_BACKENDS.load(sim_env).check_worker_pool(robot_name_spaces)
+        return EnvWorkerPool(
+            partial(
+                self.register_env, task_env, max_episode_steps_per_episode),
+            robot_name_spaces)
+
+    # pylint: disable=no-self-use
+    def _register(self, task_env, max_episode_steps_per_episode):
+        """
+        Registers the task_env in gym and returns its gym id.
+        """
         name = task_env.replace("_", "-")
-        if TASK_ENV_MAP[task_env] is not None:
-            env_file = 'task_envs.' + task_env + ":" + TASK_ENV_MAP[task_env]
-            register(
-                id=name,
-                entry_point=env_file,
-                max_episode_steps=max_episode_steps_per_episode
-            )
-
-            # import our training environment
-            # pylint: disable=exec-used
-            exec(
-                'from task_envs.' +
-                task_env +
-                ' import ' +
-                TASK_ENV_MAP[task_env])
+        # gym imports the task environment on the first make
+        register(
+            id=name,
+            entry_point=TASK_ENVS.entry_point(task_env),
+            max_episode_steps=max_episode_steps_per_episode
+        )
 
         # Check that it was really registered
         supported_gym_envs = [env_spec.id for env_spec in envs.registry.all()]
         assert (
             name in supported_gym_envs), \
             "Registration of the task_env {} failed.".format(name)
-        task_env = gym.make(name)
-        return task_env
+        return name
 
     def setup(self):
         """ Gets the environment configuration and register it in gym """
-        env_name = rospy.get_param('ros_gym/environment_name')
-        max_episode_steps = rospy.get_param('ros_gym/max_episode_steps')
-        self.task_env = self.register_env(env_name, max_episode_steps)
-
-        self.agent = \
-            AgentBase.get_agent(rospy.get_param('~agent'), env=self.task_env)
-        rospy.loginfo('Using agent of type: {}'.format(self.agent.name))
+        config = get_config()
+        env_name = config['environment_name']
+        max_episode_steps = config['max_episode_steps']
+        vehicle_names = config.get('vehicle_names', ())
+        worker_name_spaces = config.get('worker_name_spaces', ())
+        vectorized = len(worker_name_spaces) > 0 or len(vehicle_names) > 1
+        if worker_name_spaces:
+            self.task_env = \
+                self.register_worker_pool(
+                    env_name, worker_name_spaces, max_episode_steps)
+        elif len(vehicle_names) > 1:
+            self.task_env = \
+                self.register_vec_env(
+                    env_name, vehicle_names, max_episode_steps)
+        else:
+            self.task_env = self.register_env(env_name, max_episode_steps)
 
         # Set the logging system
         rospack = rospkg.RosPack()
         pkg_path = rospack.get_path('ros_gym')
         outdir = pkg_path + '/training_results'
-        self.task_env = wrappers.Monitor(self.task_env, outdir, force=True)
+        if vectorized:
+            rospy.loginfo(
+                'Episode statistics are not recorded for vectorized '
+                'environments.')
+        else:
+            if config.get('recording/enabled', False):
+                self.task_env = self._make_recorder(config, outdir)
+            if config.get('monitor/enabled', True):
+                self.task_env = self._make_monitor(config, outdir)
+            # outermost, so that asynchronous steps run through all wrappers
+            self.task_env = \
+                AsyncStep(
+                    self.task_env,
+                    debug_observation=config.get(
+                        'debug_async_observation', False))
+
+        # the agent is created last, so that it uses the env through all
+        # wrappers
+        self.agent = \
+            AgentBase.get_agent(rospy.get_param('~agent'), env=self.task_env)
+        rospy.loginfo('Using agent of type: {}'.format(self.agent.name))
+
+    def _make_recorder(self, config, outdir):
+        """
+        Returns the task environment wrapped in a recorder of its transitions,
+        which are written to a new directory per run.
+        """
+        directory = \
+            os.path.join(
+                config.get('recording/directory', '') or
+                os.path.join(outdir, 'transitions'),
+                time.strftime('%Y%m%d-%H%M%S'))
+        rospy.loginfo('Recording transitions to {}.'.format(directory))
+        return TransitionRecorder(
+            self.task_env,
+            directory,
+            chunk_size=config.get('recording/chunk_size', 1000),
+            queue_size=config.get('recording/queue_size', 256))
+
+    def _make_monitor(self, config, outdir):
+        """
+        Returns the task environment wrapped in a monitor of its episodes,
+        which writes its files in the background under a disk budget.
+        """
+        directory = \
+            config.get('monitor/directory', '') or \
+            os.path.join(outdir, 'monitor')
+        rospy.loginfo('Monitoring episodes in {}.'.format(directory))
+        return EpisodeMonitor(
+            self.task_env,
+            directory,
+            video_key=config.get('monitor/video_key', ''),
+            video_interval=config.get('monitor/video_interval', 100),
+            frame_skip=config.get('monitor/frame_skip', 1),
+            max_frames=config.get('monitor/max_frames', 1000),
+            flush_interval=config.get('monitor/flush_interval', 10.0),
+            flush_episodes=config.get('monitor/flush_episodes', 100),
+            max_file_bytes=config.get('monitor/max_file_bytes', 1 << 20),
+            max_bytes=config.get('monitor/max_bytes', 1 << 30),
+            queue_size=config.get('monitor/queue_size', 64))
 
     def start_training(self):
         """
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Defines the ServiceClient and ServicePool classes.
+"""
+
+import threading
+import time
+import rospy
+
+# beginnings of the messages of the service exceptions raised by rospy when
+# the connection is broken, other service exceptions are raised by the
+# service handler
+CONNECTION_ERRORS = ('transport error', 'unable to connect')
+
+
+def is_connection_error(exc):
+    """
+    Returns whether the exception of a service call was caused by a broken
+    connection rather than by the service handler, so that the call was not
+    executed and may be retried.
+    """
+    if isinstance(exc, rospy.ROSInterruptException):
+        return False
+    if isinstance(exc, rospy.ServiceException):
+        return str(exc).startswith(CONNECTION_ERRORS)
+    # transport errors raised when (re)connecting
+    return isinstance(exc, rospy.ROSException)
+
+
+class ServiceClient(object):
+    """
+    A persistent connection to a ros service that is reconnected if the
+    service server restarts. Calls are only retried if the connection was
+    broken, never if the service handler failed. The wall time of each call
+    is recorded.
+
+    Parameters
+    ----------
+    name: str
+        Name of the service
+    service_class: Service type
+        Type of the service
+    timeout: Float
+        Time in seconds to wait for the service when (re)connecting
+    """
+    def __init__(self, name, service_class, timeout=5.0):
+        self.name = name
+        self.service_class = service_class
+        self.timeout = timeout
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self._proxy = None
+        self._lock = threading.Lock()
+
+    @property
+    def mean_time(self):
+        """ Returns the mean wall time of a call in seconds. """
+        return self.total_time / self.calls if self.calls > 0 else 0.0
+
+    def __call__(self, *args, **kwargs):
+        """
+        Calls the service with the given request arguments.
+        """
+        with self._lock:
+            start_time = time.perf_counter()
+            try:
+                if self._proxy is None or self._is_closed():
+                    self._disconnect()
+                    self._connect()
+                try:
+                    return self._proxy(*args, **kwargs)
+                except rospy.ROSException as exc:
+                    # errors of the service handler are raised as the
+                    # service, e.g. arming, may have been executed
+                    if not is_connection_error(exc):
+                        raise
+                # the connection breaks if the server restarted, so reconnect
+                # and retry once
+                self._disconnect()
+                self._connect()
+                try:
+                    return self._proxy(*args, **kwargs)
+                except rospy.ROSException as exc:
+                    if isinstance(exc, (
+                            rospy.ServiceException,
+                            rospy.ROSInterruptException)):
+                        raise
+                    raise rospy.ServiceException(
+                        'Service {} unavailable: {}'.format(self.name, exc))
+            finally:
+                call_time = time.perf_counter() - start_time
+                self.calls += 1
+                self.total_time += call_time
+                self.max_time = max(self.max_time, call_time)
+
+    def _connect(self):
+        """
+        Waits for the service and opens a persistent connection to it.
+        """
+        try:
+            rospy.wait_for_service(self.name, self.timeout)
+        except rospy.ROSException as exc:
+            raise rospy.ServiceException(
+                'Service {} unavailable: {}'.format(self.name, exc))
+        self._proxy = \
+            rospy.ServiceProxy(self.name, self.service_class, persistent=True)
+
+    def _is_closed(self):
+        """
+        Returns whether the persistent connection of the proxy has been
+        closed.
+        """
+        transport = getattr(self._proxy, 'transport', None)
+        return transport is not None and getattr(transport, 'done', False)
+
+    def _disconnect(self):
+        """
+        Closes the connection to the service.
+        """
+        if self._proxy is not None:
+            self._proxy.close()
+            self._proxy = None
+
+    def close(self):
+        """
+        Closes the connection to the service.
+        """
+        with self._lock:
+            self._disconnect()
+
+
+class ServicePool(object):
+    """
+    Pool of service clients shared by the simulation handlers and robot
+    environments, so that each service is called over a single persistent
+    connection.
+    """
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, name, service_class, timeout=5.0):
+        """
+        Returns the client of the given service, creating it if required.
+
+        Parameters
+        ----------
+        name: str
+            Name of the service
+        service_class: Service type
+            Type of the service
+        timeout: Float
+            Time in seconds to wait for the service when (re)connecting
+        """
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                client = ServiceClient(name, service_class, timeout)
+                self._clients[name] = client
+            return client
+
+    def latencies(self):
+        """
+        Returns the number of calls, the mean and the maximum wall time in
+        seconds of the calls of each service.
+        """
+        with self._lock:
+            return {
+                name: (client.calls, client.mean_time, client.max_time)
+                for name, client in self._clients.items()}
+
+    def close(self):
+        """
+        Closes the connections of all clients.
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+
+
+# service pool shared within the process
+SERVICE_POOL = ServicePool()
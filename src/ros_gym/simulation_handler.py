@@ -36,6 +36,46 @@ class SimulationHandler(object):
         """
         raise NotImplementedError()
 
+    def step(self, apply_action):
+        """
+        Runs the simulation for a single environment step. By default the
+        simulation is unpaused while the action is applied and paused again
+        afterwards.
+
+        Parameters
+        ----------
+        apply_action: callable
+            Function that sends the action of this step to the robot
+        """
+        self.unpause()
+        apply_action()
+        self.pause()
+
+    def save_start_state(self):
+        """
+        Might be implemented to save the current state of the robot as the
+        state to return to on fast_reset().
+        """
+
+    def fast_reset(self):
+        """
+        Might be implemented to move the robot back to the state saved by
+        save_start_state() without resetting the simulation.
+
+        Returns
+        -------
+        bool
+            Whether the fast reset was performed, otherwise a full reset is
+            required.
+        """
+        return False
+
+    def invalidate_cache(self):
+        """
+        Might be implemented to drop any simulation data cached since the last
+        step, so that it is fetched again on the next access.
+        """
+
     def initialize_physics_params(self):
         """
         Might be implemented to update physics parameters at startup
@@ -46,3 +86,9 @@ class SimulationHandler(object):
         Checkts whether the handler is connected to simulation and everything
         is working fine
         """
+
+    def close(self):
+        """
+        Might be implemented to release the connections of the handler to
+        the simulator.
+        """
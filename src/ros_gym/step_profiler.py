@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Defines the LatencyHistogram and StepProfiler classes.
+"""
+
+import functools
+import json
+import os
+import time
+import numpy as np
+import rospy
+from std_msgs.msg import String
+
+# latencies are recorded with a relative precision of 2 / 2**HISTOGRAM_BITS
+HISTOGRAM_BITS = 7
+# latencies are recorded in nanoseconds up to 2**HISTOGRAM_MAX_BITS
+HISTOGRAM_MAX_BITS = 40
+
+# percentiles reported in the summaries of the histograms
+SUMMARY_PERCENTILES = (50.0, 90.0, 99.0)
+
+
+class LatencyHistogram(object):
+    """
+    An HDR-style histogram of latencies in nanoseconds. Values below
+    2**bits are counted exactly and larger values in log-linear buckets, each
+    power of two being split into 2**(bits - 1) linear buckets, so that the
+    relative error of any value is below 2 / 2**bits over the whole range.
+
+    Parameters
+    ----------
+    bits: int
+        Number of significant bits of the bucket boundaries
+    max_bits: int
+        Number of bits of the largest value, larger values are counted in
+        the last bucket
+    """
+    def __init__(self, bits=HISTOGRAM_BITS, max_bits=HISTOGRAM_MAX_BITS):
+        self.bits = bits
+        self._sub_count = 1 << bits
+        self._half = self._sub_count >> 1
+        # counted in a list, which is cheaper to increment than an array
+        self.counts = [0] * ((max_bits - bits + 2) * self._half)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        """
+        Records a latency in nanoseconds.
+        """
+        if value < self._sub_count:
+            index = max(value, 0)
+        else:
+            exponent = value.bit_length() - self.bits
+            index = \
+                min(exponent * self._half + (value >> exponent),
+                    len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, index):
+        """
+        Returns the largest value counted in the bucket of the given index.
+        """
+        if index < self._sub_count:
+            return index
+        exponent = index // self._half - 1
+        return ((index - exponent * self._half + 1) << exponent) - 1
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound of the given percentile of the latencies in
+        nanoseconds, 0 if no latency was recorded.
+        """
+        if not self.count:
+            return 0
+        cumulated = np.cumsum(self.counts)
+        index = \
+            int(np.searchsorted(cumulated, percent / 100.0 * self.count))
+        return min(self.upper_bound(index), self.max)
+
+    def clear(self):
+        """ Removes all recorded latencies. """
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def summary(self):
+        """
+        Returns the count and the mean, percentiles and maximum latency in
+        milliseconds.
+        """
+        summary = {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1e-6 if self.count else 0.0,
+            'max_ms': self.max * 1e-6}
+        for percent in SUMMARY_PERCENTILES:
+            summary['p{:g}_ms'.format(percent)] = \
+                self.percentile(percent) * 1e-6
+        return summary
+
+    def buckets(self):
+        """
+        Returns [upper bound in nanoseconds, count] of the non-empty buckets.
+        """
+        return [
+            [self.upper_bound(index), count]
+            for index, count in enumerate(self.counts) if count]
+
+
+class StepProfiler(object):
+    """
+    Records latency histograms of the phases of the environment steps and
+    resets. A phase is timed by laps between perf_counter_ns() readings:
+
+        start = profiler.start()
+        ...
+        lap = profiler.lap('phase', start)
+
+    If disabled, start() and lap() return immediately, so instrumented code
+    only pays two method calls per phase. The histograms are published
+    periodically as a json summary and dumped per episode to a json lines
+    file.
+
+    Parameters
+    ----------
+    enabled: bool
+        Whether latencies are recorded
+    publish_period: Float
+        Time in seconds between two publications of the summaries, never
+        published if 0
+    output_file: str
+        Path of the json lines file the histograms of each episode are
+        appended to, not dumped if empty
+    topic: str
+        Topic the summaries are published on
+    """
+    def __init__(
+            self, enabled=False, publish_period=0.0, output_file='',
+            topic='/openai/step_stats'):
+        self.enabled = enabled
+        self.publish_period = publish_period
+        self.output_file = output_file
+        self.histograms = {}
+        self._publisher = None
+        self._last_publish = time.monotonic()
+        if enabled and publish_period > 0.0:
+            self._publisher = rospy.Publisher(topic, String, queue_size=1)
+
+    def start(self):
+        """
+        Returns the current time in nanoseconds, 0 if disabled.
+        """
+        if not self.enabled:
+            return 0
+        return time.perf_counter_ns()
+
+    def lap(self, name, start):
+        """
+        Records the time since start in the histogram of the given name and
+        returns the current time in nanoseconds, 0 if disabled.
+        """
+        if not self.enabled:
+            return 0
+        now = time.perf_counter_ns()
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(now - start)
+        return now
+
+    def instrument(self, obj, names, prefix='rpc/'):
+        """
+        Wraps the given methods of an object, such as the rpc methods of a
+        simulation handler, to record their latencies. Methods the object
+        does not have are skipped and nothing is wrapped if disabled.
+
+        Parameters
+        ----------
+        obj: object
+            Object whose methods are wrapped on the instance
+        names: list
+            Names of the methods
+        prefix: str
+            Prefix of the histogram names of the methods
+        """
+        if not self.enabled:
+            return
+        for name in names:
+            method = getattr(obj, name, None)
+            if callable(method):
+                setattr(obj, name, self._timed(prefix + name, method))
+
+    def _timed(self, name, method):
+        """ Returns the method recording its latencies under name. """
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.lap(name, start)
+        return timed
+
+    def end_step(self):
+        """
+        Publishes the summaries if the publish period has elapsed.
+        """
+        if self._publisher is None:
+            return
+        now = time.monotonic()
+        if now - self._last_publish >= self.publish_period:
+            self._last_publish = now
+            self._publisher.publish(String(data=json.dumps(self.summaries())))
+
+    def summaries(self):
+        """ Returns the summary of the histogram of each phase. """
+        return {
+            name: histogram.summary()
+            for name, histogram in sorted(self.histograms.items())}
+
+    def end_episode(self, episode_num):
+        """
+        Appends the histograms of the episode to the output file and clears
+        them.
+
+        Parameters
+        ----------
+        episode_num: int
+            Number of the finished episode
+        """
+        if not self.enabled or not self.histograms:
+            return
+        if self.output_file:
+            record = {
+                'episode': episode_num,
+                'phases': {
+                    name: dict(
+                        histogram.summary(), buckets=histogram.buckets())
+                    for name, histogram in sorted(self.histograms.items())}}
+            try:
+                with open(self.output_file, 'a') as output:
+                    output.write(json.dumps(record) + '\n')
+            except OSError as exc:
+                rospy.logerr(
+                    'Failed to write step latencies to {}: {}'.format(
+                        self.output_file, exc))
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+    @staticmethod
+    def output_path(output_dir, robot_name_space=''):
+        """
+        Returns the path of the latency file of this process in the given
+        directory, which is created if required.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        suffix = robot_name_space.strip('/').replace('/', '_') or 'env'
+        return os.path.join(
+            output_dir,
+            'step_latency.{}.{}.jsonl'.format(suffix, os.getpid()))
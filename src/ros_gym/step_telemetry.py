@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Defines the StepTelemetry class.
+"""
+
+import time
+from collections import defaultdict
+import rospy
+
+# messages are logged through rospy, rate limited per message key
+TELEMETRY_MODE_LOG = 'log'
+# messages are only counted per key and summarized once per episode
+TELEMETRY_MODE_COUNTERS = 'counters'
+# messages are dropped
+TELEMETRY_MODE_OFF = 'off'
+
+# rospy levels of the telemetry level names
+TELEMETRY_LEVELS = {
+    'debug': rospy.DEBUG,
+    'info': rospy.INFO,
+    'warn': rospy.WARN,
+    'error': rospy.ERROR,
+}
+
+_LOG_FUNCTIONS = {
+    rospy.DEBUG: rospy.logdebug,
+    rospy.INFO: rospy.loginfo,
+    rospy.WARN: rospy.logwarn,
+    rospy.ERROR: rospy.logerr,
+}
+
+
+class StepTelemetry(object):
+    """
+    Logging for the hot path of the step loop. Messages are identified by a
+    key and only formatted once they pass the level check and the rate limit
+    of their key, so that dropped messages cost a few comparisons. In
+    counters mode nothing is logged per step; the messages of each key are
+    counted and summarized in a single line at the end of the episode.
+
+    Parameters
+    ----------
+    mode: str
+        One of TELEMETRY_MODE_LOG, TELEMETRY_MODE_COUNTERS and
+        TELEMETRY_MODE_OFF
+    level: int
+        Minimum rospy level of the messages logged in log mode
+    rate_limit: Float
+        Minimum time in seconds between two logged messages of the same key,
+        not limited if 0
+    """
+    def __init__(
+            self, mode=TELEMETRY_MODE_LOG, level=rospy.INFO, rate_limit=0.0):
+        if mode not in (
+                TELEMETRY_MODE_LOG, TELEMETRY_MODE_COUNTERS,
+                TELEMETRY_MODE_OFF):
+            raise ValueError('Unknown telemetry mode {}.'.format(mode))
+        self.mode = mode
+        self.level = level
+        self.rate_limit = rate_limit
+        self.counts = defaultdict(int)
+        self.suppressed = defaultdict(int)
+        self._last_logged = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Returns the telemetry configured by the telemetry parameters of the
+        given TaskConfig.
+        """
+        level = config.get('telemetry/level', 'info')
+        if level not in TELEMETRY_LEVELS:
+            raise ValueError('Unknown telemetry level {}.'.format(level))
+        return cls(
+            mode=config.get('telemetry/mode', TELEMETRY_MODE_LOG),
+            level=TELEMETRY_LEVELS[level],
+            rate_limit=config.get('telemetry/rate_limit', 0.0))
+
+    def log(self, key, level, msg, *args):
+        """
+        Logs a message of the step loop.
+
+        Parameters
+        ----------
+        key: str
+            Key of the message, which is rate limited and counted
+        level: int
+            rospy level of the message
+        msg: str
+            Message, formatted with str.format() with the args only if it is
+            logged
+        args: Any
+            Arguments of the message
+        """
+        if self.mode == TELEMETRY_MODE_OFF:
+            return
+        if self.mode == TELEMETRY_MODE_COUNTERS:
+            self.counts[key] += 1
+            return
+        if level < self.level:
+            return
+        if self.rate_limit > 0.0:
+            now = time.monotonic()
+            if now - self._last_logged.get(key, -self.rate_limit) < \
+                    self.rate_limit:
+                self.suppressed[key] += 1
+                return
+            self._last_logged[key] = now
+        _LOG_FUNCTIONS[level](msg.format(*args) if args else msg)
+
+    def end_episode(self, episode_num):
+        """
+        Logs the summary of the counted and rate limited messages of the
+        episode and clears them.
+
+        Parameters
+        ----------
+        episode_num: int
+            Number of the finished episode
+        """
+        if self.counts:
+            rospy.loginfo(
+                'Episode {} telemetry: {}'.format(
+                    episode_num, self._summary(self.counts)))
+            self.counts.clear()
+        if self.suppressed:
+            rospy.loginfo(
+                'Episode {} rate limited messages: {}'.format(
+                    episode_num, self._summary(self.suppressed)))
+            self.suppressed.clear()
+
+    @staticmethod
+    def _summary(counts):
+        """ Returns the counts of each key as a single line. """
+        return ', '.join(
+            '{}={}'.format(key, count)
+            for key, count in sorted(counts.items()))
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Defines the TaskConfig class and the process wide cached configuration.
+"""
+
+import threading
+from types import MappingProxyType
+import rospy
+
+# name space of the parameters of ros_gym
+CONFIG_NAME_SPACE = '/ros_gym'
+
+# types of the known parameters that are validated on load. Parameters not
+# listed here are accepted as they are.
+CONFIG_PARAM_TYPES = {
+    'sim_env': str,
+    'use_mavros': bool,
+    'px4-est': str,
+    'use_pose_estimator': bool,
+    'environment_name': str,
+    'vehicle_names': tuple,
+    'worker_name_spaces': tuple,
+    'worker_gazebo_master_uris': tuple,
+    'running_step': float,
+    'pos_step': float,
+    'sim_step/mode': str,
+    'sim_step/time': float,
+    'sim_step/frames': int,
+    'sim_step/iterations': int,
+    'mavros_state/max_stamp_skew': float,
+    'mavros_state/sync_timeout': float,
+    'mavros_state/synchronized': tuple,
+    'fast_reset/enabled': bool,
+    'fast_reset/full_reset_every': int,
+    'debug_async_observation': bool,
+    'recording/enabled': bool,
+    'recording/directory': str,
+    'recording/chunk_size': int,
+    'recording/queue_size': int,
+    'monitor/enabled': bool,
+    'monitor/directory': str,
+    'monitor/video_key': str,
+    'monitor/video_interval': int,
+    'monitor/frame_skip': int,
+    'monitor/max_frames': int,
+    'monitor/flush_interval': float,
+    'monitor/flush_episodes': int,
+    'monitor/max_file_bytes': int,
+    'monitor/max_bytes': int,
+    'monitor/queue_size': int,
+    'profiling/enabled': bool,
+    'profiling/publish_period': float,
+    'profiling/output_dir': str,
+    'telemetry/mode': str,
+    'telemetry/level': str,
+    'telemetry/rate_limit': float,
+    'config_watch_period': float,
+    'image_buffer_size': int,
+    'observation_keys': tuple,
+    'image_preprocessing': MappingProxyType,
+    'observation_layout/mode': str,
+    'observation_layout/buffer_size': int,
+    'max_episode_steps': int,
+    'geodesic_distance': bool,
+    'lxy_vel_range': float,
+    'lz_vel_range': float,
+    'rot_vel_range': float,
+    'work_space/x_max': float,
+    'work_space/x_min': float,
+    'work_space/y_max': float,
+    'work_space/y_min': float,
+    'work_space/z_max': float,
+    'work_space/z_min': float,
+    'max_orientation_w': float,
+    'max_orientation_x': float,
+    'max_orientation_y': float,
+    'max_orientation_z': float,
+    'max_velocity_vector/linear_x': float,
+    'max_velocity_vector/linear_y': float,
+    'max_velocity_vector/linear_z': float,
+    'max_velocity_vector/angular_x': float,
+    'max_velocity_vector/angular_y': float,
+    'max_velocity_vector/angular_z': float,
+    'init_speed_vector/linear_x': float,
+    'init_speed_vector/linear_y': float,
+    'init_speed_vector/linear_z': float,
+    'init_speed_vector/angular_x': float,
+    'init_speed_vector/angular_y': float,
+    'init_speed_vector/angular_z': float,
+    'desired_position/x': float,
+    'desired_position/y': float,
+    'desired_position/z': float,
+    'desired_orientation/w': float,
+    'desired_orientation/x': float,
+    'desired_orientation/y': float,
+    'desired_orientation/z': float,
+    'max_roll': float,
+    'max_pitch': float,
+    'min_height': float,
+    'desired_point_epsilon': float,
+    'closer_to_point_reward': float,
+    'not_ending_point_reward': float,
+    'end_episode_points': float,
+    'collision_penalty': float,
+    'front_cam_res/height': int,
+    'front_cam_res/width': int,
+    'front_cam_d_res/height': int,
+    'front_cam_d_res/width': int,
+}
+
+# marks a parameter without default value
+_REQUIRED = object()
+
+
+def _freeze(value):
+    """
+    Returns an immutable copy of a parameter value.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType(
+            {key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _convert(name, value, param_type):
+    """
+    Returns the parameter value converted to the given type or raises a
+    ValueError if it has an incompatible type.
+    """
+    if param_type is float and isinstance(value, int) and \
+            not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, param_type) and \
+            not (param_type is int and isinstance(value, bool)):
+        return value
+    raise ValueError(
+        'Parameter {} must be of type {} but is {}.'.format(
+            name, param_type.__name__, repr(value)))
+
+
+class TaskConfig(object):
+    """
+    An immutable configuration holding all the parameters of a name space,
+    which are fetched from the parameter server in a single call. The known
+    parameters of CONFIG_PARAM_TYPES are validated and converted to their
+    types. Nested parameters are accessed by their relative name, e.g.
+    config['work_space/x_max'].
+
+    Parameters
+    ----------
+    params: dict
+        The parameters of the name space
+    name_space: str
+        Name space of the parameters
+    """
+    def __init__(self, params, name_space=CONFIG_NAME_SPACE):
+        params = dict(params)
+        for name, param_type in CONFIG_PARAM_TYPES.items():
+            value = self._lookup(params, name)
+            if value is not _REQUIRED:
+                self._assign(
+                    params, name,
+                    _convert(name_space + '/' + name, _freeze(value),
+                             param_type))
+        object.__setattr__(self, 'name_space', name_space)
+        object.__setattr__(self, '_params', _freeze(params))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TaskConfig is immutable.')
+
+    @classmethod
+    def load(cls, name_space=CONFIG_NAME_SPACE):
+        """
+        Returns the configuration of the name space fetched from the
+        parameter server.
+        """
+        return cls(rospy.get_param(name_space, {}), name_space)
+
+    @staticmethod
+    def _lookup(params, name):
+        """
+        Returns the value of the relative parameter name or _REQUIRED if it
+        is not set.
+        """
+        value = params
+        for key in name.split('/'):
+            if not hasattr(value, 'get') or key not in value:
+                return _REQUIRED
+            value = value[key]
+        return value
+
+    @staticmethod
+    def _assign(params, name, value):
+        """
+        Sets the value of the relative parameter name in the nested dicts.
+        """
+        keys = name.split('/')
+        for key in keys[:-1]:
+            params[key] = dict(params[key])
+            params = params[key]
+        params[keys[-1]] = value
+
+    def get(self, name, default=_REQUIRED):
+        """
+        Returns the value of a parameter.
+
+        Parameters
+        ----------
+        name: str
+            Name of the parameter relative to the name space
+        default: Any
+            Value returned if the parameter is not set. A KeyError is raised
+            for missing parameters if no default is given.
+        """
+        value = self._lookup(self._params, name)
+        if value is _REQUIRED:
+            if default is _REQUIRED:
+                raise KeyError(
+                    'Parameter {}/{} is not set.'.format(
+                        self.name_space, name))
+            return default
+        return value
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __contains__(self, name):
+        return self._lookup(self._params, name) is not _REQUIRED
+
+    def __eq__(self, other):
+        return \
+            isinstance(other, TaskConfig) and \
+            self.name_space == other.name_space and \
+            self._params == other._params
+
+    def __hash__(self):
+        return hash(self.name_space)
+
+
+class _ConfigCache(object):
+    """
+    Holds the configuration of the process, which is loaded on first access,
+    and optionally polls the parameter server for changes.
+    """
+    def __init__(self):
+        self.config = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.watcher = None
+        self.stop_event = threading.Event()
+
+    def get(self):
+        """ Returns the cached configuration, loading it if required. """
+        with self.lock:
+            if self.config is None:
+                self.config = TaskConfig.load()
+            return self.config
+
+    def reload(self):
+        """
+        Fetches the configuration again and notifies the listeners if it
+        has changed.
+        """
+        config = TaskConfig.load()
+        with self.lock:
+            changed = config != self.config
+            self.config = config
+            listeners = list(self.listeners)
+        if changed:
+            for listener in listeners:
+                listener(config)
+        return config
+
+    def watch(self, listener, period):
+        """
+        Registers the listener and starts polling for changes if required.
+        """
+        with self.lock:
+            self.listeners.append(listener)
+            if self.watcher is None:
+                self.stop_event = threading.Event()
+                self.watcher = \
+                    threading.Thread(
+                        target=self._poll, args=(period, self.stop_event),
+                        daemon=True)
+                self.watcher.start()
+
+    def unwatch(self, listener):
+        """
+        Unregisters the listener and stops polling once no listener is left.
+        """
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+            if not self.listeners and self.watcher is not None:
+                self.stop_event.set()
+                self.watcher = None
+
+    def _poll(self, period, stop_event):
+        """
+        Reloads the configuration every period seconds until stop_event is
+        set.
+        """
+        while not stop_event.wait(period) and not rospy.is_shutdown():
+            try:
+                self.reload()
+            except (KeyError, ValueError, OSError) as exc:
+                rospy.logerr('Failed to reload configuration: {}'.format(exc))
+
+
+_CONFIG_CACHE = _ConfigCache()
+
+
+def get_config():
+    """
+    Returns the configuration of ros_gym, which is fetched from the parameter
+    server once per process.
+    """
+    return _CONFIG_CACHE.get()
+
+
+def set_config(config):
+    """
+    Sets the configuration of ros_gym of this process without the parameter
+    server, e.g. to run environments on a fake simulation without a ROS
+    master.
+
+    Parameters
+    ----------
+    config: TaskConfig
+        The configuration returned by get_config() from now on
+    """
+    with _CONFIG_CACHE.lock:
+        _CONFIG_CACHE.config = config
+
+
+def reload_config():
+    """
+    Fetches the configuration of ros_gym from the parameter server again and
+    notifies the listeners registered with watch_config() if it has changed.
+    """
+    return _CONFIG_CACHE.reload()
+
+
+def watch_config(listener, period=1.0):
+    """
+    Calls listener with the new configuration each time the ros_gym
+    parameters change. The parameter server is polled from a background
+    thread, so that environments read live updates without any parameter
+    server traffic in their step loop.
+
+    Parameters
+    ----------
+    listener: callable
+        Function called with the new TaskConfig
+    period: Float
+        Time in seconds between polls of the parameter server. Only the
+        period of the first watch is used.
+    """
+    _CONFIG_CACHE.watch(listener, period)
+
+
+def unwatch_config(listener):
+    """
+    Stops calling a listener registered with watch_config(), e.g. when its
+    environment is closed. The parameter server is no longer polled once no
+    listener is left.
+
+    Parameters
+    ----------
+    listener: callable
+        Function registered with watch_config()
+    """
+    _CONFIG_CACHE.unwatch(listener)
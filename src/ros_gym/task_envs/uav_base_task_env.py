@@ -7,6 +7,7 @@ import numpy as np
 from gym.spaces import Box, Dict
 import rospy
 from geometry_msgs.msg import PoseStamped, TwistStamped
+from task_config import get_config
 
 
 class UAVBaseTaskEnv():
@@ -19,54 +20,55 @@ class UAVBaseTaskEnv():
         self._setup()
 
     def _setup(self):
+        self.config = get_config()
         self._setup_workspace()
         self._setup_action_space()
         self._setup_init_action_params()
         self._setup_desired_pose()
         self._setup_reward_params()
         self.desired_pose_epsilon = \
-            rospy.get_param("/ros_gym/desired_point_epsilon")
+            self.config['desired_point_epsilon']
         self.geo_distance = \
-            rospy.get_param("/ros_gym/geodesic_distance")
+            self.config['geodesic_distance']
         self.vel_msg = TwistStamped()
         self.rate = rospy.Rate(1000.0)
         self.use_pose_estimator = \
-            rospy.get_param("/ros_gym/use_pose_estimator")
-        self.min_height = rospy.get_param("ros_gym/min_height")
+            self.config['use_pose_estimator']
+        self.min_height = self.config['min_height']
 
     def _setup_workspace(self):
         """
         Sets up the workspace of the environment.
         """
-        self.work_space_x_max = rospy.get_param("/ros_gym/work_space/x_max")
-        self.work_space_x_min = rospy.get_param("/ros_gym/work_space/x_min")
-        self.work_space_y_max = rospy.get_param("/ros_gym/work_space/y_max")
-        self.work_space_y_min = rospy.get_param("/ros_gym/work_space/y_min")
-        self.work_space_z_max = rospy.get_param("/ros_gym/work_space/z_max")
-        self.work_space_z_min = rospy.get_param("/ros_gym/work_space/z_min")
+        self.work_space_x_max = self.config['work_space/x_max']
+        self.work_space_x_min = self.config['work_space/x_min']
+        self.work_space_y_max = self.config['work_space/y_max']
+        self.work_space_y_min = self.config['work_space/y_min']
+        self.work_space_z_max = self.config['work_space/z_max']
+        self.work_space_z_min = self.config['work_space/z_min']
 
         # min/max reward
         self.reward_range = (-np.inf, np.inf)
 
         # maximum quaternion values
-        self.max_qw = rospy.get_param("/ros_gym/max_orientation_w")
-        self.max_qx = rospy.get_param("/ros_gym/max_orientation_x")
-        self.max_qy = rospy.get_param("/ros_gym/max_orientation_y")
-        self.max_qz = rospy.get_param("/ros_gym/max_orientation_z")
+        self.max_qw = self.config['max_orientation_w']
+        self.max_qx = self.config['max_orientation_x']
+        self.max_qy = self.config['max_orientation_y']
+        self.max_qz = self.config['max_orientation_z']
 
         # maximum velocity values
         self.max_vel_lin_x = \
-            rospy.get_param("/ros_gym/max_velocity_vector/linear_x")
+            self.config['max_velocity_vector/linear_x']
         self.max_vel_lin_y = \
-            rospy.get_param("/ros_gym/max_velocity_vector/linear_y")
+            self.config['max_velocity_vector/linear_y']
         self.max_vel_lin_z = \
-            rospy.get_param("/ros_gym/max_velocity_vector/linear_z")
+            self.config['max_velocity_vector/linear_z']
         self.max_vel_ang_x = \
-            rospy.get_param("/ros_gym/max_velocity_vector/angular_x")
+            self.config['max_velocity_vector/angular_x']
         self.max_vel_ang_y = \
-            rospy.get_param("/ros_gym/max_velocity_vector/angular_y")
+            self.config['max_velocity_vector/angular_y']
         self.max_vel_ang_z = \
-            rospy.get_param("/ros_gym/max_velocity_vector/angular_z")
+            self.config['max_velocity_vector/angular_z']
 
         pos_obs_low = \
             np.array([
@@ -128,9 +130,9 @@ class UAVBaseTaskEnv():
         Sets up the robot action space.
         """
         # generate a continuous action space
-        hv_range = rospy.get_param('/ros_gym/lxy_vel_range')
-        vv_range = rospy.get_param('/ros_gym/lz_vel_range')
-        rv_range = rospy.get_param('/ros_gym/rot_vel_range')
+        hv_range = self.config['lxy_vel_range']
+        vv_range = self.config['lz_vel_range']
+        rv_range = self.config['rot_vel_range']
 
         self.action_low = np.array([-1*hv_range, -1*hv_range, -1*vv_range,
                                     -1*rv_range])
@@ -144,17 +146,17 @@ class UAVBaseTaskEnv():
         """
         self.init_velocity = TwistStamped()
         self.init_velocity.twist.linear.x = \
-            rospy.get_param('/ros_gym/init_speed_vector/linear_x')
+            self.config['init_speed_vector/linear_x']
         self.init_velocity.twist.linear.y = \
-            rospy.get_param('/ros_gym/init_speed_vector/linear_y')
+            self.config['init_speed_vector/linear_y']
         self.init_velocity.twist.linear.z = \
-            rospy.get_param('/ros_gym/init_speed_vector/linear_z')
+            self.config['init_speed_vector/linear_z']
         self.init_velocity.twist.angular.x = \
-            rospy.get_param('/ros_gym/init_speed_vector/angular_x')
+            self.config['init_speed_vector/angular_x']
         self.init_velocity.twist.angular.y = \
-            rospy.get_param('/ros_gym/init_speed_vector/angular_y')
+            self.config['init_speed_vector/angular_y']
         self.init_velocity.twist.angular.z = \
-            rospy.get_param('/ros_gym/init_speed_vector/angular_z')
+            self.config['init_speed_vector/angular_z']
 
     def _setup_desired_pose(self):
         """
@@ -162,29 +164,29 @@ class UAVBaseTaskEnv():
         """
         self.desired_pose = PoseStamped()
         self.desired_pose.pose.position.x = \
-            rospy.get_param("/ros_gym/desired_position/x")
+            self.config['desired_position/x']
         self.desired_pose.pose.position.y = \
-            rospy.get_param("/ros_gym/desired_position/y")
+            self.config['desired_position/y']
         self.desired_pose.pose.position.z = \
-            rospy.get_param("/ros_gym/desired_position/z")
+            self.config['desired_position/z']
         self.desired_pose.pose.orientation.w = \
-            rospy.get_param("/ros_gym/desired_orientation/w")
+            self.config['desired_orientation/w']
         self.desired_pose.pose.orientation.x = \
-            rospy.get_param("/ros_gym/desired_orientation/x")
+            self.config['desired_orientation/x']
         self.desired_pose.pose.orientation.y = \
-            rospy.get_param("/ros_gym/desired_orientation/y")
+            self.config['desired_orientation/y']
         self.desired_pose.pose.orientation.z = \
-            rospy.get_param("/ros_gym/desired_orientation/z")
+            self.config['desired_orientation/z']
 
     def _setup_reward_params(self):
         """
         Sets the reward parameters.
         """
         self.closer_to_point_reward = \
-            rospy.get_param("/ros_gym/closer_to_point_reward")
+            self.config['closer_to_point_reward']
         self.not_ending_point_reward = \
-            rospy.get_param("/ros_gym/not_ending_point_reward")
+            self.config['not_ending_point_reward']
         self.end_episode_points = \
-            rospy.get_param("/ros_gym/end_episode_points")
+            self.config['end_episode_points']
         self.collision_penalty = \
-            rospy.get_param("/ros_gym/collision_penalty")
+            self.config['collision_penalty']
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Defines the UAVFollowTrajectoryKernel class.
+"""
+
+import numpy as np
+import quaternions
+
+# reasons for an episode to finish as returned by done_reasons(), in the
+# order of priority in which they are checked
+DONE_NONE = 0
+DONE_COLLISION = 1
+DONE_OUTSIDE_WORKSPACE = 2
+DONE_TOO_CLOSE_TO_GROUND = 3
+DONE_FLIPPED = 4
+DONE_REACHED_DESTINATION = 5
+
+DONE_REASON_MESSAGES = {
+    DONE_COLLISION:
+        'Episode finished due to robot collision.',
+    DONE_OUTSIDE_WORKSPACE:
+        'Episode finished since the robot has gone outside the workspace.',
+    DONE_TOO_CLOSE_TO_GROUND:
+        'Episode finished since the robot has gone too close to the ground.',
+    DONE_FLIPPED:
+        'Episode finished since the robot has flipped.',
+    DONE_REACHED_DESTINATION:
+        'Episode finished since the robot has successfully reached its '
+        'destination.',
+}
+
+
+class UAVFollowTrajectoryKernel(object):
+    """
+    Computes the termination and reward of the follow trajectory task on a
+    batch of N robots at once. Poses are given as an (N, 7) array of
+    [x, y, z, qw, qx, qy, qz] rows as in the 'position' observation. The
+    desired pose and bounds are precomputed once and intermediate results are
+    kept in buffers reused across calls of the same batch size.
+
+    Parameters
+    ----------
+    desired_pose: np.array
+        Desired [x, y, z, qw, qx, qy, qz] pose of the robot
+    workspace_low: np.array
+        Lower [x, y, z] bounds of the workspace
+    workspace_high: np.array
+        Upper [x, y, z] bounds of the workspace
+    min_height: Float
+        Height below which the robot is too close to the ground
+    max_roll: Float
+        Roll in radians after which the robot has flipped
+    max_pitch: Float
+        Pitch in radians after which the robot has flipped
+    desired_pose_epsilon: Float
+        Tolerance of each pose element to finish the episode at the desired
+        pose
+    closer_to_point_reward: Float
+        Reward for getting closer to the desired pose
+    end_episode_points: Float
+        Reward for finishing the episode at the desired pose, its negative is
+        given when finishing elsewhere
+    collision_penalty: Float
+        Reward for finishing the episode with a collision
+    geodesic_distance: bool
+        Whether the orientation difference is the geodesic distance of the
+        quaternions or the absolute distance
+    """
+    # reward for getting away from the desired pose
+    away_from_point_reward = -10.0
+    # tolerance of each pose element to be rewarded on reaching the
+    # desired pose
+    success_tolerance = 0.5
+
+    def __init__(
+            self,
+            desired_pose,
+            workspace_low,
+            workspace_high,
+            min_height,
+            max_roll,
+            max_pitch,
+            desired_pose_epsilon,
+            closer_to_point_reward,
+            end_episode_points,
+            collision_penalty,
+            geodesic_distance=False):
+        self.desired_pose = np.asarray(desired_pose, dtype=np.float64)
+        self.workspace_low = np.asarray(workspace_low, dtype=np.float64)
+        self.workspace_high = np.asarray(workspace_high, dtype=np.float64)
+        self.min_height = min_height
+        self.max_roll = max_roll
+        self.max_pitch = max_pitch
+        self.closer_to_point_reward = closer_to_point_reward
+        self.end_episode_points = end_episode_points
+        self.collision_penalty = collision_penalty
+        self.geodesic_distance = geodesic_distance
+
+        self._desired_position = self.desired_pose[:3]
+        self._desired_orientation = self.desired_pose[3:7]
+        self._done_low = self.desired_pose - desired_pose_epsilon
+        self._done_high = self.desired_pose + desired_pose_epsilon
+        self._success_low = self.desired_pose - self.success_tolerance
+        self._success_high = self.desired_pose + self.success_tolerance
+        self._batch_size = None
+
+    def _buffers(self, batch_size):
+        """
+        Allocates the intermediate buffers if the batch size has changed.
+        """
+        if batch_size == self._batch_size:
+            return
+        self._batch_size = batch_size
+        self._pose_mask = np.empty((batch_size, 7), dtype=np.bool_)
+        self._vec3 = np.empty((batch_size, 3))
+        self._mask3 = np.empty((batch_size, 3), dtype=np.bool_)
+        self._rpy = np.empty((batch_size, 3))
+        self._tmp = np.empty(batch_size)
+        self._scratch = np.empty((2, batch_size))
+        self._mask = np.empty(batch_size, dtype=np.bool_)
+        self._mask2 = np.empty(batch_size, dtype=np.bool_)
+        self._distances = np.empty(batch_size)
+        self._orientation_diffs = np.empty(batch_size)
+
+    def in_pose(self, poses, low, high, out):
+        """
+        Writes whether each pose lies within (low, high] into out.
+        """
+        np.greater(poses, low, out=self._pose_mask)
+        np.all(self._pose_mask, axis=1, out=out)
+        np.less_equal(poses, high, out=self._pose_mask)
+        np.all(self._pose_mask, axis=1, out=self._mask2)
+        np.logical_and(out, self._mask2, out=out)
+        return out
+
+    def distances_from_desired_point(self, poses, out):
+        """
+        Writes the euclidean distance of each position to the desired
+        position into out.
+        """
+        self._buffers(len(poses))
+        np.subtract(poses[:, :3], self._desired_position, out=self._vec3)
+        np.multiply(self._vec3, self._vec3, out=self._vec3)
+        np.sum(self._vec3, axis=1, out=out)
+        return np.sqrt(out, out=out)
+
+    def differences_from_desired_orientation(self, poses, out):
+        """
+        Writes the difference of each orientation to the desired orientation
+        into out.
+        """
+        self._buffers(len(poses))
+        orientations = poses[:, 3:7]
+        if self.geodesic_distance:
+            return quaternions.geodesic_distance(
+                orientations, self._desired_orientation, out=out,
+                scratch=self._scratch)
+        return quaternions.absolute_distance(
+            orientations, self._desired_orientation, out=out,
+            scratch=self._scratch)
+
+    def flipped(self, poses, out):
+        """
+        Writes whether the roll or pitch of each orientation exceeds its
+        maximum into out.
+        """
+        self._buffers(len(poses))
+        quaternions.roll_pitch_yaw(
+            poses[:, 3:7], out=self._rpy, scratch=self._scratch)
+        np.abs(self._rpy, out=self._rpy)
+        np.greater(self._rpy[:, 0], self.max_roll, out=out)
+        np.greater(self._rpy[:, 1], self.max_pitch, out=self._mask2)
+        return np.logical_or(out, self._mask2, out=out)
+
+    def done_reasons(self, poses, collided, out):
+        """
+        Writes the reason for the episode of each robot to finish into out,
+        DONE_NONE if it continues.
+
+        Parameters
+        ----------
+        poses: np.array
+            (N, 7) poses of the robots
+        collided: np.array
+            (N,) whether each robot has collided
+        out: np.array
+            (N,) integer array receiving the DONE_* reasons
+        """
+        self._buffers(len(poses))
+        out.fill(DONE_NONE)
+        # checked in reverse order of priority so that the first reason wins
+        self.in_pose(poses, self._done_low, self._done_high, self._mask)
+        np.copyto(out, DONE_REACHED_DESTINATION, where=self._mask)
+        self.flipped(poses, self._mask)
+        np.copyto(out, DONE_FLIPPED, where=self._mask)
+        np.greater(poses[:, 2], -self.min_height, out=self._mask)
+        np.copyto(out, DONE_TOO_CLOSE_TO_GROUND, where=self._mask)
+        np.greater_equal(poses[:, :3], self.workspace_low, out=self._mask3)
+        np.all(self._mask3, axis=1, out=self._mask)
+        np.less_equal(poses[:, :3], self.workspace_high, out=self._mask3)
+        np.all(self._mask3, axis=1, out=self._mask2)
+        np.logical_and(self._mask, self._mask2, out=self._mask)
+        np.logical_not(self._mask, out=self._mask)
+        np.copyto(out, DONE_OUTSIDE_WORKSPACE, where=self._mask)
+        np.copyto(out, DONE_COLLISION, where=collided)
+        return out
+
+    def rewards(
+            self, poses, collided, dones, previous_distances,
+            previous_orientation_diffs, out):
+        """
+        Writes the reward of each robot into out and updates the previous
+        distances and orientation differences in place.
+
+        Parameters
+        ----------
+        poses: np.array
+            (N, 7) poses of the robots
+        collided: np.array
+            (N,) whether each robot has collided
+        dones: np.array
+            (N,) whether the episode of each robot has finished
+        previous_distances: np.array
+            (N,) distances to the desired point on the previous step
+        previous_orientation_diffs: np.array
+            (N,) orientation differences to the desired orientation on the
+            previous step
+        out: np.array
+            (N,) array receiving the rewards
+        """
+        self._buffers(len(poses))
+        self.distances_from_desired_point(poses, self._distances)
+        self.differences_from_desired_orientation(
+            poses, self._orientation_diffs)
+
+        # change of the distance to the desired pose, weighting the change of
+        # orientation twice
+        np.subtract(
+            self._orientation_diffs, previous_orientation_diffs,
+            out=self._tmp)
+        np.multiply(self._tmp, 2.0, out=self._tmp)
+        np.add(self._tmp, self._distances, out=self._tmp)
+        np.subtract(self._tmp, previous_distances, out=self._tmp)
+
+        # robots that have not finished are rewarded for getting closer
+        np.less(self._tmp, 0.0, out=self._mask)
+        out.fill(self.away_from_point_reward)
+        np.copyto(out, self.closer_to_point_reward, where=self._mask)
+
+        # finished robots are rewarded by how the episode has finished
+        self.in_pose(poses, self._success_low, self._success_high, self._mask)
+        self._tmp.fill(-self.end_episode_points)
+        np.copyto(self._tmp, self.end_episode_points, where=self._mask)
+        np.copyto(self._tmp, self.collision_penalty, where=collided)
+        np.copyto(out, self._tmp, where=dones)
+
+        previous_distances[...] = self._distances
+        previous_orientation_diffs[...] = self._orientation_diffs
+        return out
@@ -3,20 +3,20 @@
 Defines the UAVFollowTrajectoryTaskEnv class.
 """
 
-from math import sqrt, acos, log
 import numpy as np
 import rospy
 from gym.spaces import Box, Dict
-from tf.transformations import euler_from_quaternion
-from geometry_msgs.msg import PoseStamped, TwistStamped
-from robot_envs import airsim_uav_robot_env, mavros_uav_robot_env
+from geometry_msgs.msg import TwistStamped
 from task_envs import uav_base_task_env
+from task_config import get_config, watch_config, unwatch_config
+from task_envs.uav_follow_trajectory_kernel import \
+    UAVFollowTrajectoryKernel, DONE_NONE, DONE_REASON_MESSAGES
+from plugin_registry import UAV_CONTROL_BACKENDS
 
-USE_MAVROS = rospy.get_param("/ros_gym/use_mavros")
-if USE_MAVROS:
-    CONTROL_METHOD = mavros_uav_robot_env.MavrosUAVRobotEnv
-else:
-    CONTROL_METHOD = airsim_uav_robot_env.AirSimUAVRobotEnv
+# only the robot environment of the configured control method is imported
+USE_MAVROS = get_config()['use_mavros']
+CONTROL_METHOD = \
+    UAV_CONTROL_BACKENDS.load('mavros' if USE_MAVROS else 'airsim')
 
 
 class UAVFollowTrajectoryTaskEnv(
@@ -24,14 +24,85 @@ class UAVFollowTrajectoryTaskEnv(
     """
     This class defines a task environment for reinforcement learning of UAV
     robots particularly for following a given input trajectory.
+
+    Parameters
+    ----------
+    kwargs: dict
+        Arguments passed to the robot environment, such as the sim_handler
+        of an airsim vehicle.
     """
-    def __init__(self):
+    # the pose is required by the reward and termination kernel
+    required_observation_keys = ('position',)
+
+    def __init__(self, **kwargs):
         uav_base_task_env.UAVBaseTaskEnv.__init__(self)
-        CONTROL_METHOD.__init__(self)
+        CONTROL_METHOD.__init__(self, **kwargs)
 
         self.cumulated_reward = 0.0
         self.cumulated_steps = 0
 
+        self.kernel = self._make_kernel(self.config)
+        # parameters of the kernel are updated live if a watch period is set
+        watch_period = self.config.get('config_watch_period', 0.0)
+        if watch_period > 0.0:
+            watch_config(self._on_config_change, watch_period)
+        # the kernel is evaluated on a batch of this single robot
+        self._kernel_poses = np.zeros((1, 7))
+        self._kernel_collided = np.zeros(1, dtype=np.bool_)
+        self._kernel_dones = np.zeros(1, dtype=np.bool_)
+        self._kernel_done_reasons = np.zeros(1, dtype=np.int8)
+        self._kernel_rewards = np.zeros(1)
+        # numeric robot state read once per observation
+        self._state_snapshot = self.allocate_state_snapshot()
+        self.previous_distance_from_des_point = np.zeros(1)
+        self.previous_difference_from_des_orientation = np.zeros(1)
+
+    @staticmethod
+    def _make_kernel(config):
+        """
+        Returns the reward and termination kernel of the task configured
+        from the given configuration.
+        """
+        return UAVFollowTrajectoryKernel(
+            desired_pose=[
+                config['desired_position/x'],
+                config['desired_position/y'],
+                config['desired_position/z'],
+                config['desired_orientation/w'],
+                config['desired_orientation/x'],
+                config['desired_orientation/y'],
+                config['desired_orientation/z']],
+            workspace_low=[
+                config['work_space/x_min'],
+                config['work_space/y_min'],
+                config['work_space/z_min']],
+            workspace_high=[
+                config['work_space/x_max'],
+                config['work_space/y_max'],
+                config['work_space/z_max']],
+            min_height=config['min_height'],
+            max_roll=config['max_roll'],
+            max_pitch=config['max_pitch'],
+            desired_pose_epsilon=config['desired_point_epsilon'],
+            closer_to_point_reward=config['closer_to_point_reward'],
+            end_episode_points=config['end_episode_points'],
+            collision_penalty=config['collision_penalty'],
+            geodesic_distance=config['geodesic_distance'])
+
+    def _on_config_change(self, config):
+        """
+        Updates the kernel with the changed parameters. The new kernel takes
+        effect from the next step on.
+        """
+        self.config = config
+        self.kernel = self._make_kernel(config)
+        rospy.loginfo('Task parameters updated.')
+
+    def close(self):
+        """ Stops the live updates of the task parameters. """
+        unwatch_config(self._on_config_change)
+        super(UAVFollowTrajectoryTaskEnv, self).close()
+
     def _setup_workspace(self):
         """
         Sets up the workspace of the environment.
@@ -40,8 +111,8 @@ class UAVFollowTrajectoryTaskEnv(
         super(UAVFollowTrajectoryTaskEnv, self)._setup_workspace()
 
         # front camera resolution
-        front_cam_h = rospy.get_param("/ros_gym/front_cam_res/height")
-        front_cam_w = rospy.get_param("/ros_gym/front_cam_res/width")
+        front_cam_h = self.config['front_cam_res/height']
+        front_cam_w = self.config['front_cam_res/width']
         front_cam_obs_space = \
             Box(
                 low=0,
@@ -51,14 +122,14 @@ class UAVFollowTrajectoryTaskEnv(
 
         # front camera depth resolution
         front_cam_d_h = \
-            rospy.get_param("/ros_gym/front_cam_d_res/height")
+            self.config['front_cam_d_res/height']
         front_cam_d_w = \
-            rospy.get_param("/ros_gym/front_cam_d_res/width")
+            self.config['front_cam_d_res/width']
         front_cam_depth_obs_space = \
             Box(
                 low=0,
                 high=255,
-                shape=(front_cam_d_h, front_cam_d_w, 4),
+                shape=(front_cam_d_h, front_cam_d_w),
                 dtype=np.float32)
 
         self.observation_space = \
@@ -68,6 +139,11 @@ class UAVFollowTrajectoryTaskEnv(
                 'front_cam': front_cam_obs_space,
                 'front_cam_depth': front_cam_depth_obs_space})
 
+        # images fetched for the observation space per step
+        self.image_requests = {
+            'front_cam': ('0', 'scene', False, False),
+            'front_cam_depth': ('0', 'depth_planner', False, True)}
+
     def _pre_reset(self):
         """
         Disarms the robot before resetting the simulation.
@@ -106,22 +182,24 @@ class UAVFollowTrajectoryTaskEnv(
             rospy.loginfo("Arming successful!")
         if self._set_takeoff_request(1):
             rospy.loginfo("Takeoff successful!")
+        self._init_episode_variables()
 
+    def _init_episode_variables(self):
+        """
+        Initializes the variables of a new episode run.
+        """
         # for information
         self.cumulated_reward = 0.0
         self.cumulated_steps = 0
 
         # we get the initial pose to measure the distance from
         # the desired point.
-        curr_pose = self.pose
-
-        # pylint: disable=attribute-defined-outside-init
-        self.previous_distance_from_des_point = \
-            self.get_distance_from_desired_point(curr_pose.pose.position)
-
-        self.previous_difference_from_des_orientation = \
-            self.get_difference_from_desired_orientation(
-                curr_pose.pose.orientation)
+        state = self.state_snapshot(self._state_snapshot)
+        self._kernel_poses[0] = state['pose']
+        self.kernel.distances_from_desired_point(
+            self._kernel_poses, self.previous_distance_from_des_point)
+        self.kernel.differences_from_desired_orientation(
+            self._kernel_poses, self.previous_difference_from_des_orientation)
 
     def _set_action(self, action):
         """
@@ -140,9 +218,10 @@ class UAVFollowTrajectoryTaskEnv(
         action_vel.twist.angular.x = 0.0
         action_vel.twist.angular.y = 0.0
         action_vel.twist.angular.z = action[3]
-        rospy.loginfo(
-            "Setting action: [vx, vy, vz, yr] = [{}, {}, {}, {}]"
-            .format(action[0], action[1], action[2], action[3]))
+        self.telemetry.log(
+            'action', rospy.INFO,
+            "Setting action: [vx, vy, vz, yr] = [{}, {}, {}, {}]",
+            action[0], action[1], action[2], action[3])
 
         # set the desired velocity by publishing it to the robot
         self.pub_cmd_vel(action_vel)
@@ -154,31 +233,23 @@ class UAVFollowTrajectoryTaskEnv(
         returned data must conform with env.observation_space. See
         UAVBaseTaskEnv for more info.
         """
-        curr_pose = self.pose
-        curr_vel = self.velocity
-        pos_obs_obs = \
-            np.array([
-                curr_pose.pose.position.x,
-                curr_pose.pose.position.y,
-                curr_pose.pose.position.z,
-                curr_pose.pose.orientation.w,
-                curr_pose.pose.orientation.x,
-                curr_pose.pose.orientation.y,
-                curr_pose.pose.orientation.z])
-        vel_obs_space = \
-            np.array([
-                curr_vel.twist.linear.x,
-                curr_vel.twist.linear.y,
-                curr_vel.twist.linear.z,
-                curr_vel.twist.angular.x,
-                curr_vel.twist.angular.y,
-                curr_vel.twist.angular.z])
-        return {
-            "position": pos_obs_obs,
-            "velocity": vel_obs_space,
-            "front_cam": self.camera(camera_index="0"),
-            "front_cam_depth": self.camera_depth(camera_index="0")
-        }
+        obs = self._next_observation()
+        spaces = self.observation_dict_space.spaces
+        # pose and velocity are taken from a single state snapshot
+        state = self.state_snapshot(self._state_snapshot)
+        self._observation_array(obs, 'position')[:] = state['pose']
+        # sensors of keys filtered out of the observation space are skipped
+        if 'velocity' in spaces:
+            self._observation_array(obs, 'velocity')[:] = state['velocity']
+        if 'front_cam' in spaces:
+            self._write_image(
+                obs, 'front_cam',
+                lambda out: self.camera(camera_index="0", out=out))
+        if 'front_cam_depth' in spaces:
+            self._write_image(
+                obs, 'front_cam_depth',
+                lambda out: self.camera_depth(camera_index="0", out=out))
+        return obs
 
     def _is_done(self, observations):
         """
@@ -194,257 +265,50 @@ class UAVFollowTrajectoryTaskEnv(
         ----------
         observations: Observation of the type defined in observation_space.
         """
-
-        episode_done = False
-        current_pose = observations['position']
-        current_position = observations['position'][:3]
-        current_orientation = observations['position'][3:7]
-
-        if self.collision_check:
-            rospy.loginfo(
-                'Episode finished due to robot collision.')
-            return True
-
-        if not self.is_inside_workspace(current_position):
-            rospy.loginfo(
-                'Episode finished since the robot has gone outside '
-                'the workspace.')
-            return True
-
-        if self.too_close_to_ground(-1*current_position[2]):
-            rospy.loginfo(
-                'Episode finished since the robot has gone too close to '
-                'the ground.')
-            return True
-
-        if self.drone_has_flipped(current_orientation):
-            rospy.loginfo(
-                'Episode finished since the robot has flipped.')
-            return True
-
-        if self.is_in_desired_pose(current_pose, self.desired_pose_epsilon):
-            rospy.loginfo(
-                'Episode finished since the robot has successfully reached '
-                'its destination.')
-            return True
-
-        return episode_done
+        self._kernel_poses[0] = observations['position'][:7]
+        self._kernel_collided[0] = self.collision_check
+        self.kernel.done_reasons(
+            self._kernel_poses,
+            self._kernel_collided,
+            self._kernel_done_reasons)
+        reason = self._kernel_done_reasons[0]
+        if reason == DONE_NONE:
+            return False
+        rospy.loginfo(DONE_REASON_MESSAGES[reason])
+        return True
 
     def _compute_reward(self, observations, done):
         """
         Defines the reward function for this environment.
         """
-        current_pose = PoseStamped()
-        current_pose.pose.position.x = observations['position'][0]
-        current_pose.pose.position.y = observations['position'][1]
-        current_pose.pose.position.z = observations['position'][2]
-        current_pose.pose.orientation.w = observations['position'][3]
-        current_pose.pose.orientation.x = observations['position'][4]
-        current_pose.pose.orientation.y = observations['position'][5]
-        current_pose.pose.orientation.z = observations['position'][6]
-
-        distance_from_des_point = \
-            self.get_distance_from_desired_point(current_pose.pose.position)
-        difference_from_des_orientation = \
-            self.get_difference_from_desired_orientation(
-                current_pose.pose.orientation)
-        distance_difference = \
-            distance_from_des_point - \
-            self.previous_distance_from_des_point + \
-            2 * (
-                difference_from_des_orientation -
-                self.previous_difference_from_des_orientation)
-
+        self._kernel_poses[0] = observations['position'][:7]
+        self._kernel_collided[0] = self.collision_check
+        self._kernel_dones[0] = done
+        self.kernel.rewards(
+            self._kernel_poses,
+            self._kernel_collided,
+            self._kernel_dones,
+            self.previous_distance_from_des_point,
+            self.previous_difference_from_des_orientation,
+            self._kernel_rewards)
+        reward = float(self._kernel_rewards[0])
         if not done:
-            if self.collision_check:
-                reward = self.collision_check
-            # if there has been a decrease in the distance to the desired
-            # location, we reward it
-            if distance_difference < 0.0:
-                rospy.loginfo(
+            if reward == self.kernel.closer_to_point_reward:
+                self.telemetry.log(
+                    'closer', rospy.INFO,
                     'Robot rewarded for getting close to the desired '
                     'destination.')
-                reward = self.closer_to_point_reward
             else:
-                rospy.loginfo(
+                self.telemetry.log(
+                    'away', rospy.INFO,
                     'Robot unrewarded for getting away from the desired '
                     'destination.')
-                reward = -10
-        else:
-            if self.collision_check:
-                reward = self.collision_penalty
-            elif self.is_in_desired_pose(
-                    observations['position'][:7], tolerance=0.5):
-                reward = self.end_episode_points
-            else:
-                reward = -1*self.end_episode_points
-
-        self.previous_distance_from_des_point = distance_from_des_point
-        self.previous_difference_from_des_orientation = \
-            difference_from_des_orientation
 
         self.cumulated_reward += reward
         self.cumulated_steps += 1
-        rospy.logdebug("Reward = {}".format(reward))
-        rospy.logdebug("Cumulated reward = {}".format(self.cumulated_reward))
-        rospy.logdebug("Cumulated steps = {}".format(self.cumulated_steps))
+        self.telemetry.log(
+            'reward', rospy.DEBUG,
+            "Reward = {}, cumulated reward = {}, cumulated steps = {}",
+            reward, self.cumulated_reward, self.cumulated_steps)
 
         return reward
-
-    def is_in_desired_pose(self, current_pose, tolerance=0.05):
-        """
-        Returns true if the current position is close to the desired position
-
-        Parameters
-        ----------
-        current_pose: np.array
-            Current pose of the robot
-        tolerance: Float
-            How far the robot can be from the desired destination pose
-        """
-
-        current_pose_array = np.asarray(current_pose)
-        desired_pose = \
-            np.array([
-                self.desired_pose.pose.position.x,
-                self.desired_pose.pose.position.y,
-                self.desired_pose.pose.position.z,
-                self.desired_pose.pose.orientation.w,
-                self.desired_pose.pose.orientation.x,
-                self.desired_pose.pose.orientation.y,
-                self.desired_pose.pose.orientation.z])
-
-        desired_pose_plus = desired_pose + tolerance
-        desired_pose_minus = desired_pose - tolerance
-
-        return \
-            np.all(current_pose_array <= desired_pose_plus) and \
-            np.all(current_pose_array > desired_pose_minus)
-
-    def is_inside_workspace(self, current_position):
-        """
-        Returns true if the robot is inside the workspace bounds.
-        """
-        return all(
-            [
-                self.work_space_x_min <= current_position[0] <=
-                self.work_space_x_max,
-                self.work_space_y_min <= current_position[1] <=
-                self.work_space_y_max,
-                self.work_space_z_min <= current_position[2] <=
-                self.work_space_z_max,
-            ]
-        )
-
-    def too_close_to_ground(self, current_position_z):
-        """
-        Returns true if the robot is too close to the ground.
-        """
-        return current_position_z < self.min_height
-
-    def drone_has_flipped(self, current_orientation):
-        """
-        Returns true if the robot has flipped.
-        """
-        curr_roll, curr_pitch, _ = \
-            euler_from_quaternion([
-                current_orientation[1],
-                current_orientation[2],
-                current_orientation[3],
-                current_orientation[0]])
-        self.max_roll = rospy.get_param("/ros_gym/max_roll")
-        self.max_pitch = rospy.get_param("/ros_gym/max_pitch")
-
-        return not all(
-            [
-                -1*self.max_roll <= curr_roll <= self.max_roll,
-                -1*self.max_pitch <= curr_pitch <= self.max_pitch
-            ])
-
-    def get_distance_from_desired_point(self, current_position):
-        """
-        Returns the distance between the current position and desired
-        position
-        """
-        curr_position = \
-            np.array([
-                current_position.x, current_position.y, current_position.z])
-        des_position = \
-            np.array([
-                self.desired_pose.pose.position.x,
-                self.desired_pose.pose.position.y,
-                self.desired_pose.pose.position.z])
-        return np.linalg.norm(curr_position - des_position)
-
-    def get_difference_from_desired_orientation(self, current_orientation):
-        """
-        Calculates the distance from the current orientation and the desired
-        orientation.
-        """
-        curr_orientation = \
-            np.array([
-                current_orientation.w,
-                current_orientation.x,
-                current_orientation.y,
-                current_orientation.z])
-        des_orientation = \
-            np.array([
-                self.desired_pose.pose.orientation.w,
-                self.desired_pose.pose.orientation.x,
-                self.desired_pose.pose.orientation.y,
-                self.desired_pose.pose.orientation.z])
-        difference = \
-            self.get_difference_between_orientations(
-                curr_orientation, des_orientation)
-        return difference
-
-    def get_difference_between_orientations(self, o_start, o_end):
-        """
-        Returns the difference between two orientations.
-        """
-
-        if self.geo_distance is True:
-            # geodesic distance
-            if np.dot(o_start, o_start) > 0:
-                o_start_conj = \
-                    np.array((o_start[0], -1 * o_start[1:4])) / \
-                    np.dot(o_start, o_start)
-            else:
-                rospy.logerr(
-                    """can not compute the orientation difference of a
-                    quaternion with 0 norm""")
-                return float('NaN')
-
-            o_product = o_start_conj * o_end
-            o_product_vector = o_product[1:4]
-
-            v_product_norm = np.linalg.norm(o_product_vector)
-            o_product_norm = sqrt(np.dot(o_product, o_product))
-
-            tolerance = 1e-17
-            if o_product_norm < tolerance:
-                # 0 quaternion - undefined
-                o_diff = \
-                    np.array([-float('inf'), float('nan')*o_product_vector])
-            if v_product_norm < tolerance:
-                # real quaternions - no imaginary part
-                o_diff = np.array([log(o_product_norm), 0, 0, 0])
-            vec = o_product_vector / v_product_norm
-            o_diff = \
-                np.array(
-                    log(o_product_norm),
-                    acos(o_product[0] / o_product_norm)*vec)
-
-            difference = sqrt(np.dot(o_diff, o_diff))
-            return difference
-
-        else:
-            # absolute distance
-            o_start_minus_o_end = o_start - o_end
-            o_start_plus_o_end = o_start + o_end
-            d_minus = sqrt(np.dot(o_start_minus_o_end, o_start_minus_o_end))
-            d_plus = sqrt(np.dot(o_start_plus_o_end, o_start_plus_o_end))
-            if d_minus < d_plus:
-                return d_minus
-            else:
-                return d_plus
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Defines the TransitionRecorder wrapper and the TransitionDataset class of the
+recorded transitions.
+"""
+
+import json
+import os
+import queue
+import threading
+import numpy as np
+import rospy
+import gym
+
+# version of the on-disk format of the datasets
+DATASET_VERSION = 1
+# file of the columns, chunk sizes and chunk size of a dataset
+METADATA_FILE = 'metadata.json'
+# file of the (start row, length) of each episode of a dataset
+EPISODES_FILE = 'episodes.npy'
+# prefix of the columns of the observation keys, e.g. 'obs.position'
+OBS_COLUMN = 'obs'
+
+
+def chunk_dir(directory, chunk):
+    """ Returns the directory of the given chunk of a dataset. """
+    return os.path.join(directory, 'chunk_{:06d}'.format(chunk))
+
+
+def column_file(directory, chunk, column):
+    """ Returns the array file of a column in the given chunk. """
+    return os.path.join(chunk_dir(directory, chunk), column + '.npy')
+
+
+def observation_columns(obs):
+    """
+    Returns the columns of an observation, one per key of a dict
+    observation.
+    """
+    if isinstance(obs, dict):
+        return {
+            OBS_COLUMN + '.' + key: value for key, value in obs.items()}
+    return {OBS_COLUMN: obs}
+
+
+def _write_json(path, data):
+    """ Replaces the json file atomically, so readers never see parts. """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as output:
+        json.dump(data, output, indent=2)
+    os.replace(tmp_path, path)
+
+
+class _ChunkWriter(object):
+    """
+    Writes the rows of a dataset into memory-mapped chunk files and keeps
+    the metadata and the episode index up to date with each finished chunk.
+    Only used from the writer thread of the recorder.
+    """
+    def __init__(self, directory, chunk_size):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.columns = None
+        self.chunk_sizes = []
+        self.episodes = []
+        self._arrays = None
+        self._row = 0
+
+    def write(self, row):
+        """ Appends a row, a dict of the values of each column. """
+        if self.columns is None:
+            self.columns = {
+                column: {
+                    'shape': list(np.shape(value)),
+                    'dtype': np.asarray(value).dtype.str}
+                for column, value in row.items()}
+        if self._arrays is None:
+            self._open_chunk()
+        for column, value in row.items():
+            self._arrays[column][self._row] = value
+        if row['first']:
+            self.episodes.append([self.rows, 1])
+        elif self.episodes:
+            self.episodes[-1][1] += 1
+        self._row += 1
+        if self._row == self.chunk_size:
+            self._close_chunk()
+
+    @property
+    def rows(self):
+        """ Returns the number of rows written. """
+        return sum(self.chunk_sizes) + self._row
+
+    def _open_chunk(self):
+        """ Creates the column files of the next chunk. """
+        chunk = len(self.chunk_sizes)
+        os.makedirs(chunk_dir(self.directory, chunk), exist_ok=True)
+        self._arrays = {
+            column: np.lib.format.open_memmap(
+                column_file(self.directory, chunk, column), mode='w+',
+                dtype=np.dtype(spec['dtype']),
+                shape=(self.chunk_size,) + tuple(spec['shape']))
+            for column, spec in self.columns.items()}
+        self._row = 0
+
+    def _close_chunk(self):
+        """ Flushes the current chunk and updates the metadata. """
+        for array in self._arrays.values():
+            array.flush()
+        self._arrays = None
+        self.chunk_sizes.append(self._row)
+        self._row = 0
+        self.write_metadata()
+
+    def write_metadata(self):
+        """ Writes the metadata and the episode index of finished chunks. """
+        rows = sum(self.chunk_sizes)
+        episodes = \
+            np.array(
+                [episode for episode in self.episodes if episode[0] < rows],
+                dtype=np.int64).reshape(-1, 2)
+        # the last episode may continue in the unfinished chunk
+        np.minimum(episodes[:, 1], rows - episodes[:, 0], out=episodes[:, 1])
+        tmp_path = os.path.join(self.directory, EPISODES_FILE + '.tmp.npy')
+        np.save(tmp_path, episodes)
+        os.replace(tmp_path, os.path.join(self.directory, EPISODES_FILE))
+        _write_json(os.path.join(self.directory, METADATA_FILE), {
+            'version': DATASET_VERSION,
+            'chunk_size': self.chunk_size,
+            'columns': self.columns or {},
+            'chunk_sizes': self.chunk_sizes})
+
+    def close(self):
+        """ Finishes the partly filled chunk. """
+        if self._arrays is not None and self._row > 0:
+            self._close_chunk()
+        else:
+            self.write_metadata()
+
+
+class TransitionRecorder(gym.Wrapper):
+    """
+    Records the observations, actions, rewards and dones of an environment
+    into a dataset of column-oriented, memory-mapped chunk files, one array
+    file per observation key and per action, reward, done and first column.
+
+    Each row holds an observation and the action, reward and done that led
+    to it, with first set on the observation returned by reset(), where the
+    action and reward are zero. A transition is thus made of two consecutive
+    rows of an episode, so that no observation is stored twice.
+
+    The rows are copied in the step loop and written by a background thread,
+    so that the step loop only blocks on the disk if more than queue_size
+    rows are pending.
+
+    Parameters
+    ----------
+    env: gym.Env
+        The environment to record
+    directory: str
+        Directory of the dataset, which is created if required
+    chunk_size: int
+        Number of rows per chunk file
+    queue_size: int
+        Maximum number of rows waiting to be written
+    """
+    def __init__(self, env, directory, chunk_size=1000, queue_size=256):
+        super(TransitionRecorder, self).__init__(env)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._writer = _ChunkWriter(directory, chunk_size)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._zero_action = None
+        self._thread = \
+            threading.Thread(target=self._write_rows, daemon=True)
+        self._thread.start()
+
+    def reset(self, **kwargs):
+        """ Resets the environment and records the first observation. """
+        obs = self.env.reset(**kwargs)
+        if self._zero_action is None:
+            self._zero_action = \
+                np.zeros(
+                    self.action_space.shape or (),
+                    dtype=self.action_space.dtype)
+        self._record(obs, self._zero_action, 0.0, False, True)
+        return obs
+
+    def step(self, action):
+        """ Steps the environment and records the resulting row. """
+        obs, reward, done, info = self.env.step(action)
+        self._record(obs, action, reward, done, False)
+        return obs, reward, done, info
+
+    def _record(self, obs, action, reward, done, first):
+        """
+        Queues a copy of the row, as the environment may reuse the arrays of
+        its observations.
+        """
+        if self._error is not None:
+            raise RuntimeError(
+                'Recording transitions failed: {}'.format(self._error))
+        row = {
+            column: np.array(value)
+            for column, value in observation_columns(obs).items()}
+        row['action'] = np.array(action)
+        row['reward'] = np.float64(reward)
+        row['done'] = np.bool_(done)
+        row['first'] = np.bool_(first)
+        self._queue.put(row)
+
+    def _write_rows(self):
+        """ Writes the queued rows until the recorder is closed. """
+        while True:
+            row = self._queue.get()
+            if row is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._writer.write(row)
+            except (OSError, ValueError) as exc:
+                self._error = exc
+                rospy.logerr('Failed to record transition: {}'.format(exc))
+        try:
+            self._writer.close()
+        except OSError as exc:
+            rospy.logerr('Failed to finish recording: {}'.format(exc))
+
+    def close(self):
+        """
+        Waits for the pending rows to be written and closes the dataset.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        return super(TransitionRecorder, self).close()
+
+
+class TransitionDataset(object):
+    """
+    Reads a dataset recorded by the TransitionRecorder. The columns of each
+    chunk are memory-mapped read-only, so rows are only read from the disk
+    when accessed.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the dataset
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA_FILE)) as metadata_file:
+            metadata = json.load(metadata_file)
+        if metadata['version'] != DATASET_VERSION:
+            raise ValueError(
+                'Unsupported dataset version {}.'.format(metadata['version']))
+        self.chunk_size = metadata['chunk_size']
+        self.columns = metadata['columns']
+        self.chunk_sizes = metadata['chunk_sizes']
+        self.episodes = np.load(os.path.join(directory, EPISODES_FILE))
+        self._chunks = [
+            {column: np.load(
+                column_file(directory, chunk, column), mmap_mode='r')[:size]
+             for column in self.columns}
+            for chunk, size in enumerate(self.chunk_sizes)]
+
+    def __len__(self):
+        return sum(self.chunk_sizes)
+
+    @property
+    def observation_columns(self):
+        """ Returns the columns of the observations. """
+        return [
+            column for column in self.columns
+            if column == OBS_COLUMN or column.startswith(OBS_COLUMN + '.')]
+
+    def column(self, column, row):
+        """
+        Returns the memory-mapped value of a column in the given row.
+        """
+        chunk, index = divmod(row, self.chunk_size)
+        return self._chunks[chunk][column][index]
+
+    def rows(self, column, start, stop):
+        """
+        Returns the values of a column in the rows [start, stop) as a new
+        array.
+        """
+        return np.concatenate([
+            self._chunks[chunk][column][
+                max(start - chunk * self.chunk_size, 0):
+                stop - chunk * self.chunk_size]
+            for chunk in range(
+                start // self.chunk_size,
+                (stop - 1) // self.chunk_size + 1)])
+
+    def observation(self, row):
+        """
+        Returns the observation of the given row, a dict of the observation
+        keys if a dict observation was recorded.
+        """
+        columns = self.observation_columns
+        if columns == [OBS_COLUMN]:
+            return self.column(OBS_COLUMN, row)
+        return {
+            column[len(OBS_COLUMN) + 1:]: self.column(column, row)
+            for column in columns}
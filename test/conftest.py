@@ -0,0 +1,62 @@
+"""
+Shared setup of the ros_gym tests, which run without a simulator or ROS
+master. Run from the package directory with:
+    python3 -m pytest test
+"""
+
+import os
+import sys
+import pytest
+
+# the modules of ros_gym import each other by their module names
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'ros_gym'))
+
+# pylint: disable=wrong-import-position
+from fake_uav_env import make_uav_env  # noqa: E402
+
+
+@pytest.fixture
+def task_config():
+    """
+    Returns a function that sets the ros_gym configuration of the process
+    from a dict of parameters. The previous configuration is restored after
+    the test.
+    """
+    pytest.importorskip('rospy')
+    # pylint: disable=import-outside-toplevel
+    import task_config as config_module
+
+    # pylint: disable=protected-access
+    previous = config_module._CONFIG_CACHE.config
+
+    def set_params(params):
+        config = config_module.TaskConfig(params)
+        config_module.set_config(config)
+        return config
+
+    yield set_params
+    config_module.set_config(previous)
+
+
+@pytest.fixture
+def uav_env(task_config):
+    """
+    Returns a function creating follow trajectory task environments on the
+    fake simulation as make_uav_env() does, which are closed after the test.
+    """
+    # pylint: disable=unused-argument
+    for module in ('gym', 'airsim', 'yaml'):
+        pytest.importorskip(module)
+    envs = []
+
+    def make(overrides=None, sim_handler=None):
+        env = make_uav_env(overrides, sim_handler)
+        envs.append(env)
+        return env
+
+    yield make
+    for env in envs:
+        env.close()
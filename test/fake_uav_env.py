@@ -0,0 +1,54 @@
+"""
+Creates the follow trajectory task environment on the fake simulation for
+the tests. Kept apart from conftest so that env worker processes can import
+it.
+"""
+
+# the uav task runs on the fake airsim with small camera images, so that the
+# fake simulation stays fast
+UAV_TEST_CONFIG = {
+    'sim_env': 'airsim',
+    'use_mavros': False,
+    'front_cam_res/height': 12,
+    'front_cam_res/width': 16,
+    'front_cam_d_res/height': 12,
+    'front_cam_d_res/width': 16,
+}
+
+
+def make_uav_env(overrides=None, sim_handler=None):
+    """
+    Returns the follow trajectory task environment configured by the yaml
+    file of the package with the given parameters replaced, running on a
+    fake simulation handler if no handler is given.
+
+    Parameters
+    ----------
+    overrides: dict
+        Values of the parameters to replace by their relative name, e.g.
+        {'observation_layout/mode': 'flat'}
+    sim_handler: SimulationHandler
+        Simulation handler of the environment
+    """
+    # pylint: disable=import-outside-toplevel
+    import rospy
+    from benchmarks.env_overhead import load_config, DEFAULT_CONFIG_FILE
+    from fake_simulation_handler import FakeSimulationHandler
+    from plugin_registry import TASK_ENVS
+
+    params = dict(UAV_TEST_CONFIG)
+    params.update(overrides or {})
+    config = load_config(DEFAULT_CONFIG_FILE, params)
+    # rospy time is used by the environment without an initialized node
+    rospy.rostime.set_rostime_initialized(True)
+    if sim_handler is None:
+        sim_handler = \
+            FakeSimulationHandler(
+                image_shape=(
+                    config['front_cam_res/height'],
+                    config['front_cam_res/width']),
+                depth_image_shape=(
+                    config['front_cam_d_res/height'],
+                    config['front_cam_d_res/width']))
+    env_class = TASK_ENVS.load('uav_follow_trajectory_task_env_v0')
+    return env_class(sim_handler=sim_handler)
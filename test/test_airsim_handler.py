@@ -0,0 +1,56 @@
+"""
+Tests of the lock step mode of the AirsimHandler class on a fake airsim
+client.
+"""
+
+import time
+import pytest
+
+pytest.importorskip('rospy')
+pytest.importorskip('airsim')
+
+# pylint: disable=wrong-import-position
+from gym_airsim.airsim_handler import AirsimHandler  # noqa: E402
+
+# wall time in seconds the fake simulation takes for a step window
+WINDOW = 0.01
+STEPS = 20
+
+
+class LockStepClient(object):
+    """
+    A fake airsim client whose simulation pauses itself WINDOW seconds after
+    each advance and which counts the queries of the pause state. All other
+    rpcs do nothing.
+    """
+    def __init__(self):
+        self.pause_at = 0.0
+        self.queries = 0
+        self.advances = 0
+
+    def simContinueForTime(self, duration):
+        # pylint: disable=invalid-name, unused-argument
+        self.advances += 1
+        self.pause_at = time.monotonic() + WINDOW
+
+    def simIsPause(self):
+        # pylint: disable=invalid-name
+        self.queries += 1
+        return time.monotonic() >= self.pause_at
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def test_lock_step_waits_for_window_with_few_queries():
+    client = LockStepClient()
+    handler = \
+        AirsimHandler(step_mode='lock_step', step_time=0.01, client=client)
+    for _ in range(STEPS):
+        start = time.monotonic()
+        handler.step(lambda: None)
+        # the observations are only taken after the whole window
+        assert time.monotonic() - start >= WINDOW
+    assert client.advances == STEPS
+    # polling every half millisecond would query about 20 times per step
+    assert client.queries <= 4 * STEPS
@@ -0,0 +1,53 @@
+"""
+Tests of the EnvWorkerPool class running the follow trajectory task on the
+fake simulation in worker processes.
+"""
+
+import numpy as np
+import pytest
+
+for _module in ('rospy', 'gym', 'airsim', 'yaml'):
+    pytest.importorskip(_module)
+rosgraph = pytest.importorskip('rosgraph')
+
+# pylint: disable=wrong-import-position
+from env_worker_pool import EnvWorkerPool  # noqa: E402
+from fake_uav_env import make_uav_env  # noqa: E402
+
+# each worker initializes a ros node, which requires a ROS master
+pytestmark = pytest.mark.skipif(
+    not rosgraph.is_master_online(), reason='requires a ROS master')
+
+
+def make_views_env():
+    """ Returns the uav environment writing into observation buffers. """
+    return make_uav_env({'observation_layout/mode': 'views'})
+
+
+def make_failing_env():
+    """ Raises as an environment failing on startup. """
+    raise ValueError('failed on purpose')
+
+
+def test_pool_starts_and_steps():
+    pool = EnvWorkerPool(make_views_env, ['/robot1', '/robot2'])
+    try:
+        assert pool.num_envs == 2
+        obs = pool.reset()
+        assert obs['position'].shape == (2, 7)
+        # the fake robots take off to the same height
+        np.testing.assert_array_equal(obs['position'][0], obs['position'][1])
+        actions = np.zeros((2, 4), dtype=np.float32)
+        actions[:, 0] = 1.0
+        for _ in range(3):
+            obs, rewards, dones, infos = pool.step(actions)
+        assert rewards.shape == (2,) and dones.shape == (2,)
+        assert len(infos) == 2
+        assert np.all(obs['position'][:, 0] > 0.0)
+    finally:
+        pool.close()
+
+
+def test_pool_raises_worker_errors():
+    with pytest.raises(RuntimeError, match='failed on purpose'):
+        EnvWorkerPool(make_failing_env, ['/robot1'])
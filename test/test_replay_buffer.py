@@ -0,0 +1,113 @@
+"""
+Tests of the SumTree and ReplayBuffer classes.
+"""
+
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip('gym')
+
+# pylint: disable=wrong-import-position
+from gym.spaces import Box, Dict  # noqa: E402
+from replay_buffer import SumTree, ReplayBuffer  # noqa: E402
+
+# rows per recorded episode, the first being returned by reset()
+EPISODE_ROWS = 4
+
+
+def test_find_samples_proportionally():
+    # a capacity that is not a power of two leaves empty leaves
+    tree = SumTree(5)
+    priorities = np.array([1.0, 0.0, 3.0, 0.0, 4.0])
+    tree.update(np.arange(5), priorities)
+    assert tree.total == 8.0
+    np.testing.assert_array_equal(tree.get([0, 2, 4]), [1.0, 3.0, 4.0])
+
+    values = (np.arange(8000) + 0.5) * (tree.total / 8000)
+    counts = np.bincount(tree.find(values), minlength=5)
+    np.testing.assert_array_equal(counts, priorities * 1000)
+    # indices of a zero priority are never found, even at the bounds
+    bounds = [0.0, 1.0, 4.0, np.nextafter(tree.total, 0.0)]
+    np.testing.assert_array_equal(tree.find(bounds), [0, 2, 4, 4])
+
+    tree.update([4], [0.0])
+    assert tree.total == 4.0
+    assert set(tree.find(np.linspace(0.0, 3.99, 100))) == {0, 2}
+
+
+def make_buffer(capacity, rows, **kwargs):
+    """
+    Returns a replay buffer to which the given number of rows were added.
+    Each row holds its number in its observation, action and reward, so
+    that the transitions of a sample can be checked.
+    """
+    observation_space = Dict({
+        'position': Box(-np.inf, np.inf, shape=(3,), dtype=np.float32),
+        'image': Box(0, 255, shape=(4, 4), dtype=np.uint8)})
+    action_space = Box(-np.inf, np.inf, shape=(2,), dtype=np.float32)
+    buffer = \
+        ReplayBuffer(
+            observation_space, action_space, capacity, seed=0, **kwargs)
+    for row in range(rows):
+        step = row % EPISODE_ROWS
+        buffer.add(
+            {'position': np.full(3, row, dtype=np.float32),
+             'image': np.full((4, 4), row, dtype=np.uint8)},
+            np.full(2, row, dtype=np.float32),
+            reward=float(row),
+            done=step == EPISODE_ROWS - 1,
+            first=step == 0)
+    return buffer
+
+
+def test_samples_consistent_transitions():
+    buffer = make_buffer(10, 23)
+    assert len(buffer) == 10
+    assert buffer.memmap_keys == ['image']
+    batch = buffer.sample(64)
+
+    rows = batch['next_obs']['position'][:, 0]
+    # the oldest row has lost its previous observation and first rows do not
+    # end a transition
+    assert np.all(rows >= 23 - 10 + 1)
+    assert not np.any(rows % EPISODE_ROWS == 0)
+    np.testing.assert_array_equal(batch['obs']['position'][:, 0], rows - 1)
+    np.testing.assert_array_equal(batch['next_obs']['image'][:, 0, 0], rows)
+    np.testing.assert_array_equal(batch['obs']['image'][:, 0, 0], rows - 1)
+    np.testing.assert_array_equal(batch['action'][:, 0], rows)
+    np.testing.assert_array_equal(batch['reward'], rows)
+    np.testing.assert_array_equal(
+        batch['done'], rows % EPISODE_ROWS == EPISODE_ROWS - 1)
+    assert np.all(np.diff(batch['indices']) >= 0)
+    assert batch['weights'].max() == 1.0
+
+    # sampling into a preallocated batch fills the same arrays
+    out = buffer.allocate_batch(8)
+    assert buffer.sample(8, out=out) is out
+    np.testing.assert_array_equal(
+        out['obs']['position'][:, 0], out['next_obs']['position'][:, 0] - 1)
+
+    directory = buffer.directory
+    buffer.close()
+    assert not os.path.exists(directory)
+
+
+def test_samples_by_priority():
+    buffer = make_buffer(8, 8, memmap_keys=[], epsilon=0.0)
+    assert buffer.memmap_keys == []
+    indices = np.arange(8)
+    # only the transition ending in row 2 keeps a priority without epsilon
+    buffer.update_priorities(indices, (indices == 2) * 10.0)
+    batch = buffer.sample(16, beta=0.0)
+    np.testing.assert_array_equal(batch['indices'], np.full(16, 2))
+    np.testing.assert_array_equal(batch['weights'], np.ones(16))
+
+    # first rows keep a zero priority
+    buffer.update_priorities(indices, np.ones(8))
+    batch = buffer.sample(64)
+    assert not np.any(np.isin(batch['indices'], [0, EPISODE_ROWS]))
+
+    empty = make_buffer(4, 1, memmap_keys=[])
+    with pytest.raises(ValueError):
+        empty.sample(1)
@@ -0,0 +1,149 @@
+"""
+Tests of the RobotGazeboEnv class on a stubbed gazebo handler.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('rospy')
+pytest.importorskip('gym')
+pytest.importorskip('gazebo_msgs')
+pytest.importorskip('std_srvs')
+
+# pylint: disable=wrong-import-position
+from gym.spaces import Box, Dict  # noqa: E402
+from simulation_handler import SimulationHandler  # noqa: E402
+from gym_gazebo import robot_gazebo_env  # noqa: E402
+from gym_gazebo.gazebo_handler import gazebo_master_address  # noqa: E402
+
+
+class StubGazeboHandler(SimulationHandler):
+    """ Records the calls of the environment instead of running gazebo. """
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.calls = []
+        super(StubGazeboHandler, self).__init__()
+
+    def reset(self):
+        self.calls.append('reset')
+
+    def pause(self):
+        self.calls.append('pause')
+
+    def unpause(self):
+        self.calls.append('unpause')
+
+    def close(self):
+        self.calls.append('close')
+
+
+class CounterGazeboEnv(robot_gazebo_env.RobotGazeboEnv):
+    """ A robot whose position counts the actions applied to it. """
+    def __init__(self, **kwargs):
+        self.observation_space = \
+            Dict({'position': Box(-np.inf, np.inf, shape=(1,))})
+        self.action_space = Box(-1.0, 1.0, shape=(1,))
+        self.position = 0.0
+        super(CounterGazeboEnv, self).__init__(**kwargs)
+
+    def _pre_reset(self):
+        pass
+
+    def _set_init_pose(self):
+        self.position = 0.0
+
+    def _init_env_variables(self):
+        pass
+
+    def _init_episode_variables(self):
+        pass
+
+    def _set_action(self, action):
+        self.position += float(action[0])
+
+    def _get_obs(self):
+        obs = self._next_observation()
+        self._observation_array(obs, 'position')[0] = self.position
+        return obs
+
+    def _is_done(self, observations):
+        return observations['position'][0] >= 2.0
+
+    def _compute_reward(self, observations, done):
+        return 1.0
+
+
+def test_builds_with_given_handler(task_config):
+    task_config({})
+    handler = StubGazeboHandler()
+    env = CounterGazeboEnv(robot_name_space='/robot1', sim_handler=handler)
+    assert env.sim_handler is handler
+    assert env.robot_name_space == '/robot1'
+
+    assert env.reset()['position'][0] == 0.0
+    obs, reward, done, _ = env.step(np.ones(1))
+    assert obs['position'][0] == 1.0 and reward == 1.0 and not done
+    _, _, done, _ = env.step(np.ones(1))
+    assert done
+    # each step runs between an unpause and a pause of the simulation
+    assert handler.calls[-4:] == ['unpause', 'pause', 'unpause', 'pause']
+
+    env.close()
+    assert handler.calls[-1] == 'close'
+
+
+def test_configures_default_handler(task_config, monkeypatch):
+    task_config({'sim_step': {'mode': 'lock_step', 'iterations': 20}})
+    monkeypatch.setattr(
+        robot_gazebo_env, 'GazeboHandler', StubGazeboHandler)
+    env = \
+        CounterGazeboEnv(
+            robot_name_space='/robot1',
+            update_physics_params_at_start=False)
+    # robots outside of a worker pool share the global gazebo instance
+    assert env.sim_handler.kwargs == {
+        'step_mode': 'lock_step',
+        'step_iterations': 20,
+        'update_physics_params_at_start': False,
+        'name_space': '',
+        'master_uri': ''}
+
+
+def test_workers_run_own_gazebo_instances(task_config, monkeypatch):
+    task_config({
+        'worker_name_spaces': ['/robot1', '/robot2'],
+        'worker_gazebo_master_uris': ['localhost:11345', 'localhost:11346']})
+    monkeypatch.setattr(
+        robot_gazebo_env, 'GazeboHandler', StubGazeboHandler)
+    env = CounterGazeboEnv(robot_name_space='/robot2')
+    assert env.sim_handler.kwargs['name_space'] == '/robot2'
+    assert env.sim_handler.kwargs['master_uri'] == 'localhost:11346'
+
+
+def test_worker_pool_requires_own_worlds(task_config):
+    check = robot_gazebo_env.RobotGazeboEnv.check_worker_pool
+    task_config({})
+    check(['/robot1', '/robot2'])
+    with pytest.raises(ValueError):
+        check(['/robot1', '/robot1'])
+    with pytest.raises(ValueError):
+        check(['', '/robot2'])
+
+    task_config({
+        'sim_step': {'mode': 'lock_step'},
+        'worker_gazebo_master_uris': ['localhost:11345']})
+    with pytest.raises(ValueError):
+        check(['/robot1', '/robot2'])
+    task_config({
+        'sim_step': {'mode': 'lock_step'},
+        'worker_gazebo_master_uris': ['localhost:11345', 'localhost:11346']})
+    check(['/robot1', '/robot2'])
+
+
+def test_gazebo_master_address(monkeypatch):
+    monkeypatch.delenv('GAZEBO_MASTER_URI', raising=False)
+    assert gazebo_master_address() == ('localhost', 11345)
+    assert gazebo_master_address('http://sim2:11346') == ('sim2', 11346)
+    assert gazebo_master_address('sim3:11347') == ('sim3', 11347)
+    monkeypatch.setenv('GAZEBO_MASTER_URI', 'http://sim4:11348')
+    assert gazebo_master_address() == ('sim4', 11348)
@@ -0,0 +1,117 @@
+"""
+Tests of the MavrosGym node setting up the follow trajectory task on the
+fake simulation.
+"""
+
+import types
+import pytest
+
+pytest.importorskip('rl_agents')
+pytest.importorskip('rospkg')
+
+# pylint: disable=wrong-import-position
+import ros_gym  # noqa: E402
+from async_step import AsyncStep  # noqa: E402
+from transition_recorder import TransitionDataset  # noqa: E402
+from episode_monitor import \
+    EpisodeMonitor, STATS_PREFIX, VIDEO_PREFIX  # noqa: E402
+
+# steps after which an episode is truncated, as the fake robot hovers
+EPISODE_STEPS = 5
+
+
+@pytest.fixture
+def make_node(uav_env, monkeypatch, tmp_path):
+    """
+    Returns a function that sets up a MavrosGym node on a fake environment
+    with the given parameters replaced. The agent of the node only records
+    the env it is created with.
+    """
+    def get_agent(name, env):
+        return types.SimpleNamespace(name=name, env=env)
+
+    monkeypatch.setattr(ros_gym.AgentBase, 'get_agent', get_agent)
+    monkeypatch.setattr(
+        ros_gym.rospy, 'get_param', lambda name, default=None: 'fake_agent')
+    monkeypatch.setattr(
+        ros_gym.rospkg, 'RosPack',
+        lambda: types.SimpleNamespace(get_path=lambda name: str(tmp_path)))
+
+    def make(overrides=None):
+        # fast resets skip the wait for the robot to fall after the first
+        # episode
+        params = {
+            'fast_reset': {'enabled': True, 'full_reset_every': 0},
+            'max_episode_steps': EPISODE_STEPS,
+            'monitor/enabled': False,
+            'monitor/directory': str(tmp_path / 'monitor'),
+            'recording/directory': str(tmp_path / 'transitions')}
+        params.update(overrides or {})
+        env = ros_gym.gym.wrappers.TimeLimit(
+            uav_env(params), max_episode_steps=EPISODE_STEPS)
+        node = ros_gym.MavrosGym()
+        monkeypatch.setattr(
+            node, 'register_env', lambda name, max_episode_steps: env)
+        node.setup()
+        return node
+
+    return make
+
+
+def run_episodes(env, episodes):
+    """ Runs the given number of episodes with asynchronous steps. """
+    action = env.action_space.sample() * 0.0
+    for _ in range(episodes):
+        env.reset()
+        done = False
+        while not done:
+            env.step_async(action)
+            _, _, done, _ = env.step_wait()
+
+
+def test_agent_uses_wrapped_env(make_node):
+    node = make_node({'debug_async_observation': True})
+    assert isinstance(node.task_env, AsyncStep)
+    assert node.agent.env is node.task_env
+    run_episodes(node.agent.env, 2)
+    node.task_env.close()
+
+
+def test_records_transitions_of_agent(make_node, tmp_path):
+    node = make_node({'recording/enabled': True})
+    run_episodes(node.agent.env, 2)
+    node.task_env.close()
+    runs = list((tmp_path / 'transitions').iterdir())
+    assert len(runs) == 1
+    dataset = TransitionDataset(str(runs[0]))
+    # a first row per episode followed by a row per step
+    assert len(dataset) == 2 * (EPISODE_STEPS + 1)
+    assert dataset.episodes.tolist() == [
+        [0, EPISODE_STEPS + 1], [EPISODE_STEPS + 1, EPISODE_STEPS + 1]]
+
+
+def test_monitors_episodes_of_agent(make_node, tmp_path):
+    node = \
+        make_node({
+            'monitor/enabled': True,
+            'monitor/video_key': 'front_cam',
+            'monitor/video_interval': 1})
+    run_episodes(node.agent.env, 2)
+    monitor = node.task_env.env
+    assert isinstance(monitor, EpisodeMonitor)
+    assert len(monitor.get_episode_rewards()) == 2
+    assert monitor.get_episode_lengths() == [EPISODE_STEPS, EPISODE_STEPS]
+    node.task_env.close()
+    files = sorted(path.name for path in (tmp_path / 'monitor').iterdir())
+    assert any(name.startswith(STATS_PREFIX) for name in files)
+    assert any(name.startswith(VIDEO_PREFIX) for name in files)
+
+
+@pytest.mark.parametrize('params', [
+    {'sim_env': 'airsim', 'use_mavros': True},
+    {'sim_env': 'gazebo', 'use_mavros': False}])
+def test_vec_env_requires_airsim_control(task_config, params):
+    task_config(params)
+    with pytest.raises(NotImplementedError, match='vehicle_names'):
+        ros_gym.MavrosGym().register_vec_env(
+            'uav_follow_trajectory_task_env_v0', ['Drone1', 'Drone2'])
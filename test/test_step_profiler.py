@@ -0,0 +1,60 @@
+"""
+Tests of the LatencyHistogram class.
+"""
+
+import pytest
+
+pytest.importorskip('rospy')
+pytest.importorskip('std_msgs')
+
+# pylint: disable=wrong-import-position
+from step_profiler import LatencyHistogram  # noqa: E402
+
+# a small histogram, so that every value of its range is checked
+BITS = 4
+MAX_BITS = 12
+
+
+def test_bucket_bounds():
+    histogram = LatencyHistogram(BITS, MAX_BITS)
+    bounds = [
+        histogram.upper_bound(index)
+        for index in range(len(histogram.counts))]
+    assert all(lower < upper for lower, upper in zip(bounds, bounds[1:]))
+    assert bounds[-1] == (1 << MAX_BITS) - 1
+
+    for value in range(1 << MAX_BITS):
+        histogram.clear()
+        histogram.record(value)
+        index = histogram.counts.index(1)
+        # each value is counted in the first bucket that bounds it
+        assert value <= bounds[index]
+        assert index == 0 or bounds[index - 1] < value
+        if value < 1 << BITS:
+            assert bounds[index] == value
+        else:
+            assert bounds[index] - value < value * 2 / (1 << BITS)
+
+
+def test_percentiles():
+    histogram = LatencyHistogram(BITS, MAX_BITS)
+    assert histogram.percentile(50.0) == 0
+    for value in range(1, 1001):
+        histogram.record(value)
+    assert histogram.count == 1000
+    assert histogram.min == 1 and histogram.max == 1000
+    for percent in (50.0, 90.0, 99.0):
+        expected = percent * 10
+        assert expected <= histogram.percentile(percent)
+        assert \
+            histogram.percentile(percent) < expected * (1 + 2 / (1 << BITS))
+    assert histogram.percentile(100.0) == 1000
+    assert sum(count for _, count in histogram.buckets()) == 1000
+
+    # values beyond the range are counted in the last bucket
+    histogram.clear()
+    histogram.record(1 << MAX_BITS + 4)
+    assert histogram.counts[-1] == 1
+    summary = histogram.summary()
+    assert summary['count'] == 1
+    assert summary['max_ms'] == (1 << MAX_BITS + 4) * 1e-6
@@ -0,0 +1,87 @@
+"""
+Tests of the TransitionRecorder wrapper recording the follow trajectory task
+on the fake simulation and of the ReplaySimulationHandler replaying the
+recording.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('rospy')
+
+# pylint: disable=wrong-import-position
+from transition_recorder import \
+    TransitionRecorder, TransitionDataset  # noqa: E402
+from replay_simulation_handler import ReplaySimulationHandler  # noqa: E402
+from task_config import get_config  # noqa: E402
+
+# fast resets skip the wait for the robot to fall after the first episode
+PARAMS = {'fast_reset': {'enabled': True, 'full_reset_every': 0}}
+EPISODES = 2
+STEPS = 3
+# rows per chunk file, so that the episodes span several chunks
+CHUNK_SIZE = 3
+
+
+def run_episodes(env, action):
+    """
+    Runs EPISODES episodes of STEPS steps and returns copies of the
+    observations and the rewards of each row.
+    """
+    observations, rewards = [], []
+    for _ in range(EPISODES):
+        observations.append(
+            {key: np.array(value) for key, value in env.reset().items()})
+        rewards.append(0.0)
+        for _ in range(STEPS):
+            obs, reward, _, _ = env.step(action)
+            observations.append(
+                {key: np.array(value) for key, value in obs.items()})
+            rewards.append(reward)
+    return observations, rewards
+
+
+def test_records_and_replays_episodes(uav_env, tmp_path):
+    directory = str(tmp_path / 'transitions')
+    env = \
+        TransitionRecorder(
+            uav_env(PARAMS), directory, chunk_size=CHUNK_SIZE)
+    action = np.array([1.0, 0.5, 0.0, 0.0], dtype=env.action_space.dtype)
+    recorded, rewards = run_episodes(env, action)
+    env.close()
+
+    dataset = TransitionDataset(directory)
+    rows = EPISODES * (STEPS + 1)
+    assert len(dataset) == rows
+    assert dataset.chunk_sizes == [3, 3, 2]
+    np.testing.assert_array_equal(
+        dataset.episodes, [[0, STEPS + 1], [STEPS + 1, STEPS + 1]])
+    assert sorted(dataset.observation_columns) == sorted(
+        'obs.' + key for key in recorded[0])
+    for row in range(rows):
+        for key, value in dataset.observation(row).items():
+            np.testing.assert_array_equal(value, recorded[row][key])
+    np.testing.assert_array_equal(dataset.rows('reward', 0, rows), rewards)
+    np.testing.assert_array_equal(
+        dataset.rows('first', 0, rows),
+        np.arange(rows) % (STEPS + 1) == 0)
+    np.testing.assert_array_equal(
+        dataset.rows('action', 1, STEPS + 1), np.tile(action, (STEPS, 1)))
+    # the robot moves along the commanded velocity
+    positions = dataset.rows('obs.position', 0, STEPS + 1)
+    assert np.all(np.diff(positions[:, 0]) > 0.0)
+
+    # the replay serves the recorded rows whatever the actions
+    handler = \
+        ReplaySimulationHandler(
+            dataset,
+            collision_reward=get_config()['collision_penalty'],
+            image_shape=(12, 16),
+            depth_image_shape=(12, 16))
+    replay = uav_env(PARAMS, handler)
+    replayed, replayed_rewards = run_episodes(replay, action * 0.0)
+    for row in range(rows):
+        for key in ('position', 'velocity', 'front_cam', 'front_cam_depth'):
+            np.testing.assert_array_equal(
+                replayed[row][key], recorded[row][key])
+    assert replayed_rewards == rewards